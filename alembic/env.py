@@ -14,6 +14,14 @@ config = context.config
 # This line sets up loggers basically.
 fileConfig(config.config_file_name)
 
+with open(os.path.join(os.path.dirname(__file__), '..', '.env.json')) as f:
+    env = json.load(f)
+
+# Settings such as VECTOR_BACKEND shape the models and migrations, so expose
+# them before the models are imported (explicit environment variables win).
+for key, value in env.items():
+    os.environ.setdefault(key, str(value))
+
 # add your model's MetaData object here
 # for 'autogenerate' support
 # from myapp import mymodel
@@ -26,9 +34,6 @@ target_metadata = Base.metadata
 # my_important_option = config.get_main_option("my_important_option")
 # ... etc.
 
-with open(os.path.join(os.path.dirname(__file__), '..', '.env.json')) as f:
-    env = json.load(f)
-
 def get_url():
     return (
         "postgresql://"
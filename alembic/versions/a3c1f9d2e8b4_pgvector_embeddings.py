@@ -0,0 +1,84 @@
+"""Optionally move embeddings to a native pgvector column
+
+Revision ID: a3c1f9d2e8b4
+Revises: 6713f2b7a5d1
+Create Date: 2026-10-18 10:00:00.000000
+
+Only acts when VECTOR_BACKEND=pgvector (in .env.json or the environment);
+otherwise it is a no-op and embeddings stay in the BYTEA layout. The
+server-side index is HNSW by default, or IVFFlat with
+PGVECTOR_INDEX=ivfflat. To switch an existing deployment later, downgrade
+to 6713f2b7a5d1 and upgrade again with VECTOR_BACKEND=pgvector.
+"""
+import os
+from typing import Sequence, Union
+
+from alembic import op
+import numpy as np
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c1f9d2e8b4'
+down_revision: Union[str, None] = '6713f2b7a5d1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+VECTOR_BACKEND = os.environ.get("VECTOR_BACKEND", "bytea")
+EMBEDDING_DIM = int(os.environ.get("EMBEDDING_DIM", 1536))
+PGVECTOR_INDEX = os.environ.get("PGVECTOR_INDEX", "hnsw")
+PGVECTOR_IVFFLAT_LISTS = int(os.environ.get("PGVECTOR_IVFFLAT_LISTS", 1000))
+BATCH_SIZE = 1000
+
+
+def _copy_column(source: str, target: str, decode, encode) -> None:
+    # Convert in id order, a batch at a time, so large tables never sit in memory.
+    connection = op.get_bind()
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.text(f"SELECT id, {source} FROM embeddings WHERE id > :last_id ORDER BY id LIMIT :limit"),
+            {"last_id": last_id, "limit": BATCH_SIZE},
+        ).fetchall()
+        if not rows:
+            break
+        connection.execute(
+            sa.text(f"UPDATE embeddings SET {target} = {encode} WHERE id = :id"),
+            [{"id": row_id, "value": decode(value)} for row_id, value in rows],
+        )
+        last_id = rows[-1][0]
+
+
+def _bytea_to_vector_literal(value) -> str:
+    return "[" + ",".join(repr(float(x)) for x in np.frombuffer(value, dtype=np.float32)) + "]"
+
+
+def _vector_text_to_bytes(value) -> bytes:
+    return np.array(value.strip("[]").split(","), dtype=np.float32).tobytes()
+
+
+def upgrade() -> None:
+    if VECTOR_BACKEND != "pgvector":
+        return
+    op.execute("CREATE EXTENSION IF NOT EXISTS vector")
+    op.execute(f"ALTER TABLE embeddings ADD COLUMN embedding_vector vector({EMBEDDING_DIM})")
+    _copy_column("embedding", "embedding_vector", _bytea_to_vector_literal, "CAST(:value AS vector)")
+    op.drop_column('embeddings', 'embedding')
+    op.alter_column('embeddings', 'embedding_vector', new_column_name='embedding', nullable=False)
+    if PGVECTOR_INDEX == "ivfflat":
+        op.execute(
+            "CREATE INDEX ix_embeddings_embedding ON embeddings "
+            f"USING ivfflat (embedding vector_cosine_ops) WITH (lists = {PGVECTOR_IVFFLAT_LISTS})"
+        )
+    else:
+        op.execute("CREATE INDEX ix_embeddings_embedding ON embeddings USING hnsw (embedding vector_cosine_ops)")
+
+
+def downgrade() -> None:
+    if VECTOR_BACKEND != "pgvector":
+        return
+    op.execute("DROP INDEX IF EXISTS ix_embeddings_embedding")
+    op.add_column('embeddings', sa.Column('embedding_bytes', sa.LargeBinary(), nullable=True))
+    _copy_column("embedding::text", "embedding_bytes", _vector_text_to_bytes, ":value")
+    op.drop_column('embeddings', 'embedding')
+    op.alter_column('embeddings', 'embedding_bytes', new_column_name='embedding', nullable=False)
@@ -0,0 +1,35 @@
+"""Full-text search column and GIN index on indices.text_chunk
+
+Revision ID: c5e2a7b9d4f1
+Revises: a3c1f9d2e8b4
+Create Date: 2026-10-18 12:00:00.000000
+
+text_search is a stored generated tsvector, so Postgres keeps it in sync
+with text_chunk on every insert and update. Adding it rewrites the
+indices table once.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5e2a7b9d4f1'
+down_revision: Union[str, None] = 'a3c1f9d2e8b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TEXT_SEARCH_CONFIG = "english"
+
+
+def upgrade() -> None:
+    op.execute(
+        "ALTER TABLE indices ADD COLUMN text_search tsvector "
+        f"GENERATED ALWAYS AS (to_tsvector('{TEXT_SEARCH_CONFIG}', text_chunk)) STORED"
+    )
+    op.execute("CREATE INDEX ix_indices_text_search ON indices USING gin (text_search)")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_indices_text_search")
+    op.drop_column('indices', 'text_search')
@@ -0,0 +1,46 @@
+"""Content hashes and tombstones for incremental re-ingestion
+
+Revision ID: e8d4b1c6a2f3
+Revises: c5e2a7b9d4f1
+Create Date: 2026-10-18 14:00:00.000000
+
+Existing chunks are hashed from their text (with EMBEDDING_MODEL, as in
+app.data_ingestion.ingest.chunk_hash), so the first re-upload of a document
+already reuses their vectors.
+"""
+import os
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8d4b1c6a2f3'
+down_revision: Union[str, None] = 'c5e2a7b9d4f1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "text-embedding-ada-002")
+
+
+def upgrade() -> None:
+    for table in ('embeddings', 'indices'):
+        op.add_column(table, sa.Column('content_hash', sa.String(length=64), nullable=True))
+        op.add_column(table, sa.Column('deleted', sa.Boolean(), server_default=sa.false(), nullable=False))
+        op.create_index(f'ix_{table}_user_id_file_path', table, ['user_id', 'file_path'])
+    op.execute(sa.text(
+        "UPDATE indices SET content_hash = encode(sha256(convert_to(:model || chr(10) || text_chunk, 'UTF8')), 'hex')"
+    ).bindparams(model=EMBEDDING_MODEL))
+    op.execute(
+        "UPDATE embeddings AS e SET content_hash = i.content_hash FROM indices AS i "
+        "WHERE i.user_id = e.user_id AND i.file_path = e.file_path "
+        "AND i.version = e.version AND i.chunk_index = e.chunk_index"
+    )
+
+
+def downgrade() -> None:
+    for table in ('embeddings', 'indices'):
+        op.drop_index(f'ix_{table}_user_id_file_path', table_name=table)
+        op.drop_column(table, 'deleted')
+        op.drop_column(table, 'content_hash')
@@ -0,0 +1,51 @@
+"""Unique (user_id, file_path, version, chunk_index) on embeddings and indices
+
+Revision ID: f3a9c7e1b5d2
+Revises: e8d4b1c6a2f3
+Create Date: 2026-10-18 18:00:00.000000
+
+Concurrent uploads of one document could both compute the same next
+version. Rows that already share these columns (e.g. written through
+/api/v1/embedding/) are not removed: the upgrade stops and reports them,
+so they can be renumbered or deleted by hand first.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a9c7e1b5d2'
+down_revision: Union[str, None] = 'e8d4b1c6a2f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CONSTRAINTS = {'embeddings': 'uq_embeddings_chunk', 'indices': 'uq_indices_chunk'}
+COLUMNS = ['user_id', 'file_path', 'version', 'chunk_index']
+
+
+def upgrade() -> None:
+    connection = op.get_bind()
+    duplicates = {}
+    for table in CONSTRAINTS:
+        groups, rows = connection.execute(sa.text(
+            f"SELECT count(*), coalesce(sum(n - 1), 0) FROM "
+            f"(SELECT count(*) AS n FROM {table} GROUP BY {', '.join(COLUMNS)} HAVING count(*) > 1) AS d"
+        )).one()
+        if groups:
+            duplicates[table] = (groups, rows)
+    if duplicates:
+        raise RuntimeError(
+            "Cannot add the unique chunk constraints: "
+            + "; ".join(f"{table} has {rows} extra rows in {groups} duplicated ({', '.join(COLUMNS)}) groups"
+                        for table, (groups, rows) in duplicates.items())
+            + ". Renumber or delete them, then run the upgrade again."
+        )
+    for table, name in CONSTRAINTS.items():
+        op.create_unique_constraint(name, table, COLUMNS)
+
+
+def downgrade() -> None:
+    for table, name in CONSTRAINTS.items():
+        op.drop_constraint(name, table, type_='unique')
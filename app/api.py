@@ -1,153 +1,256 @@
-import json
 import pandas as pd
-from typing import List, Dict
+from typing import List, Optional
 import openai
 import os
 import uuid
 import logging
-import requests
-from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, Query
-from fastapi.responses import JSONResponse, PlainTextResponse, HTMLResponse
-from bs4 import BeautifulSoup
+import httpx
+from pathlib import Path
+from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, FileResponse, StreamingResponse
 from sqlalchemy.orm import Session
 
-from sqlalchemy.exc import SQLAlchemyError 
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError 
 from pydantic import BaseModel
-from .utils import save_file, embed_text, allowed_file, get_task_details, user_to_dict
+from .utils import save_file, embed_text, aembed_text, allowed_file, get_task_details, user_to_dict, embedding_to_dict, index_to_dict, youtube_transcript_key
 from .database.db_util import get_db
-from .database.schemas import UserCreate, UserLogin, PasswordResetRequest, PasswordReset, EmbeddingCreate, IndexCreate
-from .database.services import create_user, authenticate_user, reset_password_request, reset_password, delete_user, logout_user, create_embedding, create_index
-from .data_ingestion.reader import read
+from .database.schemas import UserCreate, UserLogin, PasswordResetRequest, PasswordReset, EmbeddingCreate, IndexCreate, EmbeddingSearch
+from .database.services import create_user, authenticate_user, reset_password_request, reset_password, delete_user, logout_user, create_embedding, create_index, search_embeddings, create_embeddings_bulk, create_indices_bulk, get_document_embeddings
+from .data_ingestion.parallel import parse_files
+from .data_ingestion.ingest import ingest_document
+from .data_ingestion.crawler import SitemapCrawler
 from .tasks import process_transcript
 from .auth import verify_token
+from .hashing import hashing_pool
+from .session_store import session_store, SessionNotFound, SessionTooLarge
+from .transcript_cache import transcript_cache
+from .upload_store import blob_store, UploadTooLarge
+from .task_events import event_stream
+from .retrieval import StageTimer, retrieve_chunks, hybrid_search, answer_events, ANSWER_TOP_K, HYBRID_VECTOR_K, HYBRID_LEXICAL_K
+from .serialization import ORJSONResponse, embedding_response, encode_embedding, negotiate_embedding_format, EVENT_STREAM, EVENT_STREAM_HEADERS
 
-# Storage for sessions, documents and embeddings
-sessions: Dict[str, Dict[str, List[float]]] = {}
-documents: Dict[str, Dict[str, str]] = {}
 
 def handle_db_exception(e):
-    return JSONResponse(content={"error": "Database error", "details": str(e)}, status_code=500)
+    return ORJSONResponse(content={"error": "Database error", "details": str(e)}, status_code=500)
+
+
+def handle_conflict(e):
+    # The row clashes with a stored one, e.g. the same (user_id, file_path, version, chunk_index).
+    return ORJSONResponse(content={"error": "Conflict", "details": str(e.orig)}, status_code=409)
 
 
 class URLRequest(BaseModel):
     url: str
 
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
 
 @router.post("/api/v1/initialize")
 async def initialize_session():
     session_id = str(uuid.uuid4())
-    sessions[session_id] = {}
-    documents[session_id] = {}
-    try:
-        with open('.env.json') as f:
-            env = json.load(f)
-    except FileNotFoundError as e:
-        logging.error("Environment file not found: %s", e)
-        raise
-    
-    return JSONResponse(content={"session_id": session_id})
+    await run_in_threadpool(session_store.create, session_id)
+    return ORJSONResponse(content={"session_id": session_id})
 
 @router.post("/api/v1/upload-files", summary="Upload files", description="Endpoint to upload one or more files.",
              dependencies=[Depends(verify_token)])
 async def upload_files(files: list[UploadFile] = File(...)):
     response_data = []
     for file in files:
-        response = save_file(file)
+        response = await run_in_threadpool(save_file, file)
         response_data.append(response)
-    return JSONResponse(content=response_data)
+
+    # Parse the saved files in parallel in the process pool to report what was extracted.
+    parseable = [response for response in response_data
+                 if response["message"] == "File uploaded successfully" and allowed_file(response["filename"])]
+    # Blobs are parsed once per content; repeated uploads of a file read the cached pages.
+    parsed = await parse_files([str(blob_store.path_for(response["sha256"], Path(response["filename"]).suffix))
+                                for response in parseable], parse=blob_store.parse)
+    for response, result in zip(parseable, parsed):
+        if "error" in result:
+            response["parse_error"] = result["error"]
+        else:
+            response["pages"] = result["pages"]
+            response["characters"] = result["characters"]
+            response["parse_seconds"] = result["parse_seconds"]
+    return ORJSONResponse(content=response_data)
 
 @router.post("/api/v1/transcript-youtube", summary="Transcript YouTube", description="Transcript YouTube video",
              dependencies=[Depends(verify_token)])
 async def transcript_youtube(request: URLRequest):
-    task = process_transcript.delay(request.url)
-    return JSONResponse(content={"task_id": task.id})
+    cache_key = youtube_transcript_key(request.url)
+    if cache_key is None:
+        raise HTTPException(status_code=400, detail="Not a YouTube video URL")
+    transcript = await run_in_threadpool(transcript_cache.get, cache_key)
+    if transcript is not None:
+        return ORJSONResponse(content={"task_id": None, "cached": True, "result": transcript})
+    # Requests for a video that is already being transcribed share its task.
+    task_id = str(uuid.uuid4())
+    in_flight = await run_in_threadpool(transcript_cache.claim, cache_key, task_id)
+    if in_flight is not None:
+        return ORJSONResponse(content={"task_id": in_flight, "cached": False})
+    try:
+        await run_in_threadpool(process_transcript.apply_async, args=(request.url,), task_id=task_id)
+    except Exception:
+        await run_in_threadpool(transcript_cache.release, cache_key, task_id)
+        raise
+    return ORJSONResponse(content={"task_id": task_id, "cached": False})
 
 @router.get("/api/v1/transcript-task-status/{task_id}", summary="Get Task Status", description="Get the status of a Celery task",
              dependencies=[Depends(verify_token)])
 async def get_task_status(task_id: str):
     task = process_transcript.AsyncResult(task_id)
-    response = get_task_details(task)
-    return JSONResponse(content=response)
+    response = await run_in_threadpool(get_task_details, task)
+    return ORJSONResponse(content=response)
+
+@router.get("/api/v1/transcript-task-events/{task_id}", summary="Stream Task Progress",
+            description="Server-Sent Events with the progress of a Celery task", dependencies=[Depends(verify_token)])
+async def stream_task_events(task_id: str):
+    async def current_state():
+        return await run_in_threadpool(get_task_details, process_transcript.AsyncResult(task_id))
+    return StreamingResponse(event_stream(task_id, current_state), media_type=EVENT_STREAM, headers=EVENT_STREAM_HEADERS)
 
 @router.post("/api/v1/upload/{session_id}", summary="Upload file", description="Upload a file to the user.",
              dependencies=[Depends(verify_token)])
-async def upload_file(session_id: str, file: UploadFile = File(...)):
-    if session_id not in sessions:
+async def upload_file(session_id: str, request: Request, file: UploadFile = File(...), user_id: Optional[int] = Query(None),
+                      embedding_format: Optional[str] = Query(None), db: Session = Depends(get_db)):
+    embedding_format = negotiate_embedding_format(request, embedding_format)
+    if not await run_in_threadpool(session_store.exists, session_id):
         raise HTTPException(status_code=404, detail="Session not found")
 
     if not allowed_file(file.filename):
         raise HTTPException(status_code=400, detail="File type not allowed")
 
-    file_location = f"/tmp/{file.filename}"
-    with open(file_location, "wb") as f:
-        f.write(file.file.read())
-
-    text = read(file_location)
+    try:
+        blob = await run_in_threadpool(blob_store.put, file.file, file.filename, file.size)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
 
-    embedding = embed_text(text)
-    sessions[session_id][file.filename] = embedding
-    documents[session_id][file.filename] = text
-    os.remove(file_location)  # Clean up the uploaded file
-    
+    # Chunks are stored as embeddings/indices rows only when the upload belongs to a user.
+    try:
+        # Parsing is CPU-bound and runs in the process pool, off the event loop, once per file content.
+        await blob_store.parse(blob.path)
+        # The chunker reads the parsed pages from the blob store one batch at a time.
+        ingested = await run_in_threadpool(ingest_document, blob_store.iter_pages(blob.path), file.filename,
+                                           db=db, user_id=user_id)
+    except SQLAlchemyError as e:
+        db.rollback()
+        return handle_db_exception(e)
+    try:
+        text = await run_in_threadpool(blob_store.read_text, blob.path)
+        await run_in_threadpool(session_store.put_document, session_id, file.filename, text, ingested["embeddings"])
+    except SessionNotFound:
+        raise HTTPException(status_code=404, detail="Session not found")
+    except SessionTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
 
-    return JSONResponse(content={"embedding": embedding})
+    return embedding_response(embedding_format, {
+        "filename": file.filename,
+        "sha256": blob.sha256,
+        "version": ingested["version"],
+        "chunks": len(ingested["embeddings"]),
+        "embedded": ingested["embedded"],
+        "reused": ingested["reused"],
+        "removed": ingested["removed"],
+        "embeddings": ingested["embeddings"],
+    }, field="embeddings", many=True)
 
 
 @router.post("/api/v1/query/{session_id}", summary="Query", description="Query the user.",
              dependencies=[Depends(verify_token)])
-async def process_query(query_id: str, text: str = Query(...), sessionid: str = Query(...)):
+async def process_query(query_id: str, request: Request, text: str = Query(...), sessionid: str = Query(...),
+                        embedding_format: Optional[str] = Query(None)):
     logging.info(f"Query: {query_id}")
     logging.info(f"Text: {text}")
+    embedding_format = negotiate_embedding_format(request, embedding_format)
+    try:
+        embedding = await aembed_text(text)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return embedding_response(embedding_format, {"query_id": query_id, "sessionid": sessionid, "embedding": embedding})
+
+@router.post("/api/v1/query/{session_id}/answer", summary="Answer", description="Answer a question from the user's documents, streamed as Server-Sent Events.",
+             dependencies=[Depends(verify_token)])
+async def answer_query(session_id: str, text: str = Query(...), user_id: int = Query(...), k: int = Query(ANSWER_TOP_K),
+                       db: Session = Depends(get_db)):
+    logging.info(f"Answer query for session {session_id}: {text}")
+    timer = StageTimer()
     try:
-        embedding = embed_text(text)
-        return {"query_id": query_id, "sessionid": sessionid, "embedding": embedding}
+        with timer.stage("embed"):
+            embedding = await aembed_text(text)
+        chunks = await run_in_threadpool(retrieve_chunks, db, user_id, embedding, k, text, timer)
+    except SQLAlchemyError as e:
+        db.rollback()
+        return handle_db_exception(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    headers = dict(EVENT_STREAM_HEADERS, **{"Server-Timing": timer.server_timing()})
+    return StreamingResponse(answer_events(text, chunks), media_type=EVENT_STREAM, headers=headers)
 
 @router.get("/api/v1/view/{session_id}/{filename}", summary="View", description="View the user's file.",
             dependencies=[Depends(verify_token)])
 async def view_document(session_id: str, filename: str):
-    if session_id not in documents or filename not in documents[session_id]:
+    text = await run_in_threadpool(session_store.get_text, session_id, filename)
+    if text is None:
         raise HTTPException(status_code=404, detail="Session or document not found")
-    return PlainTextResponse(documents[session_id][filename])
+    return PlainTextResponse(text)
 
 
-@router.post("/api/v1/fetch-xml-content/{session_id}", summary="Fetch XML Content", description="Fetch XML Content",
-             dependencies=[Depends(verify_token)])
-async def fetch_xml_content(session_id: str, request: URLRequest):
-    if session_id not in sessions:
+@router.post("/api/v1/fetch-xml-content/{session_id}", summary="Fetch XML Content",
+             description="Crawl the pages of a sitemap and chunk and embed their main text", dependencies=[Depends(verify_token)])
+async def fetch_xml_content(session_id: str, request: URLRequest, user_id: Optional[int] = Query(None),
+                            db: Session = Depends(get_db)):
+    if not await run_in_threadpool(session_store.exists, session_id):
         raise HTTPException(status_code=404, detail="Session not found")
-    
+
+    # Pages are ingested one by one as they arrive while the crawler keeps fetching the next ones.
+    pages = []
     try:
-        response = requests.get(request.url)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.content, 'xml')
-        text = ''.join(soup.stripped_strings)
-    except requests.RequestException as e:
+        async for page in SitemapCrawler().crawl(request.url):
+            summary = {"url": page.url, "status": page.status, "title": page.title}
+            stored = None
+            if page.status == "not_modified" and user_id is not None:
+                # The crawl cache is shared; the page is only current for users who stored it before.
+                stored = await run_in_threadpool(get_document_embeddings, db, user_id, page.url)
+            if page.status == "error":
+                summary["error"] = page.error
+            elif stored is not None and stored[0] is not None:
+                version, embeddings = stored
+                await run_in_threadpool(session_store.put_document, session_id, page.url, page.text, embeddings)
+                summary.update(version=version, chunks=len(embeddings), embedded=0, reused=len(embeddings), removed=0)
+            elif page.text:
+                ingested = await run_in_threadpool(ingest_document, [page.text], page.url, db=db, user_id=user_id)
+                await run_in_threadpool(session_store.put_document, session_id, page.url, page.text, ingested["embeddings"])
+                summary.update({key: ingested[key] for key in ("version", "embedded", "reused", "removed")},
+                               chunks=len(ingested["embeddings"]))
+            pages.append(summary)
+    except httpx.HTTPError as e:
         raise HTTPException(status_code=400, detail=f"Error fetching Site XML content: {str(e)}")
-    
-    embedding = embed_text(text)
-    sessions[session_id][request.url] = embedding
-    documents[session_id][request.url] = text
-
-    return JSONResponse(content={"embedding": embedding, "content": text})
+    except SessionNotFound:
+        raise HTTPException(status_code=404, detail="Session not found")
+    except SessionTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except SQLAlchemyError as e:
+        db.rollback()
+        return handle_db_exception(e)
+    return ORJSONResponse(content={"sitemap": request.url, "pages": pages})
 
 
 @router.post("/api/v1/register", summary="User Registration", description="")
-def register_user(user: UserCreate, db: Session = Depends(get_db)):
+async def register_user(user: UserCreate, db: Session = Depends(get_db)):
     try:
-        user_data = create_user(db, user)
-        return JSONResponse(content={"user": user_to_dict(user_data)})
+        with hashing_pool.admit():
+            user_data = await run_in_threadpool(create_user, db, user)
+        return ORJSONResponse(content={"user": user_to_dict(user_data)})
     except SQLAlchemyError as e:
         db.rollback()
         return handle_db_exception(e)
 
 @router.post("/api/v1/login/", summary="User Login", description="")
-def login(user: UserLogin, db: Session = Depends(get_db)):
+async def login(user: UserLogin, db: Session = Depends(get_db)):
     try:
-        token_data = authenticate_user(db, user)
-        return JSONResponse(content=token_data)
+        with hashing_pool.admit():
+            token_data = await run_in_threadpool(authenticate_user, db, user)
+        return ORJSONResponse(content=token_data)
     except SQLAlchemyError as e:
         db.rollback()
         return handle_db_exception(e)
@@ -156,16 +259,17 @@ def login(user: UserLogin, db: Session = Depends(get_db)):
 def forgot_password(request: PasswordResetRequest, db: Session = Depends(get_db)):
     try:
         reset_data = reset_password_request(db, request)
-        return JSONResponse(content=reset_data)
+        return ORJSONResponse(content=reset_data)
     except SQLAlchemyError as e:
         db.rollback()
         return handle_db_exception(e)
 
 @router.post("/api/v1/reset-password/", summary="Reset Password", description="Reset Password")
-def reset_password_endpoint(reset: PasswordReset, db: Session = Depends(get_db)):
+async def reset_password_endpoint(reset: PasswordReset, db: Session = Depends(get_db)):
     try:
-        reset_data = reset_password(db, reset)
-        return JSONResponse(content=reset_data)
+        with hashing_pool.admit():
+            reset_data = await run_in_threadpool(reset_password, db, reset)
+        return ORJSONResponse(content=reset_data)
     except SQLAlchemyError as e:
         db.rollback()
         return handle_db_exception(e)
@@ -176,7 +280,7 @@ def reset_password_endpoint(reset: PasswordReset, db: Session = Depends(get_db))
 def delete_user_endpoint(email: str, db: Session = Depends(get_db), token: str = Depends(verify_token)):
     try:
         delete_data = delete_user(db, email, token)
-        return JSONResponse(content=delete_data)
+        return ORJSONResponse(content=delete_data)
     except SQLAlchemyError as e:
         db.rollback()
         return handle_db_exception(e)
@@ -185,16 +289,56 @@ def delete_user_endpoint(email: str, db: Session = Depends(get_db), token: str =
 def logout(token: str, db: Session = Depends(get_db)):
     try:
         logout_data = logout_user(db, token)
-        return JSONResponse(content=logout_data)
+        return ORJSONResponse(content=logout_data)
     except SQLAlchemyError as e:
         db.rollback()
         return handle_db_exception(e)
 
 @router.post("/api/v1/embedding/", summary="Create Embedding", description="")
-def create_embedding_endpoint(embedding: EmbeddingCreate, db: Session = Depends(get_db)):
+def create_embedding_endpoint(embedding: EmbeddingCreate, request: Request, embedding_format: Optional[str] = Query(None),
+                              db: Session = Depends(get_db)):
+    embedding_format = negotiate_embedding_format(request, embedding_format)
     try:
-        embedding_data = create_embedding(db, embedding)
-        return JSONResponse(content={"embedding": embedding_data})
+        embedding_data = embedding_to_dict(create_embedding(db, embedding))
+        if embedding_format == "binary":
+            return embedding_response(embedding_format, embedding_data)
+        if embedding_format == "base64":
+            embedding_data["embedding"] = encode_embedding(embedding_data["embedding"], embedding_format)
+        return ORJSONResponse(content={"embedding": embedding_data})
+    except IntegrityError as e:
+        db.rollback()
+        return handle_conflict(e)
+    except SQLAlchemyError as e:
+        db.rollback()
+        return handle_db_exception(e)
+
+@router.post("/api/v1/embeddings/bulk/", summary="Create Embeddings in Bulk", description="Insert many embeddings in one transaction")
+def create_embeddings_bulk_endpoint(embeddings: List[EmbeddingCreate], db: Session = Depends(get_db)):
+    try:
+        ids = create_embeddings_bulk(db, embeddings)
+        return ORJSONResponse(content={"ids": ids})
+    except IntegrityError as e:
+        db.rollback()
+        return handle_conflict(e)
+    except SQLAlchemyError as e:
+        db.rollback()
+        return handle_db_exception(e)
+
+@router.post("/api/v1/embedding/search/", summary="Search Embeddings", description="Top-k cosine similarity or hybrid vector + full-text search over the user's stored chunks")
+def search_embeddings_endpoint(search: EmbeddingSearch, db: Session = Depends(get_db)):
+    timer = StageTimer()
+    try:
+        with timer.stage("embed"):
+            query_embedding = embed_text(search.text)
+        if search.hybrid:
+            vector_k = HYBRID_VECTOR_K if search.vector_k is None else search.vector_k
+            lexical_k = HYBRID_LEXICAL_K if search.lexical_k is None else search.lexical_k
+            matches = hybrid_search(db, search.user_id, search.text, query_embedding, search.k, vector_k, lexical_k, timer)
+        else:
+            with timer.stage("vector"):
+                matches = search_embeddings(db, search.user_id, query_embedding, search.k)
+        return ORJSONResponse(content={"matches": matches, "timings": timer.timings},
+                              headers={"Server-Timing": timer.server_timing()})
     except SQLAlchemyError as e:
         db.rollback()
         return handle_db_exception(e)
@@ -203,12 +347,27 @@ def create_embedding_endpoint(embedding: EmbeddingCreate, db: Session = Depends(
 def create_index_endpoint(index: IndexCreate, db: Session = Depends(get_db)):
     try:
         index_data = create_index(db, index)
-        return JSONResponse(content={"index": index_data})
+        return ORJSONResponse(content={"index": index_to_dict(index_data)})
+    except IntegrityError as e:
+        db.rollback()
+        return handle_conflict(e)
     except SQLAlchemyError as e:
         db.rollback()
         return handle_db_exception(e)
+@router.post("/api/v1/indices/bulk/", summary="Create Indices in Bulk", description="Insert many index rows in one transaction")
+def create_indices_bulk_endpoint(indices: List[IndexCreate], db: Session = Depends(get_db)):
+    try:
+        ids = create_indices_bulk(db, indices)
+        return ORJSONResponse(content={"ids": ids})
+    except IntegrityError as e:
+        db.rollback()
+        return handle_conflict(e)
+    except SQLAlchemyError as e:
+        db.rollback()
+        return handle_db_exception(e)
+
 @router.get("/")
 async def read_index():
-    with open("static/index.html") as f:
-        return HTMLResponse(content=f.read(), status_code=200)
+    # FileResponse streams the file from a worker thread instead of reading it on the event loop.
+    return FileResponse("static/index.html", media_type="text/html")
 
@@ -3,6 +3,9 @@ from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
 import os
+import time
+
+from .cache import LRUCache
 
 SECRET_KEY = "your_secret_key"
 ALGORITHM = "HS256"
@@ -10,6 +13,15 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Validated tokens are cached per process. Logout and user deletion invalidate
+# the local entries right away; other workers drop theirs after the TTL.
+TOKEN_CACHE_TTL_SECONDS = float(os.environ.get("TOKEN_CACHE_TTL_SECONDS", 60))
+TOKEN_CACHE_MAX_ITEMS = int(os.environ.get("TOKEN_CACHE_MAX_ITEMS", 10000))
+
+# JWT -> decoded claims, and session token -> user_id of its sessions row.
+claims_cache = LRUCache(max_items=TOKEN_CACHE_MAX_ITEMS, ttl=TOKEN_CACHE_TTL_SECONDS)
+session_cache = LRUCache(max_items=TOKEN_CACHE_MAX_ITEMS, ttl=TOKEN_CACHE_TTL_SECONDS)
+
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
     if expires_delta:
@@ -20,6 +32,19 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def decode_token(token: str) -> dict:
+    claims = claims_cache.get(token)
+    # A cached entry never outlives the token's own expiry.
+    if claims is not None and claims.get("exp", float("inf")) > time.time():
+        return claims
+    claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    claims_cache.set(token, claims)
+    return claims
+
+def invalidate_token(token: str) -> None:
+    claims_cache.pop(token)
+    session_cache.pop(token)
+
 def verify_token(token: str = Depends(oauth2_scheme)):
     if (os.environ["ENV"] == "dev"): return "testuser"
     # if token != "testuser": return "testuser"
@@ -29,7 +54,7 @@ def verify_token(token: str = Depends(oauth2_scheme)):
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(token)
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
@@ -0,0 +1,107 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class LRUCache:
+    """Thread-safe LRU mapping bounded by entry count and/or total size in bytes.
+
+    ``sizeof`` returns the size charged for a value (``sys.getsizeof`` by
+    default); the least recently used entries are evicted once either bound
+    is exceeded. With ``ttl`` set, entries also expire that many seconds
+    after they were last written.
+    """
+
+    def __init__(self, max_items: Optional[int] = None, max_bytes: Optional[int] = None,
+                 sizeof: Callable[[Any], int] = sys.getsizeof, ttl: Optional[float] = None):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.current_bytes = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return self._live_entry(key) is not None
+
+    def _live_entry(self, key: Hashable):
+        entry = self._data.get(key)
+        if entry is not None and entry[2] is not None and entry[2] <= time.monotonic():
+            del self._data[key]
+            self.current_bytes -= entry[1]
+            return None
+        return entry
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._live_entry(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: Hashable, value: Any) -> bool:
+        """Store ``value``; returns False, keeping any previous value, if it alone exceeds ``max_bytes``."""
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            return False
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= previous[1]
+            expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+            self._data[key] = (value, size, expires_at)
+            self.current_bytes += size
+            self._evict()
+        return True
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is None:
+                return default
+            self.current_bytes -= entry[1]
+            return entry[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.current_bytes = 0
+
+    def _evict(self) -> None:
+        # Expired entries at the cold end go first, so an idle cache does not keep them around.
+        now = time.monotonic()
+        while self._data:
+            key, (_, size, expires_at) = next(iter(self._data.items()))
+            if expires_at is None or expires_at > now:
+                break
+            del self._data[key]
+            self.current_bytes -= size
+        while self._data and (
+            (self.max_items is not None and len(self._data) > self.max_items)
+            or (self.max_bytes is not None and self.current_bytes > self.max_bytes)
+        ):
+            _, (_, size, _) = self._data.popitem(last=False)
+            self.current_bytes -= size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._data),
+            "bytes": self.current_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
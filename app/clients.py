@@ -0,0 +1,139 @@
+import logging
+import os
+import random
+import threading
+import time
+from typing import Callable, Optional, TypeVar
+
+import httpx
+import openai
+from openai import OpenAI
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+HTTP_TIMEOUT = float(os.environ.get("HTTP_TIMEOUT", 30))
+HTTP_MAX_CONNECTIONS = int(os.environ.get("HTTP_MAX_CONNECTIONS", 100))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20))
+
+OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL")  # e.g. a local fake server in tests
+OPENAI_TIMEOUT = float(os.environ.get("OPENAI_TIMEOUT", 60))
+OPENAI_MAX_RETRIES = int(os.environ.get("OPENAI_MAX_RETRIES", 5))
+OPENAI_MAX_CONCURRENCY = int(os.environ.get("OPENAI_MAX_CONCURRENCY", 16))
+OPENAI_BACKOFF_BASE = float(os.environ.get("OPENAI_BACKOFF_BASE", 0.5))
+OPENAI_BACKOFF_MAX = float(os.environ.get("OPENAI_BACKOFF_MAX", 20))
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Process-wide async HTTP client, so outbound calls reuse pooled keep-alive connections."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=HTTP_TIMEOUT,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            ),
+        )
+    return _http_client
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class OpenAIClientManager:
+    """Owns the process-wide OpenAI client and the policy for calling it.
+
+    The client keeps a pooled httpx connection (keep-alive, TLS reuse) for the
+    life of the process. ``call`` bounds concurrent requests and retries 429,
+    5xx and connection errors with full-jitter exponential backoff, honouring
+    Retry-After. Tests can inject their own client with ``set_client``.
+    """
+
+    def __init__(self, base_url: Optional[str] = OPENAI_BASE_URL, timeout: float = OPENAI_TIMEOUT,
+                 max_retries: int = OPENAI_MAX_RETRIES, max_concurrency: int = OPENAI_MAX_CONCURRENCY,
+                 backoff_base: float = OPENAI_BACKOFF_BASE, backoff_max: float = OPENAI_BACKOFF_MAX):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._client: Optional[OpenAI] = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> OpenAI:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = OpenAI(
+                        api_key=os.environ.get("OPENAI_API_KEY"),
+                        base_url=self.base_url,
+                        timeout=self.timeout,
+                        max_retries=0,  # retries are handled by call()
+                        http_client=httpx.Client(
+                            timeout=self.timeout,
+                            limits=httpx.Limits(
+                                max_connections=HTTP_MAX_CONNECTIONS,
+                                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                            ),
+                        ),
+                    )
+        return self._client
+
+    def set_client(self, client: Optional[OpenAI]) -> None:
+        with self._lock:
+            self._client = client
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def call(self, request: Callable[[OpenAI], T]) -> T:
+        attempt = 0
+        while True:
+            try:
+                with self._semaphore:
+                    return request(self.client)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                delay = _retry_after(e)
+                delay = self.backoff(attempt) if delay is None else min(delay, self.backoff_max)
+                logger.warning(f"OpenAI request failed ({e.__class__.__name__}), retrying in {delay:.2f}s")
+                time.sleep(delay)
+                attempt += 1
+
+    def close(self) -> None:
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+
+openai_clients = OpenAIClientManager()
+
+
+async def close_clients() -> None:
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+    openai_clients.close()
@@ -0,0 +1,156 @@
+import os
+import re
+import zlib
+from collections import deque
+from typing import Iterable, Iterator, NamedTuple
+
+from ..embedding_batcher import estimate_tokens
+
+CHUNK_MAX_TOKENS = int(os.environ.get("CHUNK_MAX_TOKENS", 500))
+CHUNK_OVERLAP_TOKENS = int(os.environ.get("CHUNK_OVERLAP_TOKENS", 50))
+# A chunk also ends after a paragraph whose checksum is divisible by this, once it
+# holds half the budget. These cut points depend only on the text, so an
+# edit changes the chunks around it instead of shifting every later boundary
+# (which would re-embed the rest of the document). 0 disables them.
+CHUNK_BOUNDARY_DIVISOR = int(os.environ.get("CHUNK_BOUNDARY_DIVISOR", 4))
+# A "paragraph" without blank lines longer than this is flushed at a line break
+# so a single huge block never has to be buffered whole.
+MAX_PARAGRAPH_CHARS = 16000
+
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+
+
+class Chunk(NamedTuple):
+    chunk_index: int
+    paragraph: str  # paragraph span covered by the chunk, e.g. "12" or "12-14"
+    text: str
+
+
+def iter_paragraphs(pieces: Iterable[str]) -> Iterator[str]:
+    """Re-split streamed text (pages, rows, ...) into paragraphs.
+
+    Paragraphs may span piece boundaries, so only the unfinished tail of the
+    stream is buffered.
+    """
+    buffer = ""
+    for piece in pieces:
+        buffer += piece
+        parts = PARAGRAPH_BREAK.split(buffer)
+        buffer = parts.pop()
+        while len(buffer) > MAX_PARAGRAPH_CHARS:
+            cut = buffer.rfind("\n", 0, MAX_PARAGRAPH_CHARS)
+            cut = cut if cut > 0 else MAX_PARAGRAPH_CHARS
+            parts.append(buffer[:cut])
+            buffer = buffer[cut:]
+        for part in parts:
+            part = part.strip()
+            if part:
+                yield part
+        # Keep words of consecutive pieces (e.g. PDF pages) from running together.
+        if buffer and not buffer[-1].isspace():
+            buffer += "\n"
+    buffer = buffer.strip()
+    if buffer:
+        yield buffer
+
+
+def _tokens_for_chars(chars: int) -> int:
+    # Same heuristic as estimate_tokens, without building the string.
+    return chars // 4 + 1
+
+
+def _split_words(text: str, max_tokens: int) -> Iterator[str]:
+    if estimate_tokens(text) <= max_tokens:
+        yield text
+        return
+    words, chars = [], 0
+    for word in text.split():
+        if words and _tokens_for_chars(chars + len(word)) > max_tokens:
+            yield " ".join(words)
+            words, chars = [], 0
+        words.append(word)
+        chars += len(word) + 1
+    if words:
+        yield " ".join(words)
+
+
+def _tail(text: str, max_tokens: int) -> str:
+    words, chars = [], 0
+    for word in reversed(text.split()):
+        chars += len(word) + 1
+        if _tokens_for_chars(chars) > max_tokens:
+            break
+        words.append(word)
+    return " ".join(reversed(words))
+
+
+def _is_boundary(text: str, divisor: int) -> bool:
+    return divisor > 0 and zlib.crc32(text.encode()) % divisor == 0
+
+
+def _carry_over(window: "deque[tuple]", overlap_tokens: int) -> "deque[tuple]":
+    # Whole trailing paragraphs when they fit in the overlap, otherwise the last one's trailing words.
+    overlap, overlap_size = deque(), 0
+    while window and overlap_size + window[-1][2] <= overlap_tokens:
+        overlap_size += window[-1][2]
+        overlap.appendleft(window.pop())
+    if not overlap and window and overlap_tokens > 0:
+        last_number, last_text, _ = window[-1]
+        tail = _tail(last_text, overlap_tokens)
+        if tail:
+            overlap.append((last_number, tail, estimate_tokens(tail)))
+    return overlap
+
+
+def chunk_text(pieces: Iterable[str], max_tokens: int = CHUNK_MAX_TOKENS,
+               overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+               boundary_divisor: int = CHUNK_BOUNDARY_DIVISOR) -> Iterator[Chunk]:
+    """Pack streamed paragraphs into overlapping chunks of at most ``max_tokens``.
+
+    Paragraphs are kept whole unless a single one exceeds the budget. Each
+    chunk starts with up to ``overlap_tokens`` from the end of the previous
+    one (whole paragraphs when they fit, otherwise the trailing words).
+    Chunks end early at content-defined boundaries (see CHUNK_BOUNDARY_DIVISOR).
+    """
+    window: "deque[tuple]" = deque()  # (paragraph number, text, tokens)
+    window_tokens = 0
+    min_tokens = max_tokens // 2
+    chunk_index = 0
+    has_new_text = False
+
+    def emit() -> Chunk:
+        first, last = window[0][0], window[-1][0]
+        span = str(first) if first == last else f"{first}-{last}"
+        return Chunk(chunk_index, span, "\n\n".join(text for _, text, _ in window))
+
+    for number, paragraph in enumerate(iter_paragraphs(pieces)):
+        for part in _split_words(paragraph, max_tokens - overlap_tokens):
+            part_tokens = estimate_tokens(part)
+            if has_new_text and window_tokens + part_tokens > max_tokens:
+                yield emit()
+                chunk_index += 1
+                has_new_text = False
+                window = _carry_over(window, overlap_tokens)
+                window_tokens = sum(tokens for _, _, tokens in window)
+            window.append((number, part, part_tokens))
+            window_tokens += part_tokens
+            has_new_text = True
+            if window_tokens >= min_tokens and _is_boundary(part, boundary_divisor):
+                yield emit()
+                chunk_index += 1
+                has_new_text = False
+                window = _carry_over(window, overlap_tokens)
+                window_tokens = sum(tokens for _, _, tokens in window)
+    if has_new_text:
+        yield emit()
+
+
+def batched(items: Iterable, size: int) -> Iterator[list]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
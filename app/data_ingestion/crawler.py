@@ -0,0 +1,254 @@
+import asyncio
+import gzip
+import logging
+import os
+import re
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import AsyncIterator, List, NamedTuple, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+
+import httpx
+import orjson
+from bs4 import BeautifulSoup
+from fastapi.concurrency import run_in_threadpool
+
+from ..cache import LRUCache
+from ..clients import get_http_client
+from ..session_store import compress_text, decompress_text
+
+logger = logging.getLogger(__name__)
+
+# Requests in flight per host; pages of different hosts are fetched in parallel.
+CRAWL_PER_HOST_CONCURRENCY = int(os.environ.get("CRAWL_PER_HOST_CONCURRENCY", 4))
+CRAWL_MAX_PAGES = int(os.environ.get("CRAWL_MAX_PAGES", 500))
+# Nested sitemaps followed from a sitemap index.
+CRAWL_MAX_SITEMAPS = int(os.environ.get("CRAWL_MAX_SITEMAPS", 50))
+# Fetched pages waiting to be chunked and embedded; fetching pauses when the consumer falls behind.
+CRAWL_MAX_BUFFERED_PAGES = int(os.environ.get("CRAWL_MAX_BUFFERED_PAGES", 16))
+# "memory" keeps validators (ETag / Last-Modified) and extracted text per process; "redis" shares them.
+CRAWL_CACHE = os.environ.get("CRAWL_CACHE", "memory")
+CRAWL_REDIS_URL = os.environ.get("CRAWL_REDIS_URL", "redis://localhost:6379/3")
+CRAWL_CACHE_TTL_SECONDS = int(os.environ.get("CRAWL_CACHE_TTL_SECONDS", 7 * 24 * 60 * 60))
+CRAWL_CACHE_MAX_BYTES = int(os.environ.get("CRAWL_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+CRAWL_USER_AGENT = os.environ.get("CRAWL_USER_AGENT", "GuruCrawler/1.0")
+
+HTML_TYPES = ("text/html", "application/xhtml+xml", "text/plain")
+# Elements that never hold a page's main text.
+BOILERPLATE_TAGS = ["script", "style", "noscript", "template", "svg", "nav", "header", "footer", "aside", "form", "iframe"]
+BLOCK_TAGS = ["p", "div", "section", "article", "li", "pre", "blockquote", "table", "tr", "h1", "h2", "h3", "h4", "h5", "h6", "br", "hr"]
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+
+
+class Page(NamedTuple):
+    url: str
+    status: str  # "fetched", "not_modified" (text from the cache) or "error"
+    title: str = ""
+    text: str = ""
+    error: Optional[str] = None
+
+
+def parse_sitemap(content: bytes, base_url: str) -> Tuple[List[str], List[str]]:
+    """(page URLs, nested sitemap URLs) of a sitemap or sitemap index, gzipped or not."""
+    if content[:2] == b"\x1f\x8b":
+        content = gzip.decompress(content)
+    soup = BeautifulSoup(content, "xml")
+    pages = [urljoin(base_url, loc.get_text(strip=True)) for loc in soup.select("url > loc")]
+    sitemaps = [urljoin(base_url, loc.get_text(strip=True)) for loc in soup.select("sitemap > loc")]
+    return pages, sitemaps
+
+
+def extract_main_text(html: str) -> Tuple[str, str]:
+    """(title, main text) of an HTML page, with one paragraph per block element.
+
+    Navigation, headers, footers, scripts and forms are dropped; the text is
+    taken from <main>, <article> or role="main" when the page has one.
+    """
+    soup = BeautifulSoup(html, "lxml")
+    title = soup.title.get_text(strip=True) if soup.title else ""
+    for tag in soup.find_all(BOILERPLATE_TAGS):
+        tag.decompose()
+    root = soup.find("main") or soup.find("article") or soup.find(attrs={"role": "main"}) or soup.body or soup
+    for tag in root.find_all(BLOCK_TAGS):
+        tag.insert_after("\n\n")
+    paragraphs = (" ".join(part.split()) for part in PARAGRAPH_BREAK.split(root.get_text()))
+    return title, "\n\n".join(paragraph for paragraph in paragraphs if paragraph)
+
+
+class CrawlCache(ABC):
+    """Last validators and extracted text per page URL, for conditional re-fetches.
+
+    Shared by every user: a "not_modified" page only means the page is the
+    one seen by the last crawl, not that the crawling user has stored it.
+    """
+
+    @abstractmethod
+    def get(self, url: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def put(self, url: str, entry: dict) -> None:
+        ...
+
+
+class MemoryCrawlCache(CrawlCache):
+    def __init__(self, ttl: float = CRAWL_CACHE_TTL_SECONDS, max_bytes: int = CRAWL_CACHE_MAX_BYTES):
+        self._entries = LRUCache(max_bytes=max_bytes, ttl=ttl or None, sizeof=len)
+
+    def get(self, url: str) -> Optional[dict]:
+        data = self._entries.get(url)
+        return None if data is None else orjson.loads(decompress_text(data))
+
+    def put(self, url: str, entry: dict) -> None:
+        self._entries.set(url, compress_text(orjson.dumps(entry).decode()))
+
+
+class RedisCrawlCache(CrawlCache):
+    def __init__(self, client=None, url: str = CRAWL_REDIS_URL, ttl: int = CRAWL_CACHE_TTL_SECONDS):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.redis = client
+        self.ttl = ttl
+
+    def get(self, url: str) -> Optional[dict]:
+        data = self.redis.get(f"crawl:{url}")
+        return None if data is None else orjson.loads(decompress_text(data))
+
+    def put(self, url: str, entry: dict) -> None:
+        self.redis.set(f"crawl:{url}", compress_text(orjson.dumps(entry).decode()), ex=self.ttl or None)
+
+
+def create_crawl_cache(backend: str = CRAWL_CACHE) -> CrawlCache:
+    if backend == "redis":
+        return RedisCrawlCache()
+    if backend == "memory":
+        return MemoryCrawlCache()
+    raise ValueError(f"Unknown crawl cache backend: {backend}")
+
+
+_crawl_cache: Optional[CrawlCache] = None
+
+
+def get_crawl_cache() -> CrawlCache:
+    # Created on the first crawl; the memory backend is bounded by CRAWL_CACHE_MAX_BYTES.
+    global _crawl_cache
+    if _crawl_cache is None:
+        _crawl_cache = create_crawl_cache()
+    return _crawl_cache
+
+
+class SitemapCrawler:
+    """Fetches the pages listed in a sitemap (and the sitemaps of a sitemap index).
+
+    Requests go through the shared keep-alive HTTP client with at most
+    ``per_host`` in flight per host. Pages whose validators are cached are
+    re-fetched conditionally; a 304 reuses the cached text.
+    """
+
+    def __init__(self, client: Optional[httpx.AsyncClient] = None, cache: Optional[CrawlCache] = None,
+                 per_host: int = CRAWL_PER_HOST_CONCURRENCY, max_pages: int = CRAWL_MAX_PAGES,
+                 max_sitemaps: int = CRAWL_MAX_SITEMAPS, max_buffered: int = CRAWL_MAX_BUFFERED_PAGES):
+        self.client = client or get_http_client()
+        self.cache = cache or get_crawl_cache()
+        self.max_pages = max_pages
+        self.max_sitemaps = max_sitemaps
+        self.max_buffered = max_buffered
+        self._host_limits = defaultdict(lambda: asyncio.Semaphore(per_host))
+
+    async def fetch(self, url: str, headers: Optional[dict] = None) -> httpx.Response:
+        async with self._host_limits[urlsplit(url).netloc]:
+            return await self.client.get(url, headers={"User-Agent": CRAWL_USER_AGENT, **(headers or {})})
+
+    async def read_sitemap(self, url: str) -> Tuple[List[str], List[str]]:
+        response = await self.fetch(url)
+        response.raise_for_status()
+        return await run_in_threadpool(parse_sitemap, response.content, str(response.url))
+
+    async def fetch_page(self, url: str) -> Page:
+        cached = await run_in_threadpool(self.cache.get, url)
+        headers = {}
+        if cached and cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached and cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+        try:
+            response = await self.fetch(url, headers)
+            if response.status_code == 304 and cached:
+                return Page(url, "not_modified", cached["title"], cached["text"])
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            return Page(url, "error", error=str(e))
+        content_type = response.headers.get("content-type", "").split(";")[0].strip()
+        if content_type and content_type not in HTML_TYPES:
+            return Page(url, "error", error=f"Unsupported content type {content_type}")
+        if content_type == "text/plain":
+            title, text = "", response.text
+        else:
+            title, text = await run_in_threadpool(extract_main_text, response.text)
+        etag, last_modified = response.headers.get("etag"), response.headers.get("last-modified")
+        if etag or last_modified:
+            entry = {"etag": etag, "last_modified": last_modified, "title": title, "text": text}
+            await run_in_threadpool(self.cache.put, url, entry)
+        return Page(url, "fetched", title, text)
+
+    async def crawl(self, sitemap_url: str) -> AsyncIterator[Page]:
+        """Pages of the sitemap in the order they finish downloading.
+
+        Errors reading the top-level sitemap are raised; failed pages are
+        yielded with status "error" and nested sitemaps that fail are skipped.
+        """
+        pages, sitemaps = await self.read_sitemap(sitemap_url)
+        results: asyncio.Queue = asyncio.Queue()
+        buffered = asyncio.Semaphore(self.max_buffered)
+        tasks = set()
+        seen_pages, seen_sitemaps = set(), {sitemap_url}
+        done = object()
+
+        def finished(task: asyncio.Task) -> None:
+            tasks.discard(task)
+            if not task.cancelled() and task.exception() is not None:
+                logger.warning(f"Crawl task failed: {task.exception()}")
+            if not tasks:
+                results.put_nowait(done)
+
+        def schedule(page_urls: List[str], sitemap_urls: List[str]) -> None:
+            for url in sitemap_urls:
+                if url not in seen_sitemaps and len(seen_sitemaps) <= self.max_sitemaps:
+                    seen_sitemaps.add(url)
+                    task = asyncio.create_task(visit_sitemap(url))
+                    tasks.add(task)
+                    task.add_done_callback(finished)
+            for url in page_urls:
+                if url not in seen_pages and len(seen_pages) < self.max_pages:
+                    seen_pages.add(url)
+                    task = asyncio.create_task(visit_page(url))
+                    tasks.add(task)
+                    task.add_done_callback(finished)
+
+        async def visit_sitemap(url: str) -> None:
+            try:
+                schedule(*await self.read_sitemap(url))
+            except httpx.HTTPError as e:
+                logger.warning(f"Skipping sitemap {url}: {e}")
+
+        async def visit_page(url: str) -> None:
+            # Released once the consumer has taken the page.
+            await buffered.acquire()
+            try:
+                page = await self.fetch_page(url)
+            except BaseException:
+                buffered.release()
+                raise
+            results.put_nowait(page)
+
+        schedule(pages, sitemaps)
+        if not tasks:
+            return
+        try:
+            while (page := await results.get()) is not done:
+                buffered.release()
+                yield page
+        finally:
+            for task in tasks:
+                task.cancel()
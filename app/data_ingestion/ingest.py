@@ -0,0 +1,125 @@
+import hashlib
+import logging
+import os
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from ..database.models import Embedding, Index
+from ..database.schemas import EmbeddingCreate, IndexCreate
+from ..database.services import (create_embeddings_bulk, create_indices_bulk, get_live_chunks, get_embedding_vectors,
+                                 lock_document, move_chunks, tombstone_chunks)
+from ..database.vector_index import remove_from_user_index
+from ..utils import embed_texts, EMBEDDING_MODEL
+from .chunker import Chunk, batched, chunk_text
+
+logger = logging.getLogger(__name__)
+
+# Chunks embedded (and written) per round; bounds how much of a document is in flight.
+INGEST_BATCH_SIZE = int(os.environ.get("INGEST_BATCH_SIZE", 64))
+
+
+def chunk_hash(text: str) -> str:
+    # The model is part of the hash, so changing EMBEDDING_MODEL re-embeds every chunk.
+    return hashlib.sha256(f"{EMBEDDING_MODEL}\n{text}".encode()).hexdigest()
+
+
+def next_version(db: Session, user_id: int, file_path: str) -> int:
+    current = (
+        db.query(func.max(Embedding.version))
+        .filter(Embedding.user_id == user_id, Embedding.file_path == file_path)
+        .scalar()
+    )
+    return (current or 0) + 1
+
+
+def embed_chunks(pieces: Iterable[str]) -> Iterator[Tuple[Chunk, List[float]]]:
+    for batch in batched(chunk_text(pieces), INGEST_BATCH_SIZE):
+        embeddings = embed_texts([chunk.text for chunk in batch])
+        yield from zip(batch, embeddings)
+
+
+def _position(row_id: int, version: int, chunk: Chunk) -> dict:
+    return {"id": row_id, "version": version, "chunk_index": chunk.chunk_index, "paragraph": chunk.paragraph}
+
+
+def ingest_document(pieces: Iterable[str], file_path: str, db: Optional[Session] = None,
+                    user_id: Optional[int] = None) -> dict:
+    """Chunk, embed and (when a user is given) store a streamed document.
+
+    Storing a new version of a document only embeds the chunks whose text is
+    new: rows of unchanged chunks are moved to the new version with their
+    vectors, and rows of chunks that no longer occur are tombstoned.
+    Returns the version written, the per-chunk embeddings in chunk order and
+    how many chunks were embedded, reused and removed.
+    """
+    if db is None or user_id is None:
+        embeddings = [embedding for _, embedding in embed_chunks(pieces)]
+        logger.info(f"Ingested {file_path}: {len(embeddings)} chunks, not stored")
+        return {"file_path": file_path, "version": None, "embeddings": embeddings,
+                "embedded": len(embeddings), "reused": 0, "removed": 0}
+
+    # Concurrent uploads of the document wait here, then see the version the other one wrote.
+    lock_document(db, user_id, file_path)
+    version = next_version(db, user_id, file_path)
+    live_embeddings, live_indices = get_live_chunks(db, user_id, file_path)
+    embeddings = []
+    embedded = reused = 0
+    # The whole document is written in one transaction, one executemany per batch and table.
+    for batch in batched(chunk_text(pieces), INGEST_BATCH_SIZE):
+        hashes = [chunk_hash(chunk.text) for chunk in batch]
+        reuse = {}
+        for i, content_hash in enumerate(hashes):
+            if live_embeddings.get(content_hash):
+                reuse[i] = live_embeddings[content_hash].pop(0)
+        changed = [i for i in range(len(batch)) if i not in reuse]
+
+        stored = get_embedding_vectors(db, list(reuse.values()))
+        vectors = {i: np.asarray(stored[row_id], dtype=np.float32).tolist() for i, row_id in reuse.items()}
+        vectors.update(zip(changed, embed_texts([batch[i].text for i in changed]) if changed else []))
+        embeddings.extend(vectors[i] for i in range(len(batch)))
+        embedded += len(changed)
+        reused += len(reuse)
+
+        move_chunks(db, Embedding, [_position(row_id, version, batch[i]) for i, row_id in reuse.items()])
+        create_embeddings_bulk(db, [
+            EmbeddingCreate(
+                user_id=user_id,
+                file_path=file_path,
+                version=version,
+                chunk_index=batch[i].chunk_index,
+                paragraph=batch[i].paragraph,
+                embedding=vectors[i],
+                content_hash=hashes[i],
+            )
+            for i in changed
+        ], commit=False)
+
+        moved, created = [], []
+        for chunk, content_hash in zip(batch, hashes):
+            if live_indices.get(content_hash):
+                moved.append(_position(live_indices[content_hash].pop(0), version, chunk))
+            else:
+                created.append(IndexCreate(
+                    user_id=user_id,
+                    file_path=file_path,
+                    version=version,
+                    chunk_index=chunk.chunk_index,
+                    paragraph=chunk.paragraph,
+                    text_chunk=chunk.text,
+                    content_hash=content_hash,
+                ))
+        move_chunks(db, Index, moved)
+        create_indices_bulk(db, created, commit=False)
+
+    removed_embeddings = [row_id for row_ids in live_embeddings.values() for row_id in row_ids]
+    removed_indices = [row_id for row_ids in live_indices.values() for row_id in row_ids]
+    tombstone_chunks(db, removed_embeddings, removed_indices)
+    db.commit()
+    remove_from_user_index(user_id, removed_embeddings)
+    logger.info(f"Ingested {file_path} version {version}: {len(embeddings)} chunks, "
+                f"{embedded} embedded, {reused} reused, {len(removed_embeddings)} removed")
+    return {"file_path": file_path, "version": version, "embeddings": embeddings,
+            "embedded": embedded, "reused": reused, "removed": len(removed_embeddings)}
@@ -0,0 +1,70 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Awaitable, Callable, List, Optional
+
+from .reader import iter_read
+from ..upload_store import PageStats, write_pages
+
+logger = logging.getLogger(__name__)
+
+PARSE_WORKERS = int(os.environ.get("PARSE_WORKERS", os.cpu_count() or 1))
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def get_parse_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # Forking after the embedding batcher, Argon2 and anyio threads exist can
+        # deadlock a child on a lock held by one of them; forkserver children start clean.
+        _executor = ProcessPoolExecutor(max_workers=PARSE_WORKERS, mp_context=multiprocessing.get_context("forkserver"))
+    return _executor
+
+
+def shutdown_parse_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def parse_file(file_path: str, pages_path: str) -> PageStats:
+    # Runs in a worker process; PyPDF2/python-docx hold the GIL for the whole parse.
+    # Pages are written to pages_path in batches as they are read, never held whole.
+    return write_pages(pages_path, iter_read(file_path))
+
+
+async def parse_file_async(file_path: str, pages_path: Optional[str] = None) -> PageStats:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_parse_executor(), parse_file, file_path, pages_path or f"{file_path}.pages")
+
+
+async def parse_files(file_paths: List[str],
+                      parse: Callable[[str], Awaitable[PageStats]] = parse_file_async) -> List[dict]:
+    """Parse files in parallel across the pool, logging progress as each one finishes.
+
+    Returns one result per path, in order: the number of ``pages`` and
+    ``characters`` on success, or ``error``.
+    """
+    results: List[dict] = [{} for _ in file_paths]
+
+    async def parse_one(position: int, file_path: str):
+        started = time.perf_counter()
+        try:
+            stats = await parse(file_path)
+            results[position] = {"pages": stats.pages, "characters": stats.characters,
+                                 "parse_seconds": round(time.perf_counter() - started, 3)}
+        except Exception as e:
+            logger.error(f"Error parsing {file_path}: {e}")
+            results[position] = {"error": str(e)}
+        return file_path
+
+    tasks = [asyncio.create_task(parse_one(position, path)) for position, path in enumerate(file_paths)]
+    for done, finished in enumerate(asyncio.as_completed(tasks), start=1):
+        file_path = await finished
+        logger.info(f"Parsed {done}/{len(file_paths)} files ({file_path})")
+    return results
@@ -1,41 +1,100 @@
+import re
+from typing import Iterator
+
 from PyPDF2 import PdfReader
 import docx
+import openpyxl
 
 from ..utils import  ALLOWED_EXTENSIONS
 
+TXT_BLOCK_SIZE = 64 * 1024
+XLSX_ROW_BATCH = 500
+LAST_SPACE = re.compile(r'\s(?=\S*$)')
+
 
 def allowed_file(filename: str) -> bool:
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def read_pdf(file_path: str) -> str:
+def iter_pdf(file_path: str) -> Iterator[str]:
     reader = PdfReader(file_path)
-    text = ''
     for page in reader.pages:
-        text += page.extract_text()
-    return text
+        yield (page.extract_text() or '') + '\n'
 
-def read_docx(file_path: str) -> str:
+def iter_docx(file_path: str) -> Iterator[str]:
     doc = docx.Document(file_path)
-    text = '\n'.join([paragraph.text for paragraph in doc.paragraphs])
-    return text
+    for paragraph in doc.paragraphs:
+        if paragraph.text.strip():
+            yield paragraph.text + '\n\n'
 
-def read_txt(file_path: str) -> str:
+def iter_txt(file_path: str) -> Iterator[str]:
+    # Blocks end after their last line break (or space) and the rest is carried
+    # into the next block, so a word is never split across two pieces.
     with open(file_path, 'r', encoding='utf-8') as file:
-        text = file.read()
-    return text
+        rest = ''
+        while True:
+            block = file.read(TXT_BLOCK_SIZE)
+            if not block:
+                break
+            last = len(block) < TXT_BLOCK_SIZE
+            block = rest + block
+            cut = len(block) if last else block.rfind('\n') + 1 or _after_last_space(block)
+            if not cut:
+                cut = len(block)
+            yield block[:cut]
+            rest = block[cut:]
+        if rest:
+            yield rest
+
+def _after_last_space(text: str) -> int:
+    match = LAST_SPACE.search(text)
+    return match.end() if match else 0
+
+def iter_xlsx(file_path: str) -> Iterator[str]:
+    # Read-only mode streams rows from the sheet XML instead of loading the workbook.
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            rows = sheet.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                continue
+            header_line = '\t'.join('' if value is None else str(value) for value in header)
+            batch = []
+            for row in rows:
+                batch.append('\t'.join('' if value is None else str(value) for value in row))
+                if len(batch) >= XLSX_ROW_BATCH:
+                    # Repeat the header so every batch (and chunk) is self-describing.
+                    yield header_line + '\n' + '\n'.join(batch) + '\n\n'
+                    batch = []
+            if batch:
+                yield header_line + '\n' + '\n'.join(batch) + '\n\n'
+    finally:
+        workbook.close()
+
+READERS = {
+    'pdf': iter_pdf,
+    'docx': iter_docx,
+    'txt': iter_txt,
+    'xlsx': iter_xlsx,
+}
+
+def iter_read(file_path: str) -> Iterator[str]:
+    extension = file_path.rsplit('.', 1)[-1].lower() if '.' in file_path else ''
+    if extension not in READERS:
+        raise ValueError(f"Unsupported file type: {file_path}")
+    return READERS[extension](file_path)
+
+def read_pdf(file_path: str) -> str:
+    return ''.join(iter_pdf(file_path))
+
+def read_docx(file_path: str) -> str:
+    return ''.join(iter_docx(file_path))
+
+def read_txt(file_path: str) -> str:
+    return ''.join(iter_txt(file_path))
 
 def read_xlsx(file_path: str) -> str:
-    df = pd.read_excel(file_path)
-    return df.to_string()
+    return ''.join(iter_xlsx(file_path))
 
 def read(file_path: str) -> str:
-    if file_path.endswith('.pdf'):
-        return read_pdf(file_path)
-    elif file_path.endswith('.docx'):
-        return read_docx(file_path)
-    elif file_path.endswith('.txt'):
-        return read_txt(file_path)
-    elif file_path.endswith('.xlsx'):
-        return read_xlsx(file_path)
-    else:
-        raise ValueError(f"Unsupported file type: {file_path}")
+    return ''.join(iter_read(file_path))
@@ -0,0 +1,221 @@
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+from .vector_index import FlatIndex, normalize
+
+logger = logging.getLogger(__name__)
+
+# Recall/latency knobs. More lists make each probe cheaper; probing more lists
+# raises recall at the cost of scanning more vectors per query.
+IVF_NLIST = int(os.environ.get("IVF_NLIST", 0))  # 0 -> ~4 * sqrt(n) at training time
+IVF_NPROBE = int(os.environ.get("IVF_NPROBE", 8))
+IVF_TRAIN_ITERATIONS = int(os.environ.get("IVF_TRAIN_ITERATIONS", 10))
+# Below this many vectors the index stays exact; training happens once it is reached.
+IVF_MIN_TRAIN_SIZE = int(os.environ.get("IVF_MIN_TRAIN_SIZE", 10000))
+# Retrain the centroids when the corpus has grown this many times since the last training.
+IVF_RETRAIN_FACTOR = float(os.environ.get("IVF_RETRAIN_FACTOR", 4))
+ASSIGN_BATCH_SIZE = 8192
+TRAIN_SAMPLES_PER_LIST = 256
+
+
+def _assign(matrix: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    assignments = np.empty(matrix.shape[0], dtype=np.int64)
+    for start in range(0, matrix.shape[0], ASSIGN_BATCH_SIZE):
+        batch = matrix[start:start + ASSIGN_BATCH_SIZE]
+        assignments[start:start + ASSIGN_BATCH_SIZE] = np.argmax(batch @ centroids.T, axis=1)
+    return assignments
+
+
+def train_centroids(matrix: np.ndarray, nlist: int, iterations: int = IVF_TRAIN_ITERATIONS, seed: int = 0) -> np.ndarray:
+    """Spherical k-means over normalized rows, trained on a bounded sample."""
+    rng = np.random.default_rng(seed)
+    sample_size = min(matrix.shape[0], nlist * TRAIN_SAMPLES_PER_LIST)
+    sample = matrix[rng.choice(matrix.shape[0], sample_size, replace=False)]
+    centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = _assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+        counts = np.bincount(assignments, minlength=nlist)
+        empty = counts == 0
+        if empty.any():
+            # Re-seed empty lists with random samples instead of leaving them dead.
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()), replace=False)]
+        centroids = normalize(sums)
+    return centroids
+
+
+def _build_lists(dim: int, ids: np.ndarray, matrix: np.ndarray, centroids: np.ndarray) -> List[FlatIndex]:
+    lists = [FlatIndex(dim) for _ in range(centroids.shape[0])]
+    assignments = _assign(matrix, centroids)
+    order = np.argsort(assignments, kind="stable")
+    bounds = np.searchsorted(assignments[order], np.arange(len(lists) + 1))
+    for list_id in range(len(lists)):
+        selected = order[bounds[list_id]:bounds[list_id + 1]]
+        lists[list_id].add(ids[selected], matrix[selected])
+    return lists
+
+
+def _add_to_lists(lists: List[FlatIndex], centroids: np.ndarray, ids: np.ndarray, matrix: np.ndarray) -> None:
+    assignments = _assign(matrix, centroids)
+    for list_id in np.unique(assignments):
+        selected = assignments == list_id
+        lists[list_id].add(ids[selected], matrix[selected])
+
+
+class IVFIndex:
+    """Approximate cosine-similarity index with an inverted file of flat lists.
+
+    Vectors are bucketed by their nearest centroid and a query only scans the
+    ``nprobe`` closest buckets. Until ``min_train_size`` vectors have been
+    added the index answers exactly from a single flat list.
+
+    Training triggered by ``add`` runs in a background thread on a snapshot;
+    searches keep using the current lists until the trained ones are swapped in.
+    """
+
+    def __init__(self, nlist: int = IVF_NLIST, nprobe: int = IVF_NPROBE, min_train_size: int = IVF_MIN_TRAIN_SIZE,
+                 dim: int = None):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.dim = dim
+        self.centroids = None
+        self._lists: List[FlatIndex] = [FlatIndex(dim)]
+        self._trained_size = 0
+        self.max_id = 0
+        self.refreshed_at = 0.0
+        self.persisted_size = 0
+        self._lock = threading.RLock()
+        # Serializes trainings; _changes records adds/removes made while one runs.
+        self._train_lock = threading.Lock()
+        self._changes = None
+        self._trainer = None
+
+    def __len__(self) -> int:
+        return sum(len(inverted_list) for inverted_list in self._lists)
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def rows(self) -> Tuple[np.ndarray, np.ndarray]:
+        with self._lock:
+            parts = [inverted_list.rows() for inverted_list in self._lists if len(inverted_list)]
+        if not parts:
+            return np.empty(0, dtype=np.int64), np.empty((0, self.dim or 0), dtype=np.float32)
+        return np.concatenate([ids for ids, _ in parts]), np.concatenate([matrix for _, matrix in parts])
+
+    def add(self, ids: Sequence[int], vectors) -> None:
+        ids = np.asarray(ids, dtype=np.int64)
+        if ids.size == 0:
+            return
+        matrix = normalize(vectors)
+        with self._lock:
+            if self.dim is None:
+                self.dim = matrix.shape[1]
+            if self._changes is not None:
+                self._changes.append((ids, matrix))
+            if not self.trained:
+                self._lists[0].add(ids, matrix)
+                if len(self._lists[0]) >= self.min_train_size:
+                    self._train_in_background()
+                return
+            _add_to_lists(self._lists, self.centroids, ids, matrix)
+            if len(self) >= self._trained_size * IVF_RETRAIN_FACTOR:
+                self._train_in_background()
+
+    def remove(self, ids: Sequence[int]) -> int:
+        with self._lock:
+            if self._changes is not None:
+                self._changes.append((np.asarray(ids, dtype=np.int64), None))
+            return sum(inverted_list.remove(ids) for inverted_list in self._lists)
+
+    def _train_in_background(self) -> None:
+        if self._trainer is None or not self._trainer.is_alive():
+            self._trainer = threading.Thread(target=self.train, name="ivf-train", daemon=True)
+            self._trainer.start()
+
+    def wait_for_training(self, timeout: float = None) -> None:
+        trainer = self._trainer
+        if trainer is not None:
+            trainer.join(timeout)
+
+    def train(self) -> None:
+        """Train centroids on a snapshot of the rows without holding the search lock."""
+        with self._train_lock:
+            with self._lock:
+                ids, matrix = self.rows()
+                self._changes = []
+            try:
+                if ids.size == 0:
+                    return
+                nlist = self.nlist or max(1, int(4 * np.sqrt(ids.size)))
+                nlist = min(nlist, ids.size)
+                centroids = train_centroids(matrix, nlist)
+                lists = _build_lists(self.dim, ids, matrix, centroids)
+                with self._lock:
+                    # Replay what changed since the snapshot, then swap.
+                    for changed_ids, changed_matrix in self._changes:
+                        if changed_matrix is None:
+                            for inverted_list in lists:
+                                inverted_list.remove(changed_ids)
+                        else:
+                            _add_to_lists(lists, centroids, changed_ids, changed_matrix)
+                    self.centroids, self._lists = centroids, lists
+                    self._trained_size = ids.size
+            finally:
+                with self._lock:
+                    self._changes = None
+            logger.info("IVF index trained: %d vectors in %d lists", ids.size, nlist)
+
+    def search(self, query, k: int = 5, nprobe: int = None) -> List[Tuple[int, float]]:
+        with self._lock:
+            centroids, lists = self.centroids, self._lists
+        if centroids is None:
+            return lists[0].search(query, k)
+        q = normalize(query)[0]
+        nprobe = min(nprobe or self.nprobe, len(lists))
+        probe = np.argpartition(-(centroids @ q), nprobe - 1)[:nprobe]
+        candidates = []
+        for list_id in probe:
+            candidates.extend(lists[list_id].search(q, k))
+        candidates.sort(key=lambda match: match[1], reverse=True)
+        return candidates[:k]
+
+    def save(self, path: Path) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            ids, matrix = self.rows()
+            centroids = self.centroids if self.trained else np.empty((0, self.dim or 0), dtype=np.float32)
+            meta = np.array([self.nlist, self.nprobe, self.min_train_size, self._trained_size, self.max_id], dtype=np.int64)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with tmp_path.open("wb") as f:
+            np.savez(f, ids=ids, vectors=matrix, centroids=centroids, meta=meta)
+        os.replace(tmp_path, path)
+        self.persisted_size = ids.size
+
+    @classmethod
+    def load(cls, path: Path) -> "IVFIndex":
+        with np.load(path) as data:
+            nlist, nprobe, min_train_size, trained_size, max_id = (int(value) for value in data["meta"])
+            index = cls(nlist=nlist, nprobe=nprobe, min_train_size=min_train_size)
+            ids, matrix, centroids = data["ids"], data["vectors"], data["centroids"]
+        if matrix.shape[0]:
+            index.dim = matrix.shape[1]
+        if centroids.shape[0]:
+            index.centroids = centroids
+            index._lists = _build_lists(index.dim, ids, matrix, centroids)
+        else:
+            index._lists = [FlatIndex(index.dim)]
+            index._lists[0].add(ids, matrix)
+        index._trained_size = trained_size
+        index.max_id = max_id
+        index.persisted_size = ids.size
+        return index
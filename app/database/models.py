@@ -1,27 +1,57 @@
-from sqlalchemy import Column, String, Integer, Enum, DateTime, Boolean, Text, ForeignKey, Sequence, func
+from sqlalchemy import Column, String, Integer, Enum, DateTime, Boolean, Text, ForeignKey, Sequence, Computed, Index as SQLIndex, UniqueConstraint, func, false
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.types import TypeDecorator
-from sqlalchemy.dialects.postgresql import BYTEA
+from sqlalchemy.dialects.postgresql import BYTEA, TSVECTOR
 
+import os
 import numpy as np
 
 Base = declarative_base()
 
+# "bytea" stores embeddings as raw float32 blobs and searches them in-process;
+# "pgvector" uses a native vector column so Postgres can rank them (see search_embeddings).
+VECTOR_BACKEND = os.environ.get("VECTOR_BACKEND", "bytea")
+EMBEDDING_DIM = int(os.environ.get("EMBEDDING_DIM", 1536))
+# Load BYTEA embeddings as zero-copy NumPy views rather than Python lists.
+VECTOR_AS_NUMPY = os.environ.get("VECTOR_AS_NUMPY", "true").lower() in ("1", "true", "yes")
+# Text search configuration of indices.text_search; changing it needs a new migration.
+TEXT_SEARCH_CONFIG = "english"
+
 
 class Vector(TypeDecorator):
+    """float32 embedding stored as BYTEA.
+
+    With ``as_numpy`` results are read-only float32 arrays viewing the fetched
+    buffer instead of lists of Python floats.
+    """
     impl = BYTEA
+    cache_ok = True
+
+    def __init__(self, *args, as_numpy: bool = False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.as_numpy = as_numpy
 
     def process_bind_param(self, value, dialect):
         if value is not None:
-            return np.array(value, dtype=np.float32).tobytes()
+            return np.asarray(value, dtype=np.float32).tobytes()
         return value
 
     def process_result_value(self, value, dialect):
         if value is not None:
-            return np.frombuffer(value, dtype=np.float32).tolist()
+            vector = np.frombuffer(value, dtype=np.float32)
+            return vector if self.as_numpy else vector.tolist()
         return value
 
+def embedding_column_type():
+    if VECTOR_BACKEND == "pgvector":
+        try:
+            from pgvector.sqlalchemy import Vector as PGVector
+        except ImportError as e:
+            raise ImportError("VECTOR_BACKEND=pgvector requires the pgvector package") from e
+        return PGVector(EMBEDDING_DIM)
+    return Vector(as_numpy=VECTOR_AS_NUMPY)
+
 class User(Base):
     __tablename__ = "users"
     
@@ -55,11 +85,21 @@ class Embedding(Base):
     version = Column(Integer, nullable=False)
     chunk_index = Column(Integer, nullable=False)
     paragraph = Column(Text, nullable=False)
-    embedding = Column(Vector, nullable=False)
+    embedding = Column(embedding_column_type(), nullable=False)
+    # sha256 of the embedding model and chunk text; unchanged chunks keep their row on re-ingestion.
+    content_hash = Column(String(64))
+    # Tombstone of a chunk removed from its document; excluded from search.
+    deleted = Column(Boolean, nullable=False, default=False, server_default=false())
     
     # Establish relationship
     user = relationship("User", back_populates="embeddings")
 
+    # One row per chunk of a document version: concurrent ingestions cannot write the same version twice.
+    __table_args__ = (
+        SQLIndex("ix_embeddings_user_id_file_path", "user_id", "file_path"),
+        UniqueConstraint("user_id", "file_path", "version", "chunk_index", name="uq_embeddings_chunk"),
+    )
+
 class Index(Base):
     __tablename__ = "indices"
     
@@ -70,6 +110,16 @@ class Index(Base):
     chunk_index = Column(Integer, nullable=False)
     paragraph = Column(Text, nullable=False)
     text_chunk = Column(Text, nullable=False)
+    # Maintained by Postgres from text_chunk and GIN indexed for lexical search; never loaded with the row.
+    text_search = deferred(Column(TSVECTOR, Computed(f"to_tsvector('{TEXT_SEARCH_CONFIG}', text_chunk)", persisted=True)))
+    content_hash = Column(String(64))
+    deleted = Column(Boolean, nullable=False, default=False, server_default=false())
     
     # Establish relationship
     user = relationship("User", back_populates="indices")
+
+    __table_args__ = (
+        SQLIndex("ix_indices_text_search", "text_search", postgresql_using="gin"),
+        SQLIndex("ix_indices_user_id_file_path", "user_id", "file_path"),
+        UniqueConstraint("user_id", "file_path", "version", "chunk_index", name="uq_indices_chunk"),
+    )
@@ -47,6 +47,7 @@ class EmbeddingBase(BaseModel):
     chunk_index: int
     paragraph: str
     embedding: list[float]  # Assuming embedding is a list of floats
+    content_hash: Optional[str] = None
 
     class Config:
         orm_mode = True
@@ -57,6 +58,14 @@ class EmbeddingCreate(EmbeddingBase):
 class EmbeddingResponse(EmbeddingBase):
     id: int
 
+class EmbeddingSearch(BaseModel):
+    user_id: int
+    text: str
+    k: int = 5
+    hybrid: bool = False  # fuse in full-text matches
+    vector_k: Optional[int] = None  # candidates per side before fusion; defaults from the environment
+    lexical_k: Optional[int] = None
+
 class IndexBase(BaseModel):
     user_id: int
     file_path: str
@@ -64,6 +73,7 @@ class IndexBase(BaseModel):
     chunk_index: int
     paragraph: str
     text_chunk: str
+    content_hash: Optional[str] = None
 
     class Config:
         orm_mode = True
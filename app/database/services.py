@@ -1,19 +1,27 @@
-from sqlalchemy.orm import Session
-from .models import User, Session as UserSession,  Embedding, Index
+import os
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from sqlalchemy import insert, update, text, func, tuple_
+from sqlalchemy.orm import Session, load_only
+from .models import User, Session as UserSession,  Embedding, Index, VECTOR_BACKEND, TEXT_SEARCH_CONFIG
 from .schemas import UserCreate, UserLogin, PasswordReset, PasswordResetRequest, EmbeddingCreate, IndexCreate
-from passlib.context import CryptContext
-from passlib.hash import argon2
+from .vector_index import get_user_index, add_to_user_index
 import secrets
 from fastapi import HTTPException, status
+from ..auth import session_cache, invalidate_token
+from ..hashing import hasher, hashing_pool
 
 
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+# Recall/latency knobs of the server-side pgvector index, applied per query when set.
+PGVECTOR_HNSW_EF_SEARCH = os.environ.get("PGVECTOR_HNSW_EF_SEARCH")
+PGVECTOR_IVFFLAT_PROBES = os.environ.get("PGVECTOR_IVFFLAT_PROBES")
 
 def get_password_hash(password: str) -> str:
-    return argon2.hash(password)
+    return hashing_pool.hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return argon2.verify(plain_password, hashed_password)
+    return hashing_pool.verify(plain_password, hashed_password)
 
 def create_user(db: Session, user: UserCreate) -> User:
     db_user = db.query(User).filter(User.email == user.email).first()
@@ -34,6 +42,9 @@ def authenticate_user(db: Session, user: UserLogin) -> dict:
     db_user = db.query(User).filter(User.email == user.email).first()
     if not db_user or not verify_password(user.password, db_user.password):
         raise HTTPException(status_code=400, detail="Invalid credentials")
+    if hasher.needs_update(db_user.password):
+        # Rehash with the configured Argon2 cost while the plain password is at hand.
+        db_user.password = get_password_hash(user.password)
     token = secrets.token_hex(16)
     session = UserSession(token=token, user_id=db_user.id)
     db.add(session)
@@ -55,25 +66,35 @@ def reset_password(db: Session, reset: PasswordReset) -> dict:
     db.commit()
     return {"message": "Password updated successfully"}
 
+def get_session_user_id(db: Session, token: str) -> int:
+    user_id = session_cache.get(token)
+    if user_id is None:
+        user_id = db.query(UserSession.user_id).filter(UserSession.token == token).scalar()
+        if user_id is None:
+            raise HTTPException(status_code=401, detail="Invalid session")
+        session_cache.set(token, user_id)
+    return user_id
+
 def delete_user(db: Session, email: str, token: str) -> dict:
-    session = db.query(UserSession).filter(UserSession.token == token).first()
-    if not session:
-        raise HTTPException(status_code=401, detail="Invalid session")
-    user = db.query(User).filter(User.id == session.user_id).first()
-    
+    get_session_user_id(db, token)
+
     db_user = db.query(User).filter(User.email == email).first()
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
+    tokens = [row.token for row in db.query(UserSession.token).filter(UserSession.user_id == db_user.id)]
+    db.query(UserSession).filter(UserSession.user_id == db_user.id).delete(synchronize_session=False)
     db.delete(db_user)
     db.commit()
+    for user_token in tokens:
+        invalidate_token(user_token)
     return {"message": "User deleted successfully"}
 
 def logout_user(db: Session, token: str) -> dict:
-    session = db.query(UserSession).filter(UserSession.token == token).first()
-    if not session:
+    deleted = db.query(UserSession).filter(UserSession.token == token).delete(synchronize_session=False)
+    if not deleted:
         raise HTTPException(status_code=401, detail="Invalid session")
-    db.delete(session)
     db.commit()
+    invalidate_token(token)
     return {"message": "Logged out successfully"}
 
 def create_embedding(db: Session, embedding: EmbeddingCreate) -> Embedding:
@@ -83,13 +104,136 @@ def create_embedding(db: Session, embedding: EmbeddingCreate) -> Embedding:
         version=embedding.version,
         chunk_index=embedding.chunk_index,
         paragraph=embedding.paragraph,
-        embedding=embedding.embedding
+        embedding=embedding.embedding,
+        content_hash=embedding.content_hash
     )
     db.add(db_embedding)
     db.commit()
     db.refresh(db_embedding)
+    add_to_user_index(db_embedding.user_id, [db_embedding.id], [embedding.embedding])
     return db_embedding
 
+def create_embeddings_bulk(db: Session, embeddings: List[EmbeddingCreate], commit: bool = True) -> List[int]:
+    """Insert many embeddings with one executemany in a single transaction.
+
+    Returns the generated ids in input order. With ``commit=False`` the caller
+    owns the transaction; the rows then reach the vector index on its next refresh.
+    """
+    if not embeddings:
+        return []
+    ids = db.execute(
+        insert(Embedding).returning(Embedding.id, sort_by_parameter_order=True),
+        [embedding.model_dump() for embedding in embeddings],
+    ).scalars().all()
+    if commit:
+        db.commit()
+        by_user = defaultdict(lambda: ([], []))
+        for embedding_id, embedding in zip(ids, embeddings):
+            by_user[embedding.user_id][0].append(embedding_id)
+            by_user[embedding.user_id][1].append(embedding.embedding)
+        for user_id, (user_ids, vectors) in by_user.items():
+            add_to_user_index(user_id, user_ids, vectors)
+    return ids
+
+def _search_embeddings_pgvector(db: Session, user_id: int, query_embedding: List[float], k: int) -> List[dict]:
+    if PGVECTOR_HNSW_EF_SEARCH:
+        db.execute(text(f"SET LOCAL hnsw.ef_search = {int(PGVECTOR_HNSW_EF_SEARCH)}"))
+    if PGVECTOR_IVFFLAT_PROBES:
+        db.execute(text(f"SET LOCAL ivfflat.probes = {int(PGVECTOR_IVFFLAT_PROBES)}"))
+    distance = Embedding.embedding.cosine_distance(query_embedding)
+    rows = (
+        db.query(Embedding.id, Embedding.file_path, Embedding.version, Embedding.chunk_index, Embedding.paragraph,
+                 distance.label("distance"))
+        .filter(Embedding.user_id == user_id, Embedding.deleted.is_(False))
+        .order_by(distance)
+        .limit(k)
+        .all()
+    )
+    return [
+        {
+            "id": row.id,
+            "file_path": row.file_path,
+            "version": row.version,
+            "chunk_index": row.chunk_index,
+            "paragraph": row.paragraph,
+            "score": 1.0 - float(row.distance),
+        }
+        for row in rows
+    ]
+
+def search_embeddings(db: Session, user_id: int, query_embedding: List[float], k: int = 5) -> List[dict]:
+    if VECTOR_BACKEND == "pgvector":
+        # ORDER BY embedding <=> :q LIMIT k runs in Postgres; no vectors leave the database.
+        return _search_embeddings_pgvector(db, user_id, query_embedding, k)
+    index = get_user_index(db, user_id)
+    while True:
+        matches = index.search(query_embedding, k)
+        if not matches:
+            return []
+        rows = (
+            db.query(Embedding)
+            .options(load_only(Embedding.id, Embedding.file_path, Embedding.version, Embedding.chunk_index, Embedding.paragraph))
+            .filter(Embedding.id.in_([embedding_id for embedding_id, _ in matches]), Embedding.deleted.is_(False))
+            .all()
+        )
+        by_id = {row.id: row for row in rows}
+        # Rows tombstoned by another process are still in this index, since a
+        # refresh only adds newer rows. Drop them and search again so k live
+        # chunks are returned; each stale row is found at most once.
+        stale = [embedding_id for embedding_id, _ in matches if embedding_id not in by_id]
+        if not stale or not index.remove(stale):
+            break
+    return [
+        {
+            "id": embedding_id,
+            "file_path": by_id[embedding_id].file_path,
+            "version": by_id[embedding_id].version,
+            "chunk_index": by_id[embedding_id].chunk_index,
+            "paragraph": by_id[embedding_id].paragraph,
+            "score": score,
+        }
+        for embedding_id, score in matches
+        if embedding_id in by_id
+    ]
+
+def search_text_chunks(db: Session, user_id: int, query: str, k: int = 5) -> List[dict]:
+    """Top-k chunks of the user matching ``query`` as a web-style search (words, "phrases", -exclusions),
+    ranked by ts_rank over the GIN-indexed text_search column."""
+    tsquery = func.websearch_to_tsquery(TEXT_SEARCH_CONFIG, query)
+    # Normalization 1 divides by 1 + log(length), so long chunks do not win on volume alone.
+    rank = func.ts_rank(Index.text_search, tsquery, 1)
+    rows = (
+        db.query(Index.file_path, Index.version, Index.chunk_index, Index.paragraph, rank.label("rank"))
+        .filter(Index.user_id == user_id, Index.deleted.is_(False), Index.text_search.op("@@")(tsquery))
+        .order_by(rank.desc())
+        .limit(k)
+        .all()
+    )
+    return [
+        {
+            "file_path": row.file_path,
+            "version": row.version,
+            "chunk_index": row.chunk_index,
+            "paragraph": row.paragraph,
+            "score": float(row.rank),
+        }
+        for row in rows
+    ]
+
+def get_text_chunks(db: Session, user_id: int, matches: List[dict]) -> List[dict]:
+    """The matches of ``search_embeddings`` with the ``text`` of their indices row, in the same order."""
+    keys = [(match["file_path"], match["version"], match["chunk_index"]) for match in matches]
+    if not keys:
+        return []
+    rows = (
+        db.query(Index.file_path, Index.version, Index.chunk_index, Index.text_chunk)
+        .filter(Index.user_id == user_id, Index.deleted.is_(False),
+                tuple_(Index.file_path, Index.version, Index.chunk_index).in_(keys))
+        .all()
+    )
+    texts = {(row.file_path, row.version, row.chunk_index): row.text_chunk for row in rows}
+    return [dict(match, text=texts[key]) for match, key in zip(matches, keys) if key in texts]
+
 def create_index(db: Session, index: IndexCreate) -> Index:
     db_index = Index(
         user_id=index.user_id,
@@ -97,9 +241,74 @@ def create_index(db: Session, index: IndexCreate) -> Index:
         version=index.version,
         chunk_index=index.chunk_index,
         paragraph=index.paragraph,
-        text_chunk=index.text_chunk
+        text_chunk=index.text_chunk,
+        content_hash=index.content_hash
     )
     db.add(db_index)
     db.commit()
     db.refresh(db_index)
     return db_index
+
+def create_indices_bulk(db: Session, indices: List[IndexCreate], commit: bool = True) -> List[int]:
+    if not indices:
+        return []
+    ids = db.execute(
+        insert(Index).returning(Index.id, sort_by_parameter_order=True),
+        [index.model_dump() for index in indices],
+    ).scalars().all()
+    if commit:
+        db.commit()
+    return ids
+
+def lock_document(db: Session, user_id: int, file_path: str) -> None:
+    """Serialize ingestions of one document until the transaction ends (a no-op outside Postgres)."""
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("SELECT pg_advisory_xact_lock(:user_id, hashtext(:file_path))"),
+                   {"user_id": user_id, "file_path": file_path})
+
+def get_live_chunks(db: Session, user_id: int, file_path: str) -> Tuple[Dict[str, List[int]], Dict[str, List[int]]]:
+    """Ids of the document's current (not tombstoned) embeddings and indices rows, by content hash.
+
+    Rows of the newest version come first; rows without a hash are never reused.
+    """
+    live = []
+    for model in (Embedding, Index):
+        by_hash = defaultdict(list)
+        rows = (
+            db.query(model.id, model.content_hash)
+            .filter(model.user_id == user_id, model.file_path == file_path, model.deleted.is_(False))
+            .order_by(model.version.desc(), model.chunk_index)
+        )
+        for row_id, content_hash in rows:
+            by_hash[content_hash].append(row_id)
+        live.append(by_hash)
+    return live[0], live[1]
+
+def get_embedding_vectors(db: Session, ids: Sequence[int]) -> Dict[int, List[float]]:
+    if not ids:
+        return {}
+    return dict(db.query(Embedding.id, Embedding.embedding).filter(Embedding.id.in_(ids)).all())
+
+def get_document_embeddings(db: Session, user_id: int, file_path: str) -> Tuple[Optional[int], List[List[float]]]:
+    """Version and chunk-ordered vectors of the document's live embeddings; (None, []) when it has none."""
+    rows = (
+        db.query(Embedding.version, Embedding.embedding)
+        .filter(Embedding.user_id == user_id, Embedding.file_path == file_path, Embedding.deleted.is_(False))
+        .order_by(Embedding.chunk_index)
+        .all()
+    )
+    if not rows:
+        return None, []
+    return max(version for version, _ in rows), [np.asarray(vector, dtype=np.float32).tolist() for _, vector in rows]
+
+def move_chunks(db: Session, model, rows: List[dict]) -> None:
+    """Bulk update of reused rows (``id`` plus new ``version``, ``chunk_index`` and ``paragraph``) by primary key."""
+    if rows:
+        db.execute(update(model), rows)
+
+def tombstone_chunks(db: Session, embedding_ids: Sequence[int], index_ids: Sequence[int]) -> None:
+    """Mark rows of removed chunks as deleted; committed by the caller."""
+    if embedding_ids:
+        db.execute(update(Embedding).where(Embedding.id.in_(embedding_ids)).values(deleted=True))
+    if index_ids:
+        db.execute(update(Index).where(Index.id.in_(index_ids)).values(deleted=True))
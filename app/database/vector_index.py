@@ -0,0 +1,230 @@
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from .models import Embedding
+
+logger = logging.getLogger(__name__)
+
+# Seconds between incremental refreshes of a loaded index from the database.
+# Rows inserted by other workers become searchable after at most this delay.
+REFRESH_SECONDS = float(os.environ.get("VECTOR_INDEX_REFRESH_SECONDS", 5))
+LOAD_BATCH_SIZE = 1000
+# "flat" for exact search, "ivf" for the approximate index in ann_index.py.
+VECTOR_INDEX_BACKEND = os.environ.get("VECTOR_INDEX_BACKEND", "flat")
+# Persisted indexes are rewritten once this many rows were added since the last save.
+VECTOR_INDEX_DIR = Path(os.environ.get("VECTOR_INDEX_DIR", "vector_indexes"))
+VECTOR_INDEX_PERSIST_EVERY = int(os.environ.get("VECTOR_INDEX_PERSIST_EVERY", 1000))
+
+
+def normalize(vectors) -> np.ndarray:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class FlatIndex:
+    """Exact cosine-similarity index over a contiguous, pre-normalized float32 matrix.
+
+    Rows are appended in place (the backing array grows by doubling), so
+    incremental inserts are amortized O(d) and a query is a single
+    matrix-vector product over the live rows.
+    """
+
+    def __init__(self, dim: int = None, capacity: int = 1024):
+        self.dim = dim
+        self._capacity = capacity
+        self._matrix = None
+        self._ids = None
+        self._size = 0
+        self._known = set()
+        self.max_id = 0
+        self.refreshed_at = 0.0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def rows(self) -> Tuple[np.ndarray, np.ndarray]:
+        with self._lock:
+            size, matrix, ids = self._size, self._matrix, self._ids
+        if size == 0:
+            return np.empty(0, dtype=np.int64), np.empty((0, self.dim or 0), dtype=np.float32)
+        return ids[:size], matrix[:size]
+
+    def _reserve(self, needed: int):
+        if self._matrix is not None and needed <= self._matrix.shape[0]:
+            return
+        capacity = max(self._capacity, 1)
+        while capacity < needed:
+            capacity *= 2
+        matrix = np.empty((capacity, self.dim), dtype=np.float32)
+        ids = np.empty(capacity, dtype=np.int64)
+        if self._matrix is not None:
+            matrix[:self._size] = self._matrix[:self._size]
+            ids[:self._size] = self._ids[:self._size]
+        self._matrix, self._ids, self._capacity = matrix, ids, capacity
+
+    def add(self, ids: Sequence[int], vectors) -> None:
+        ids = np.asarray(ids, dtype=np.int64)
+        if ids.size == 0:
+            return
+        matrix = normalize(vectors)
+        if matrix.shape[0] != ids.size:
+            raise ValueError("ids and vectors must have the same length")
+        with self._lock:
+            # Rows may arrive both from create_embedding and from a refresh.
+            fresh = np.fromiter((i not in self._known for i in ids.tolist()), dtype=bool, count=ids.size)
+            if not fresh.all():
+                ids, matrix = ids[fresh], matrix[fresh]
+                if ids.size == 0:
+                    return
+            if self.dim is None:
+                self.dim = matrix.shape[1]
+            elif matrix.shape[1] != self.dim:
+                raise ValueError(f"Expected vectors of dimension {self.dim}, got {matrix.shape[1]}")
+            start, end = self._size, self._size + ids.size
+            self._reserve(end)
+            self._matrix[start:end] = matrix
+            self._ids[start:end] = ids
+            self._known.update(ids.tolist())
+            # Publish the new rows only after they are fully written.
+            self._size = end
+
+    def remove(self, ids: Sequence[int]) -> int:
+        """Drop rows by id; returns how many were present.
+
+        The live rows are copied into new arrays, so searches running on the
+        old ones are unaffected. Removed ids stay known and are not re-added.
+        """
+        with self._lock:
+            if self._size == 0:
+                return 0
+            keep = ~np.isin(self._ids[:self._size], np.asarray(ids, dtype=np.int64))
+            removed = int(self._size - keep.sum())
+            if removed == 0:
+                return 0
+            size = self._size - removed
+            matrix = np.empty((max(self._capacity, 1), self.dim), dtype=np.float32)
+            row_ids = np.empty(max(self._capacity, 1), dtype=np.int64)
+            matrix[:size] = self._matrix[:self._size][keep]
+            row_ids[:size] = self._ids[:self._size][keep]
+            self._matrix, self._ids, self._size = matrix, row_ids, size
+            return removed
+
+    def search(self, query, k: int = 5) -> List[Tuple[int, float]]:
+        with self._lock:
+            size, matrix, ids = self._size, self._matrix, self._ids
+        if size == 0 or k <= 0:
+            return []
+        q = normalize(query)[0]
+        if q.shape[0] != self.dim:
+            raise ValueError(f"Expected query of dimension {self.dim}, got {q.shape[0]}")
+        scores = matrix[:size] @ q
+        k = min(k, size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[i]), float(scores[i])) for i in top]
+
+
+def iter_embedding_blocks(db: Session, user_id: int, after_id: int = 0,
+                          batch_size: int = LOAD_BATCH_SIZE) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """Stream a user's embeddings as (ids, (n, d) float32 matrix) blocks in id order.
+
+    Each fetched vector is copied straight into a preallocated block, so no
+    per-element Python objects are created when the column yields NumPy views.
+    """
+    query = (
+        db.query(Embedding.id, Embedding.embedding)
+        .filter(Embedding.user_id == user_id, Embedding.id > after_id, Embedding.deleted.is_(False))
+        .order_by(Embedding.id)
+        .yield_per(batch_size)
+    )
+    ids = np.empty(batch_size, dtype=np.int64)
+    block = None
+    filled = 0
+    for row_id, vector in query:
+        if block is None:
+            block = np.empty((batch_size, len(vector)), dtype=np.float32)
+        ids[filled] = row_id
+        block[filled] = vector
+        filled += 1
+        if filled == batch_size:
+            yield ids, block
+            ids, block = np.empty_like(ids), np.empty_like(block)
+            filled = 0
+    if filled:
+        yield ids[:filled], block[:filled]
+
+
+def refresh_index(db: Session, user_id: int, index: FlatIndex) -> FlatIndex:
+    for ids, vectors in iter_embedding_blocks(db, user_id, after_id=index.max_id):
+        index.add(ids, vectors)
+        index.max_id = max(index.max_id, int(ids[-1]))
+    index.refreshed_at = time.monotonic()
+    return index
+
+
+_indexes: Dict[int, FlatIndex] = {}
+_registry_lock = threading.Lock()
+
+
+def index_path(user_id: int) -> Path:
+    return VECTOR_INDEX_DIR / f"user_{user_id}.npz"
+
+
+def _create_index(user_id: int):
+    if VECTOR_INDEX_BACKEND == "ivf":
+        from .ann_index import IVFIndex
+        path = index_path(user_id)
+        if path.exists():
+            return IVFIndex.load(path)
+        return IVFIndex()
+    return FlatIndex()
+
+
+def get_user_index(db: Session, user_id: int) -> FlatIndex:
+    with _registry_lock:
+        index = _indexes.get(user_id)
+        if index is None:
+            index = _indexes[user_id] = _create_index(user_id)
+    if time.monotonic() - index.refreshed_at >= REFRESH_SECONDS:
+        started = time.perf_counter()
+        loaded = len(index)
+        refresh_index(db, user_id, index)
+        logger.info(
+            "Vector index for user %s refreshed: %d new rows in %.1f ms",
+            user_id, len(index) - loaded, (time.perf_counter() - started) * 1000,
+        )
+        if hasattr(index, "save") and len(index) - index.persisted_size >= VECTOR_INDEX_PERSIST_EVERY:
+            index.save(index_path(user_id))
+    return index
+
+
+def add_to_user_index(user_id: int, ids: Sequence[int], vectors) -> None:
+    # Only indexes that are already resident are updated; others load lazily
+    # on their first search.
+    index = _indexes.get(user_id)
+    if index is not None:
+        index.add(ids, vectors)
+
+
+def remove_from_user_index(user_id: int, ids: Sequence[int]) -> None:
+    # Other processes keep tombstoned rows until search_embeddings finds and removes them.
+    index = _indexes.get(user_id)
+    if index is not None and len(ids) and index.remove(ids) and hasattr(index, "save"):
+        index.save(index_path(user_id))
+
+
+def drop_user_index(user_id: int) -> None:
+    with _registry_lock:
+        _indexes.pop(user_id, None)
@@ -0,0 +1,106 @@
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_BATCH_MAX_WAIT_MS = float(os.environ.get("EMBEDDING_BATCH_MAX_WAIT_MS", 5))
+EMBEDDING_BATCH_MAX_INPUTS = int(os.environ.get("EMBEDDING_BATCH_MAX_INPUTS", 256))
+EMBEDDING_BATCH_MAX_TOKENS = int(os.environ.get("EMBEDDING_BATCH_MAX_TOKENS", 100000))
+EMBEDDING_BATCH_CONCURRENCY = int(os.environ.get("EMBEDDING_BATCH_CONCURRENCY", 4))
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly four characters per token for English text.
+    return len(text) // 4 + 1
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent embedding requests into batched API calls.
+
+    Callers ``submit`` a text and get a Future back. A collector thread waits
+    up to ``max_wait_ms`` after the first pending text (or until ``max_inputs``
+    texts / ``max_tokens`` estimated tokens are queued), sends the batch
+    through ``embed_batch`` and resolves every caller's Future with its vector.
+    """
+
+    def __init__(self, embed_batch: Callable[[List[str]], List[List[float]]],
+                 max_wait_ms: float = EMBEDDING_BATCH_MAX_WAIT_MS,
+                 max_inputs: int = EMBEDDING_BATCH_MAX_INPUTS,
+                 max_tokens: int = EMBEDDING_BATCH_MAX_TOKENS,
+                 concurrency: int = EMBEDDING_BATCH_CONCURRENCY):
+        self.embed_batch = embed_batch
+        self.max_wait = max_wait_ms / 1000
+        self.max_inputs = max_inputs
+        self.max_tokens = max_tokens
+        self.batches_sent = 0
+        self.inputs_sent = 0
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="embedding-batch")
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._collect, name="embedding-batcher", daemon=True)
+                    self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        future = Future()
+        self._ensure_started()
+        self._queue.put((text, future))
+        return future
+
+    def embed(self, text: str) -> List[float]:
+        return self.submit(text).result()
+
+    def embed_many(self, texts: List[str]) -> List[List[float]]:
+        futures = [self.submit(text) for text in texts]
+        return [future.result() for future in futures]
+
+    def _collect(self):
+        while True:
+            batch = [self._queue.get()]
+            tokens = estimate_tokens(batch[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_inputs and tokens < self.max_tokens:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                item_tokens = estimate_tokens(item[0])
+                if tokens + item_tokens > self.max_tokens:
+                    # Start the next batch with it rather than overflowing this one.
+                    self._executor.submit(self._dispatch, batch)
+                    batch, tokens = [item], item_tokens
+                    deadline = time.monotonic() + self.max_wait
+                    continue
+                batch.append(item)
+                tokens += item_tokens
+            self._executor.submit(self._dispatch, batch)
+
+    def _dispatch(self, batch: List[tuple]):
+        # Identical texts submitted concurrently are embedded once.
+        unique_texts = list(dict.fromkeys(text for text, _ in batch))
+        try:
+            vectors = self.embed_batch(unique_texts)
+            if len(vectors) != len(unique_texts):
+                raise ValueError(f"Expected {len(unique_texts)} embeddings, got {len(vectors)}")
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        self.batches_sent += 1
+        self.inputs_sent += len(unique_texts)
+        by_text = dict(zip(unique_texts, vectors))
+        for text, future in batch:
+            future.set_result(by_text[text])
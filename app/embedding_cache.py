@@ -0,0 +1,94 @@
+import hashlib
+import logging
+import os
+import unicodedata
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+from .cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_MAX_BYTES = int(os.environ.get("EMBEDDING_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+# Directory of the persistent tier; set to an empty string to keep the cache in memory only.
+EMBEDDING_CACHE_DIR = os.environ.get("EMBEDDING_CACHE_DIR", "embedding_cache")
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Two-tier cache of embeddings keyed by sha256(model, normalized text).
+
+    The memory tier is an LRU bounded in bytes; the persistent tier stores one
+    raw float32 file per key so repeated ingestion survives restarts and is
+    shared by every worker on the host.
+    """
+
+    def __init__(self, max_bytes: int = EMBEDDING_CACHE_MAX_BYTES, directory: Optional[str] = EMBEDDING_CACHE_DIR):
+        self.memory = LRUCache(max_bytes=max_bytes, sizeof=lambda vector: vector.nbytes)
+        self.directory = Path(directory) if directory else None
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.f32"
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        key = cache_key(model, text)
+        vector = self.memory.get(key)
+        if vector is None and self.directory is not None:
+            try:
+                vector = np.fromfile(self._path(key), dtype=np.float32)
+            except FileNotFoundError:
+                vector = None
+            else:
+                self.disk_hits += 1
+                self.memory.set(key, vector)
+        if vector is None:
+            self.misses += 1
+            return None
+        return vector.tolist()
+
+    def set(self, model: str, text: str, embedding: List[float]) -> None:
+        key = cache_key(model, text)
+        vector = np.asarray(embedding, dtype=np.float32)
+        self.memory.set(key, vector)
+        if self.directory is None:
+            return
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            vector.tofile(tmp_path)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not persist cached embedding {key}: {e}")
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        return [self.get(model, text) for text in texts]
+
+    def set_many(self, model: str, texts: List[str], embeddings: List[List[float]]) -> None:
+        for text, embedding in zip(texts, embeddings):
+            self.set(model, text, embedding)
+
+    def stats(self) -> dict:
+        memory = self.memory.stats()
+        return {
+            "memory_hits": memory["hits"],
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "memory_entries": memory["entries"],
+            "memory_bytes": memory["bytes"],
+            "evictions": memory["evictions"],
+        }
+
+
+embedding_cache = EmbeddingCache()
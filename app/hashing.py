@@ -0,0 +1,75 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from fastapi import HTTPException
+from passlib.hash import argon2
+
+logger = logging.getLogger(__name__)
+
+# Argon2 cost of new hashes (memory in KiB; defaults match passlib). Existing
+# hashes keep the parameters they were created with and are upgraded on the
+# next successful login.
+ARGON2_TIME_COST = int(os.environ.get("ARGON2_TIME_COST", 3))
+ARGON2_MEMORY_COST = int(os.environ.get("ARGON2_MEMORY_COST", 65536))
+ARGON2_PARALLELISM = int(os.environ.get("ARGON2_PARALLELISM", 4))
+# Hashes computed at once, and authentication requests admitted beyond that
+# before new ones are turned away with 429. An admitted request holds one
+# request thread while its hash waits for a worker, so workers + pending
+# should stay well below the server's threadpool size (40 by default).
+HASH_WORKERS = int(os.environ.get("HASH_WORKERS", min(4, os.cpu_count() or 1)))
+HASH_MAX_PENDING = int(os.environ.get("HASH_MAX_PENDING", 12))
+HASH_RETRY_AFTER_SECONDS = int(os.environ.get("HASH_RETRY_AFTER_SECONDS", 1))
+
+hasher = argon2.using(
+    time_cost=ARGON2_TIME_COST,
+    memory_cost=ARGON2_MEMORY_COST,
+    parallelism=ARGON2_PARALLELISM,
+)
+
+
+class HashingPool:
+    """Dedicated executor for password hashing with admission control.
+
+    Argon2 releases the GIL, so a small thread pool keeps ``workers`` cores
+    busy. Endpoints that hash enter ``admit()`` on the event loop before
+    taking a request thread; once ``workers + max_pending`` requests are
+    admitted, new ones are rejected immediately instead of queueing.
+    """
+
+    def __init__(self, workers: int = HASH_WORKERS, max_pending: int = HASH_MAX_PENDING,
+                 retry_after: int = HASH_RETRY_AFTER_SECONDS):
+        self.workers = workers
+        self.retry_after = retry_after
+        self.rejected = 0
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="argon2")
+
+    @contextmanager
+    def admit(self):
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            logger.warning("Password hashing saturated, rejecting request (%d rejected so far)", self.rejected)
+            raise HTTPException(
+                status_code=429,
+                detail="Too many authentication requests, retry shortly",
+                headers={"Retry-After": str(self.retry_after)},
+            )
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+    def hash(self, password: str) -> str:
+        return self._executor.submit(hasher.hash, password).result()
+
+    def verify(self, password: str, hashed_password: str) -> bool:
+        return self._executor.submit(hasher.verify, password, hashed_password).result()
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+hashing_pool = HashingPool()
@@ -15,10 +15,18 @@ from fastapi.staticfiles import StaticFiles
 from datetime import timedelta
 from .auth import create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
 from .api import router as api_router
+from .data_ingestion.parallel import shutdown_parse_executor
+from .clients import close_clients
+from .hashing import hashing_pool
+from .task_events import task_events
+from .serialization import ORJSONResponse
+from .upload_store import UploadSizeLimitMiddleware
 
 
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
+# Oversized uploads are refused before their body is spooled to disk.
+app.add_middleware(UploadSizeLimitMiddleware)
 # Serve static files (HTML, CSS, JS)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -35,6 +43,13 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
 
 app.include_router(api_router)
 
+@app.on_event("shutdown")
+async def shutdown():
+    shutdown_parse_executor()
+    hashing_pool.shutdown()
+    await close_clients()
+    await task_events.close()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000, reload=True, debug=True)
@@ -0,0 +1,170 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from sqlalchemy.orm import Session
+
+from .clients import openai_clients
+from .database.services import search_embeddings, search_text_chunks, get_text_chunks
+from .embedding_batcher import estimate_tokens
+from .serialization import sse_event
+
+logger = logging.getLogger(__name__)
+
+ANSWER_MODEL = os.environ.get("ANSWER_MODEL", "gpt-4o-mini")
+# Chunks retrieved per question, before packing.
+ANSWER_TOP_K = int(os.environ.get("ANSWER_TOP_K", 8))
+# Prompt tokens spent on retrieved context; lower ranked chunks that do not fit are dropped.
+ANSWER_CONTEXT_TOKENS = int(os.environ.get("ANSWER_CONTEXT_TOKENS", 3000))
+ANSWER_MAX_TOKENS = int(os.environ.get("ANSWER_MAX_TOKENS", 512))
+# "hybrid" fuses vector and full-text results for answers; "vector" uses embeddings only.
+RETRIEVAL_MODE = os.environ.get("RETRIEVAL_MODE", "hybrid")
+# Candidates taken from each side before fusion.
+HYBRID_VECTOR_K = int(os.environ.get("HYBRID_VECTOR_K", 20))
+HYBRID_LEXICAL_K = int(os.environ.get("HYBRID_LEXICAL_K", 20))
+# Reciprocal-rank fusion constant; larger values flatten the advantage of top ranks.
+RRF_K = int(os.environ.get("RRF_K", 60))
+
+SYSTEM_PROMPT = (
+    "Answer the question using only the numbered context passages. "
+    "Cite the passages you use as [n]. If they do not contain the answer, say so."
+)
+
+
+class StageTimer:
+    """Wall-clock milliseconds per retrieval stage, reported in responses and Server-Timing headers."""
+
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = round((time.perf_counter() - started) * 1000, 3)
+
+    def server_timing(self) -> str:
+        return ", ".join(f"{name};dur={duration}" for name, duration in self.timings.items())
+
+
+def _chunk_key(match: dict) -> tuple:
+    return match["file_path"], match["version"], match["chunk_index"]
+
+
+def reciprocal_rank_fusion(results: Dict[str, List[dict]], k: int = RRF_K) -> List[dict]:
+    """Merge ranked lists of chunks by summing 1 / (k + rank) over the lists each chunk appears in.
+
+    Scores of different retrievers are not comparable, ranks are. Each fused
+    chunk has the fused ``score`` and its 1-based ``ranks`` per list.
+    """
+    fused: Dict[tuple, dict] = {}
+    for name, matches in results.items():
+        for rank, match in enumerate(matches, 1):
+            entry = fused.setdefault(_chunk_key(match), {
+                "file_path": match["file_path"],
+                "version": match["version"],
+                "chunk_index": match["chunk_index"],
+                "paragraph": match["paragraph"],
+                "score": 0.0,
+                "ranks": {},
+            })
+            if name in entry["ranks"]:
+                continue  # a chunk counts once per list, at its best rank
+            entry["score"] += 1.0 / (k + rank)
+            entry["ranks"][name] = rank
+    return sorted(fused.values(), key=lambda entry: entry["score"], reverse=True)
+
+
+def hybrid_search(db: Session, user_id: int, text: str, query_embedding: List[float], k: int,
+                  vector_k: int = HYBRID_VECTOR_K, lexical_k: int = HYBRID_LEXICAL_K,
+                  timer: Optional[StageTimer] = None) -> List[dict]:
+    """Top-k chunks by reciprocal-rank fusion of the vector and full-text searches."""
+    timer = timer or StageTimer()
+    with timer.stage("vector"):
+        vector = search_embeddings(db, user_id, query_embedding, vector_k) if vector_k else []
+    with timer.stage("lexical"):
+        lexical = search_text_chunks(db, user_id, text, lexical_k) if lexical_k else []
+    with timer.stage("fusion"):
+        fused = reciprocal_rank_fusion({"vector": vector, "lexical": lexical})[:k]
+    logger.info(f"Hybrid search: {len(vector)} vector + {len(lexical)} lexical -> {len(fused)} chunks, {timer.timings}")
+    return fused
+
+
+def retrieve_chunks(db: Session, user_id: int, query_embedding: List[float], k: int = ANSWER_TOP_K,
+                    text: Optional[str] = None, timer: Optional[StageTimer] = None) -> List[dict]:
+    """The user's ``k`` best matching chunks, best first, with their text.
+
+    With ``text`` and RETRIEVAL_MODE=hybrid the full-text matches are fused in.
+    """
+    timer = timer or StageTimer()
+    if text and RETRIEVAL_MODE == "hybrid":
+        matches = hybrid_search(db, user_id, text, query_embedding, k, timer=timer)
+    else:
+        with timer.stage("vector"):
+            matches = search_embeddings(db, user_id, query_embedding, k)
+    with timer.stage("text"):
+        return get_text_chunks(db, user_id, matches)
+
+
+def pack_context(chunks: List[dict], max_tokens: int = ANSWER_CONTEXT_TOKENS) -> List[dict]:
+    """Chunks, in rank order, that fit in ``max_tokens``; duplicates are skipped."""
+    packed, seen, used = [], set(), 0
+    for chunk in chunks:
+        tokens = estimate_tokens(chunk["text"])
+        if chunk["text"] in seen or used + tokens > max_tokens:
+            continue
+        packed.append(chunk)
+        seen.add(chunk["text"])
+        used += tokens
+    return packed
+
+
+def build_messages(question: str, chunks: List[dict]) -> List[dict]:
+    context = "\n\n".join(f"[{i}] {chunk['text']}" for i, chunk in enumerate(chunks, 1))
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": f"Context:\n{context}\n\nQuestion: {question}"},
+    ]
+
+
+def stream_completion(messages: List[dict], model: str = ANSWER_MODEL, max_tokens: int = ANSWER_MAX_TOKENS) -> Iterator[str]:
+    """Text deltas of a streamed chat completion, as they arrive."""
+    # Retries only cover opening the stream; a failure halfway through is raised to the caller.
+    stream = openai_clients.call(lambda client: client.chat.completions.create(
+        model=model, messages=messages, max_tokens=max_tokens, stream=True,
+    ))
+    try:
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    finally:
+        stream.close()
+
+
+def answer_events(question: str, chunks: List[dict]) -> Iterator[bytes]:
+    """Server-Sent Events for an answer: its ``sources``, one ``token`` per delta, then ``done`` or ``error``."""
+    started = time.perf_counter()
+    chunks = pack_context(chunks)
+    messages = build_messages(question, chunks)
+    yield sse_event([
+        {key: chunk[key] for key in ("file_path", "version", "chunk_index", "paragraph", "score")}
+        for chunk in chunks
+    ], "sources")
+    first_token = None
+    try:
+        for text in stream_completion(messages):
+            if first_token is None:
+                first_token = time.perf_counter() - started
+            yield sse_event({"text": text}, "token")
+    except Exception as e:
+        # The response has started, so the failure can only be reported in the stream.
+        logger.error(f"Answer stream failed: {e}")
+        yield sse_event({"detail": str(e)}, "error")
+        return
+    logger.info(f"Answered from {len(chunks)} chunks, first token after "
+                f"{first_token if first_token is not None else 0:.3f}s, total {time.perf_counter() - started:.3f}s")
+    yield sse_event({"chunks": len(chunks), "prompt_tokens": sum(estimate_tokens(m["content"]) for m in messages)}, "done")
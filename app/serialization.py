@@ -0,0 +1,75 @@
+import base64
+from typing import Any, List, Optional
+
+import numpy as np
+import orjson
+from fastapi import HTTPException, Request
+from fastapi.responses import ORJSONResponse as BaseORJSONResponse, Response
+
+# "float": JSON arrays of numbers; "base64": little-endian float32 bytes, base64-encoded;
+# "binary": a raw application/octet-stream frame of float32 rows.
+EMBEDDING_FORMATS = ("float", "base64", "binary")
+OCTET_STREAM = "application/octet-stream"
+EVENT_STREAM = "text/event-stream"
+# Stops proxies from buffering or caching a Server-Sent Events response.
+EVENT_STREAM_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+class ORJSONResponse(BaseORJSONResponse):
+    """FastAPI's orjson response, with NumPy arrays serialized natively."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def sse_event(data: Any, event: Optional[str] = None) -> bytes:
+    """One Server-Sent Events message with a JSON payload."""
+    message = b"event: " + event.encode() + b"\n" if event else b""
+    return message + b"data: " + orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY) + b"\n\n"
+
+
+def negotiate_embedding_format(request: Request, embedding_format: Optional[str] = None) -> str:
+    if embedding_format is not None:
+        if embedding_format not in EMBEDDING_FORMATS:
+            raise HTTPException(status_code=400, detail=f"embedding_format must be one of {', '.join(EMBEDDING_FORMATS)}")
+        return embedding_format
+    if OCTET_STREAM in request.headers.get("accept", ""):
+        return "binary"
+    return "float"
+
+
+def encode_embedding(embedding, embedding_format: str):
+    vector = np.asarray(embedding, dtype="<f4")
+    if embedding_format == "base64":
+        return base64.b64encode(vector.tobytes()).decode("ascii")
+    return vector
+
+
+def decode_embedding(data: str) -> List[float]:
+    return np.frombuffer(base64.b64decode(data), dtype="<f4").tolist()
+
+
+def embedding_response(embedding_format: str, content: dict, field: str = "embedding", many: bool = False) -> Response:
+    """Render ``content`` with the vector(s) under ``field`` in the negotiated format.
+
+    ``field`` holds one embedding, or a list of them (possibly empty) with
+    ``many``. A binary response carries only the float32 rows; their count
+    and dimension are sent as headers.
+    """
+    value = content[field]
+    single = not many
+    if embedding_format == "binary":
+        matrix = np.asarray([value] if single else value, dtype="<f4")
+        if matrix.size == 0:
+            matrix = matrix.reshape(0, 0)
+        return Response(
+            content=matrix.tobytes(),
+            media_type=OCTET_STREAM,
+            headers={"X-Embedding-Count": str(matrix.shape[0]), "X-Embedding-Dim": str(matrix.shape[1])},
+        )
+    encoded = dict(content)
+    encoded[field] = (encode_embedding(value, embedding_format) if single
+                      else [encode_embedding(vector, embedding_format) for vector in value])
+    if embedding_format == "base64":
+        encoded["embedding_format"] = "base64"
+    return ORJSONResponse(content=encoded)
@@ -0,0 +1,181 @@
+import os
+import threading
+import zlib
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .cache import LRUCache
+
+# "memory" keeps sessions in this process; "redis" shares them across workers and hosts.
+SESSION_STORE = os.environ.get("SESSION_STORE", "memory")
+SESSION_REDIS_URL = os.environ.get("SESSION_REDIS_URL", "redis://localhost:6379/1")
+SESSION_TTL_SECONDS = int(os.environ.get("SESSION_TTL_SECONDS", 24 * 60 * 60))
+SESSION_STORE_MAX_BYTES = int(os.environ.get("SESSION_STORE_MAX_BYTES", 256 * 1024 * 1024))
+
+
+def compress_text(text: str) -> bytes:
+    return zlib.compress(text.encode("utf-8"), 6)
+
+
+def decompress_text(data: bytes) -> str:
+    return zlib.decompress(data).decode("utf-8")
+
+
+def pack_embeddings(embeddings: List[List[float]]) -> bytes:
+    return np.asarray(embeddings, dtype=np.float32).tobytes()
+
+
+def unpack_embeddings(data: bytes, dim: int) -> List[List[float]]:
+    return np.frombuffer(data, dtype=np.float32).reshape(-1, dim).tolist()
+
+
+class SessionNotFound(KeyError):
+    pass
+
+
+class SessionTooLarge(Exception):
+    def __init__(self, limit: int):
+        super().__init__(f"Session would exceed the maximum session size of {limit} bytes")
+        self.limit = limit
+
+
+class SessionStore(ABC):
+    """Documents (compressed text plus chunk embeddings) grouped by session id.
+
+    Sessions expire SESSION_TTL_SECONDS after they were last written to;
+    ``put_document`` raises SessionNotFound for an expired or unknown session,
+    and SessionTooLarge when the session would no longer fit in the store.
+    """
+
+    @abstractmethod
+    def create(self, session_id: str) -> None:
+        ...
+
+    @abstractmethod
+    def exists(self, session_id: str) -> bool:
+        ...
+
+    @abstractmethod
+    def put_document(self, session_id: str, name: str, text: str, embeddings: List[List[float]]) -> None:
+        ...
+
+    @abstractmethod
+    def get_text(self, session_id: str, name: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def get_embeddings(self, session_id: str, name: str) -> Optional[List[List[float]]]:
+        ...
+
+
+class MemorySessionStore(SessionStore):
+    """Per-process store: an LRU of sessions bounded by compressed size, with TTL."""
+
+    def __init__(self, ttl: float = SESSION_TTL_SECONDS, max_bytes: int = SESSION_STORE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._sessions = LRUCache(max_bytes=max_bytes, ttl=ttl, sizeof=self._session_size)
+        # put_document is a read-modify-write of the whole session.
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _session_size(session: Dict[str, Tuple[bytes, bytes, int]]) -> int:
+        return sum(len(text) + len(embeddings) for text, embeddings, _ in session.values()) + 64
+
+    def create(self, session_id: str) -> None:
+        self._sessions.set(session_id, {})
+
+    def exists(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def put_document(self, session_id: str, name: str, text: str, embeddings: List[List[float]]) -> None:
+        dim = len(embeddings[0]) if embeddings else 0
+        document = (compress_text(text), pack_embeddings(embeddings), dim)
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                raise SessionNotFound(session_id)
+            # Re-setting charges the new size and refreshes the TTL; a session larger
+            # than the whole store is refused and keeps its previous documents.
+            if not self._sessions.set(session_id, dict(session, **{name: document})):
+                raise SessionTooLarge(self.max_bytes)
+
+    def _document(self, session_id: str, name: str):
+        session = self._sessions.get(session_id)
+        return None if session is None else session.get(name)
+
+    def get_text(self, session_id: str, name: str) -> Optional[str]:
+        document = self._document(session_id, name)
+        return None if document is None else decompress_text(document[0])
+
+    def get_embeddings(self, session_id: str, name: str) -> Optional[List[List[float]]]:
+        document = self._document(session_id, name)
+        if document is None:
+            return None
+        return unpack_embeddings(document[1], document[2]) if document[2] else []
+
+
+class RedisSessionStore(SessionStore):
+    """Shared store: one Redis hash per session, expiring after the TTL."""
+
+    def __init__(self, client=None, url: str = SESSION_REDIS_URL, ttl: int = SESSION_TTL_SECONDS):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.redis = client
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(session_id: str) -> str:
+        return f"session:{session_id}"
+
+    def create(self, session_id: str) -> None:
+        key = self._key(session_id)
+        with self.redis.pipeline() as pipe:
+            pipe.hset(key, mapping={"_created": 1})
+            pipe.expire(key, self.ttl)
+            pipe.execute()
+
+    def exists(self, session_id: str) -> bool:
+        return bool(self.redis.exists(self._key(session_id)))
+
+    def put_document(self, session_id: str, name: str, text: str, embeddings: List[List[float]]) -> None:
+        key = self._key(session_id)
+        dim = len(embeddings[0]) if embeddings else 0
+        mapping = {
+            f"text:{name}": compress_text(text),
+            f"embeddings:{name}": pack_embeddings(embeddings),
+            f"dim:{name}": dim,
+        }
+        def write(pipe):
+            if not pipe.exists(key):
+                raise SessionNotFound(session_id)
+            pipe.multi()
+            pipe.hset(key, mapping=mapping)
+            pipe.expire(key, self.ttl)
+
+        # The key is WATCHed: the check and the write are retried if the session changes or expires in between.
+        self.redis.transaction(write, key)
+
+    def get_text(self, session_id: str, name: str) -> Optional[str]:
+        data = self.redis.hget(self._key(session_id), f"text:{name}")
+        return None if data is None else decompress_text(data)
+
+    def get_embeddings(self, session_id: str, name: str) -> Optional[List[List[float]]]:
+        key = self._key(session_id)
+        data, dim = self.redis.hget(key, f"embeddings:{name}"), self.redis.hget(key, f"dim:{name}")
+        if data is None:
+            return None
+        return unpack_embeddings(data, int(dim)) if int(dim) else []
+
+
+def create_session_store(backend: str = SESSION_STORE) -> SessionStore:
+    if backend == "redis":
+        return RedisSessionStore()
+    if backend == "memory":
+        return MemorySessionStore()
+    raise ValueError(f"Unknown session store backend: {backend}")
+
+
+session_store = create_session_store()
@@ -0,0 +1,196 @@
+import asyncio
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+import orjson
+
+from .serialization import sse_event
+
+# "redis" fans progress out from the Celery workers to every API process through
+# pub/sub; "memory" only reaches subscribers in the publishing process.
+TASK_EVENTS = os.environ.get("TASK_EVENTS", "redis")
+TASK_EVENTS_REDIS_URL = os.environ.get("TASK_EVENTS_REDIS_URL", "redis://localhost:6379/0")
+# A comment line is sent this often so idle connections are not dropped by proxies.
+TASK_EVENTS_KEEPALIVE_SECONDS = float(os.environ.get("TASK_EVENTS_KEEPALIVE_SECONDS", 15))
+# Per-task counters (e.g. finished segments) expire after this long.
+TASK_COUNTER_TTL_SECONDS = int(os.environ.get("TASK_COUNTER_TTL_SECONDS", 24 * 60 * 60))
+# Celery reports unknown, mistyped and expired task ids as PENDING forever, so a stream
+# that has seen nothing but PENDING ends after this long; any stream ends after the maximum.
+TASK_EVENTS_PENDING_SECONDS = float(os.environ.get("TASK_EVENTS_PENDING_SECONDS", 10 * 60))
+TASK_EVENTS_MAX_SECONDS = float(os.environ.get("TASK_EVENTS_MAX_SECONDS", 2 * 60 * 60))
+
+TERMINAL_STATES = {"SUCCESS", "FAILURE", "REVOKED"}
+
+
+class TaskEvents(ABC):
+    """Publish/subscribe of task progress events, one channel per task id.
+
+    Events have the shape returned by ``get_task_details``: ``state``,
+    ``current``, ``total``, ``status`` and, once finished, ``result``.
+    """
+
+    @abstractmethod
+    def publish(self, task_id: str, event: dict) -> None:
+        ...
+
+    @abstractmethod
+    def increment(self, task_id: str, name: str) -> int:
+        ...
+
+    @abstractmethod
+    def subscribe(self, task_id: str):
+        """Async context manager yielding an object with ``async get(timeout) -> Optional[dict]``."""
+
+    async def close(self) -> None:
+        pass
+
+
+class _QueueSubscription:
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    async def get(self, timeout: float) -> Optional[dict]:
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class MemoryTaskEvents(TaskEvents):
+    def __init__(self):
+        self._subscriptions: Dict[str, List[_QueueSubscription]] = {}
+        self._counters: Dict[tuple, int] = {}
+        self._lock = threading.Lock()
+
+    def publish(self, task_id: str, event: dict) -> None:
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(task_id, ()))
+        for subscription in subscriptions:
+            # Publishers run in worker threads; hand the event to the subscriber's loop.
+            subscription.loop.call_soon_threadsafe(subscription.queue.put_nowait, event)
+
+    def increment(self, task_id: str, name: str) -> int:
+        with self._lock:
+            value = self._counters[task_id, name] = self._counters.get((task_id, name), 0) + 1
+            return value
+
+    @asynccontextmanager
+    async def subscribe(self, task_id: str):
+        subscription = _QueueSubscription()
+        with self._lock:
+            self._subscriptions.setdefault(task_id, []).append(subscription)
+        try:
+            yield subscription
+        finally:
+            with self._lock:
+                self._subscriptions[task_id].remove(subscription)
+                if not self._subscriptions[task_id]:
+                    del self._subscriptions[task_id]
+
+
+class _PubSubSubscription:
+    def __init__(self, pubsub):
+        self.pubsub = pubsub
+
+    async def get(self, timeout: float) -> Optional[dict]:
+        deadline = time.monotonic() + timeout
+        while (remaining := deadline - time.monotonic()) > 0:
+            message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=remaining)
+            if message is not None and message["type"] == "message":
+                return orjson.loads(message["data"])
+        return None
+
+
+class RedisTaskEvents(TaskEvents):
+    def __init__(self, url: str = TASK_EVENTS_REDIS_URL, client=None, async_client=None):
+        self.url = url
+        self._client = client
+        self._async_client = async_client
+
+    @property
+    def client(self):
+        if self._client is None:
+            import redis
+            self._client = redis.Redis.from_url(self.url)
+        return self._client
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            import redis.asyncio
+            self._async_client = redis.asyncio.Redis.from_url(self.url)
+        return self._async_client
+
+    @staticmethod
+    def _channel(task_id: str) -> str:
+        return f"task-events:{task_id}"
+
+    def publish(self, task_id: str, event: dict) -> None:
+        self.client.publish(self._channel(task_id), orjson.dumps(event))
+
+    def increment(self, task_id: str, name: str) -> int:
+        key = f"task-counter:{task_id}:{name}"
+        value = self.client.incr(key)
+        self.client.expire(key, TASK_COUNTER_TTL_SECONDS)
+        return value
+
+    @asynccontextmanager
+    async def subscribe(self, task_id: str):
+        pubsub = self.async_client.pubsub()
+        await pubsub.subscribe(self._channel(task_id))
+        try:
+            yield _PubSubSubscription(pubsub)
+        finally:
+            await pubsub.unsubscribe()
+            await pubsub.aclose()
+
+    async def close(self) -> None:
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+
+def create_task_events(backend: str = TASK_EVENTS) -> TaskEvents:
+    if backend == "redis":
+        return RedisTaskEvents()
+    if backend == "memory":
+        return MemoryTaskEvents()
+    raise ValueError(f"Unknown task events backend: {backend}")
+
+
+task_events = create_task_events()
+
+
+async def event_stream(task_id: str, current_state: Callable[[], Awaitable[dict]], events: TaskEvents = None,
+                       keepalive: float = None, pending_seconds: float = None,
+                       max_seconds: float = None) -> AsyncIterator[bytes]:
+    """Server-Sent Events for one task: its current state, then every update until it finishes.
+
+    A stream that times out ends with a ``timeout`` event carrying the last state.
+    """
+    events = events or task_events
+    keepalive = keepalive or TASK_EVENTS_KEEPALIVE_SECONDS
+    pending_seconds = pending_seconds or TASK_EVENTS_PENDING_SECONDS
+    max_seconds = max_seconds or TASK_EVENTS_MAX_SECONDS
+    started = time.monotonic()
+    # Subscribe before reading the state so no update in between is missed.
+    async with events.subscribe(task_id) as subscription:
+        state = await current_state()
+        yield sse_event(state, "progress")
+        while state["state"] not in TERMINAL_STATES:
+            limit = min(pending_seconds, max_seconds) if state["state"] == "PENDING" else max_seconds
+            remaining = limit - (time.monotonic() - started)
+            if remaining <= 0:
+                yield sse_event(state, "timeout")
+                return
+            event = await subscription.get(min(keepalive, remaining))
+            if event is None:
+                yield b": keepalive\n\n"
+                continue
+            state = event
+            yield sse_event(state, "progress")
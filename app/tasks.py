@@ -1,18 +1,122 @@
+import shutil
+import tempfile
+
+from celery import chord
+from celery.exceptions import Ignore
+
 from celery_app import celery_app
-from .utils import download_yt, transcript_yt
+from .utils import download_yt, transcript_yt, youtube_transcript_key
+from .transcription import split_audio, stitch_transcripts, TRANSCRIBE_SEGMENT_SECONDS, TRANSCRIBE_SEGMENT_OVERLAP_SECONDS
+from .transcript_cache import transcript_cache
+from .task_events import task_events
 import logging
 
-@celery_app.task(name="app.tasks.process_transcript")
-def process_transcript(url):
-    audio_file = download_yt(url)
-    if audio_file:
-        transcript = transcript_yt(audio_file)
-        if transcript:
-            logging.info(f"Transcription successful. {transcript}")
-            return transcript
+def report_progress(task_id, current, total, status, state="PROGRESS", result=None):
+    """Record a stage of a transcription job and push it to subscribed clients.
+
+    The state is stored in the result backend for pollers of the status
+    endpoint; final states are stored by Celery itself and only published.
+    """
+    event = {"state": state, "current": current, "total": total, "status": status}
+    if state == "SUCCESS":
+        event["result"] = result
+    try:
+        if state == "PROGRESS" and not celery_app.conf.task_always_eager:
+            celery_app.backend.store_result(task_id, event, state)
+        task_events.publish(task_id, event)
+    except Exception as e:
+        # Progress is informational; never fail a transcription over it.
+        logging.warning(f"Could not report progress of task {task_id}: {e}")
+
+@celery_app.task(name="app.tasks.process_transcript", bind=True)
+def process_transcript(self, url):
+    # Everything a job writes lives in one directory that is removed when the
+    # job ends, or by the chord's callback/errback once it takes over. The
+    # same goes for the transcript cache's in-flight lock on this video.
+    task_id = self.request.id
+    work_dir = tempfile.mkdtemp(prefix="transcribe_")
+    cache_key = youtube_transcript_key(url)
+    handed_off = False
+    try:
+        # Steps: download, split, one per segment, and stitching when there are several segments.
+        report_progress(task_id, 0, 3, "Downloading audio")
+        audio_file = download_yt(url, work_dir)
+        if not audio_file:
+            logging.error("Try with a shorter video length")
+            transcript = None
         else:
-            print("Transcription failed or returned empty.")
-            return None 
+            report_progress(task_id, 1, 3, "Splitting audio")
+            segments = split_audio(audio_file, work_dir, TRANSCRIBE_SEGMENT_SECONDS, TRANSCRIBE_SEGMENT_OVERLAP_SECONDS)
+            if len(segments) > 1:
+                handed_off = True
+                # Returns only in eager mode, once the chord has finished the job.
+                return transcribe_segments(self, segments, work_dir, cache_key)
+            report_progress(task_id, 2, 3, "Transcribing audio")
+            transcript = transcript_yt(audio_file)
+            if transcript:
+                logging.info(f"Transcription successful. {transcript}")
+            else:
+                logging.warning("Transcription failed or returned empty.")
+                transcript = None
+    except Ignore:
+        raise
+    except Exception as e:
+        handed_off = False
+        finish_transcript(cache_key, task_id, None, error=str(e))
+        raise
+    else:
+        finish_transcript(cache_key, task_id, transcript)
+        return transcript
+    finally:
+        if not handed_off:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+def transcribe_segments(task, segments, work_dir, cache_key):
+    task_id = task.request.id
+    report_progress(task_id, 2, len(segments) + 3, f"Transcribing {len(segments)} segments")
+    logging.info(f"Transcribing {len(segments)} segments in parallel")
+    # Segments are read from this worker's disk, so the chord assumes
+    # workers share a filesystem (a single host by default). It inherits
+    # this task's id, so its stitched result is what the task status reports.
+    return task.replace(chord(
+        [transcribe_segment.s(segment, task_id, len(segments)) for segment in segments],
+        stitch_segments.s(work_dir, cache_key).on_error(abort_transcript.si(work_dir, cache_key, task_id)),
+    ))
+
+def finish_transcript(cache_key, task_id, transcript, error=None):
+    if error is None:
+        report_progress(task_id, 1, 1, "Transcription complete", state="SUCCESS", result=transcript)
+    else:
+        report_progress(task_id, 1, 1, error, state="FAILURE")
+    if not cache_key:
+        return
+    if transcript:
+        transcript_cache.put(cache_key, transcript)
     else:
-        logging.error("Try with a shorter video length")
-        return None
+        transcript_cache.release(cache_key, task_id)
+
+@celery_app.task(name="app.tasks.transcribe_segment")
+def transcribe_segment(segment_file, task_id=None, segment_count=None):
+    transcript = transcript_yt(segment_file)
+    if task_id:
+        # Segments finish in any order; a shared counter gives the overall progress.
+        try:
+            done = task_events.increment(task_id, "segments")
+        except Exception as e:
+            logging.warning(f"Could not count finished segments of task {task_id}: {e}")
+        else:
+            report_progress(task_id, 2 + done, segment_count + 3, f"Transcribed {done}/{segment_count} segments")
+    return transcript
+
+@celery_app.task(name="app.tasks.stitch_segments", bind=True)
+def stitch_segments(self, transcripts, work_dir, cache_key=None):
+    shutil.rmtree(work_dir, ignore_errors=True)
+    transcript = stitch_transcripts(transcripts)
+    logging.info(f"Stitched {len(transcripts)} segment transcripts")
+    finish_transcript(cache_key, self.request.id, transcript)
+    return transcript or None
+
+@celery_app.task(name="app.tasks.abort_transcript")
+def abort_transcript(work_dir, cache_key=None, task_id=None):
+    shutil.rmtree(work_dir, ignore_errors=True)
+    finish_transcript(cache_key, task_id, None, error="Transcription of a segment failed")
@@ -0,0 +1,142 @@
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Tuple
+
+from .cache import LRUCache
+from .session_store import compress_text, decompress_text
+
+# "redis" shares transcripts and in-flight locks between the API and the Celery
+# workers; "memory" only works when both run in one process (tests, eager mode).
+TRANSCRIPT_CACHE = os.environ.get("TRANSCRIPT_CACHE", "redis")
+TRANSCRIPT_REDIS_URL = os.environ.get("TRANSCRIPT_REDIS_URL", "redis://localhost:6379/2")
+# Completed transcripts are kept this long (0 keeps them until evicted by Redis).
+TRANSCRIPT_TTL_SECONDS = int(os.environ.get("TRANSCRIPT_TTL_SECONDS", 30 * 24 * 60 * 60))
+# Upper bound on one transcription job; a lock left by a crashed worker expires after it.
+TRANSCRIPT_LOCK_SECONDS = int(os.environ.get("TRANSCRIPT_LOCK_SECONDS", 2 * 60 * 60))
+TRANSCRIPT_CACHE_MAX_BYTES = int(os.environ.get("TRANSCRIPT_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+
+def transcript_key(video_id: str, model: str, language: str) -> str:
+    return f"{video_id}:{model}:{language}"
+
+
+class TranscriptCache(ABC):
+    """Completed transcripts plus a single-flight lock per transcript key.
+
+    ``claim`` registers a task as the one producing a key and returns the id
+    of the task already doing so, if any. ``put`` stores the transcript and
+    frees the key; ``release`` frees it after a failed job.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def put(self, key: str, transcript: str) -> None:
+        ...
+
+    @abstractmethod
+    def claim(self, key: str, task_id: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def release(self, key: str, task_id: str) -> None:
+        ...
+
+
+class MemoryTranscriptCache(TranscriptCache):
+    def __init__(self, ttl: float = TRANSCRIPT_TTL_SECONDS, lock_ttl: float = TRANSCRIPT_LOCK_SECONDS,
+                 max_bytes: int = TRANSCRIPT_CACHE_MAX_BYTES):
+        self._transcripts = LRUCache(max_bytes=max_bytes, ttl=ttl or None, sizeof=len)
+        self._locks: Dict[str, Tuple[str, float]] = {}
+        self._lock_ttl = lock_ttl
+        self._mutex = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        data = self._transcripts.get(key)
+        return None if data is None else decompress_text(data)
+
+    def put(self, key: str, transcript: str) -> None:
+        self._transcripts.set(key, compress_text(transcript))
+        with self._mutex:
+            self._locks.pop(key, None)
+
+    def claim(self, key: str, task_id: str) -> Optional[str]:
+        with self._mutex:
+            holder = self._locks.get(key)
+            if holder is not None and holder[1] > time.monotonic():
+                return holder[0]
+            self._locks[key] = (task_id, time.monotonic() + self._lock_ttl)
+            return None
+
+    def release(self, key: str, task_id: str) -> None:
+        with self._mutex:
+            if self._locks.get(key, (None,))[0] == task_id:
+                del self._locks[key]
+
+
+# Deletes the lock only while it still holds the releasing task's id.
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisTranscriptCache(TranscriptCache):
+    """Transcripts as compressed strings; the lock is a SET NX key holding the task id."""
+
+    def __init__(self, client=None, url: str = TRANSCRIPT_REDIS_URL, ttl: int = TRANSCRIPT_TTL_SECONDS,
+                 lock_ttl: int = TRANSCRIPT_LOCK_SECONDS):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.redis = client
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+        self._release_lock = self.redis.register_script(RELEASE_LOCK_SCRIPT)
+
+    @staticmethod
+    def _key(key: str) -> str:
+        return f"transcript:{key}"
+
+    @staticmethod
+    def _lock_key(key: str) -> str:
+        return f"transcript-lock:{key}"
+
+    def get(self, key: str) -> Optional[str]:
+        data = self.redis.get(self._key(key))
+        return None if data is None else decompress_text(data)
+
+    def put(self, key: str, transcript: str) -> None:
+        with self.redis.pipeline(transaction=True) as pipe:
+            pipe.set(self._key(key), compress_text(transcript), ex=self.ttl or None)
+            pipe.delete(self._lock_key(key))
+            pipe.execute()
+
+    def claim(self, key: str, task_id: str) -> Optional[str]:
+        lock_key = self._lock_key(key)
+        while not self.redis.set(lock_key, task_id, nx=True, ex=self.lock_ttl):
+            holder = self.redis.get(lock_key)
+            # The holder may have finished between SET and GET; then try again.
+            if holder is not None:
+                return holder.decode()
+        return None
+
+    def release(self, key: str, task_id: str) -> None:
+        self._release_lock(keys=[self._lock_key(key)], args=[task_id])
+
+
+def create_transcript_cache(backend: str = TRANSCRIPT_CACHE) -> TranscriptCache:
+    if backend == "redis":
+        return RedisTranscriptCache()
+    if backend == "memory":
+        return MemoryTranscriptCache()
+    raise ValueError(f"Unknown transcript cache backend: {backend}")
+
+
+transcript_cache = create_transcript_cache()
@@ -0,0 +1,130 @@
+import logging
+import math
+import os
+import re
+import subprocess
+from pathlib import Path
+from typing import Iterable, List, Tuple
+
+import imageio_ffmpeg
+
+logger = logging.getLogger(__name__)
+
+TRANSCRIBE_MODEL = os.environ.get("TRANSCRIBE_MODEL", "whisper-1")
+TRANSCRIBE_LANGUAGE = os.environ.get("TRANSCRIBE_LANGUAGE", "en")
+# Audio longer than one segment is cut into segments transcribed in parallel.
+# Consecutive segments overlap so no word is lost at a cut; the duplicated
+# words are removed again when the transcripts are stitched.
+TRANSCRIBE_SEGMENT_SECONDS = int(os.environ.get("TRANSCRIBE_SEGMENT_SECONDS", 300))
+TRANSCRIBE_SEGMENT_OVERLAP_SECONDS = int(os.environ.get("TRANSCRIBE_SEGMENT_OVERLAP_SECONDS", 5))
+# Words at the start of a segment searched for the tail of the previous one,
+# and the shortest run of matching words accepted as the overlap.
+STITCH_SEARCH_WORDS = int(os.environ.get("STITCH_SEARCH_WORDS", 80))
+STITCH_MIN_MATCH_WORDS = int(os.environ.get("STITCH_MIN_MATCH_WORDS", 3))
+
+_DURATION_PATTERN = re.compile(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)")
+
+
+def ffmpeg_exe() -> str:
+    # The binary bundled with imageio-ffmpeg unless IMAGEIO_FFMPEG_EXE is set.
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+
+def probe_duration(path: str) -> float:
+    # ffmpeg prints the container duration while reading the header; no decoding happens.
+    result = subprocess.run([ffmpeg_exe(), "-hide_banner", "-i", str(path)], capture_output=True, text=True)
+    match = _DURATION_PATTERN.search(result.stderr)
+    if not match:
+        raise ValueError(f"Could not read the duration of {path}")
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def transcode_to_mp3(chunks: Iterable[bytes], out_path: str, bitrate: str = "64k") -> str:
+    """Encode an audio stream to MP3 while it is still being read.
+
+    The source bytes are piped into ffmpeg chunk by chunk, so the original
+    container is never written to disk.
+    """
+    process = subprocess.Popen(
+        [ffmpeg_exe(), "-v", "error", "-y", "-i", "pipe:0", "-vn", "-c:a", "libmp3lame", "-b:a", bitrate, str(out_path)],
+        stdin=subprocess.PIPE, stderr=subprocess.PIPE,
+    )
+    try:
+        for chunk in chunks:
+            process.stdin.write(chunk)
+    except BrokenPipeError:
+        # ffmpeg exited early; its error is reported below.
+        pass
+    finally:
+        process.stdin.close()
+    stderr = process.stderr.read()
+    if process.wait() != 0:
+        raise RuntimeError(f"ffmpeg could not transcode the audio: {stderr.decode(errors='replace').strip()}")
+    return str(out_path)
+
+
+def split_audio(path: str, out_dir: str, segment_seconds: int = TRANSCRIBE_SEGMENT_SECONDS,
+                overlap_seconds: int = TRANSCRIBE_SEGMENT_OVERLAP_SECONDS) -> List[str]:
+    """Cut ``path`` into overlapping segments without re-encoding.
+
+    Returns ``[path]`` when the audio fits in one segment. Stream copy cuts
+    on packet boundaries, so segment edges may shift by a fraction of a
+    second; the overlap absorbs that.
+    """
+    duration = probe_duration(path)
+    if duration <= segment_seconds + overlap_seconds:
+        return [str(path)]
+    suffix = Path(path).suffix
+    segments = []
+    for i in range(math.ceil(duration / segment_seconds)):
+        segment = str(Path(out_dir) / f"segment_{i:04d}{suffix}")
+        subprocess.run(
+            [ffmpeg_exe(), "-v", "error", "-y",
+             "-ss", str(i * segment_seconds), "-i", str(path),
+             "-t", str(segment_seconds + overlap_seconds),
+             "-vn", "-c", "copy", segment],
+            check=True, capture_output=True,
+        )
+        segments.append(segment)
+    logger.info("Split %s (%.0f s) into %d segments", path, duration, len(segments))
+    return segments
+
+
+def _normalize_word(word: str) -> str:
+    return re.sub(r"[^\w']", "", word.lower())
+
+
+def _overlap(previous: List[str], current: List[str]) -> Tuple[int, int]:
+    """Align the end of ``previous`` with the start of ``current``.
+
+    Finds the longest run of words shared by both windows and returns how
+    many words to drop from the end of ``previous`` and from the start of
+    ``current`` so the run appears once. Words cut in half at either
+    boundary fall outside the run and are dropped with it.
+    """
+    tail = [_normalize_word(word) for word in previous[-STITCH_SEARCH_WORDS:]]
+    head = [_normalize_word(word) for word in current[:STITCH_SEARCH_WORDS]]
+    best, best_end_tail, best_end_head = 0, 0, 0
+    lengths = [0] * (len(head) + 1)
+    for i in range(1, len(tail) + 1):
+        previous_lengths, lengths = lengths, [0] * (len(head) + 1)
+        for j in range(1, len(head) + 1):
+            if tail[i - 1] and tail[i - 1] == head[j - 1]:
+                lengths[j] = previous_lengths[j - 1] + 1
+                if lengths[j] > best:
+                    best, best_end_tail, best_end_head = lengths[j], i, j
+    if best < STITCH_MIN_MATCH_WORDS:
+        return 0, 0
+    return len(tail) - best_end_tail, best_end_head
+
+
+def stitch_transcripts(transcripts: List[str]) -> str:
+    words: List[str] = []
+    for transcript in transcripts:
+        current = (transcript or "").split()
+        drop, skip = _overlap(words, current)
+        if drop:
+            del words[-drop:]
+        words.extend(current[skip:])
+    return " ".join(words)
@@ -0,0 +1,322 @@
+import asyncio
+import hashlib
+import logging
+import os
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, Iterator, NamedTuple, Optional
+
+import orjson
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from .serialization import ORJSONResponse
+
+logger = logging.getLogger(__name__)
+
+# Uploads are stored once per content hash under <dir>/<first two hex digits>/<sha256><extension>.
+# Relative paths are resolved against the working directory; point it at a data volume in production.
+UPLOAD_BLOB_DIR = Path(os.environ.get("UPLOAD_BLOB_DIR", "uploads/blobs"))
+# Blobs (with their parsed pages) not uploaded again for this long are deleted, and then the least
+# recently uploaded ones until the store fits in UPLOAD_BLOB_MAX_TOTAL_BYTES. 0 disables either bound.
+UPLOAD_BLOB_RETENTION_SECONDS = float(os.environ.get("UPLOAD_BLOB_RETENTION_SECONDS", 7 * 24 * 60 * 60))
+UPLOAD_BLOB_MAX_TOTAL_BYTES = int(os.environ.get("UPLOAD_BLOB_MAX_TOTAL_BYTES", 10 * 1024 * 1024 * 1024))
+# Minimum seconds between two prunes of the store by one process; they run after an upload.
+UPLOAD_BLOB_PRUNE_SECONDS = float(os.environ.get("UPLOAD_BLOB_PRUNE_SECONDS", 600))
+# Temporary files untouched for this long were left behind by a process that died mid-write.
+STALE_TEMP_SECONDS = 60 * 60
+# Bytes read from the upload and written to disk per step.
+UPLOAD_CHUNK_BYTES = int(os.environ.get("UPLOAD_CHUNK_BYTES", 1024 * 1024))
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_BYTES", 100 * 1024 * 1024))
+# Whole upload request body, checked before the body is read; leaves room for the multipart framing.
+UPLOAD_MAX_REQUEST_BYTES = int(os.environ.get("UPLOAD_MAX_REQUEST_BYTES", UPLOAD_MAX_BYTES + 1024 * 1024))
+UPLOAD_PATH_PREFIX = "/api/v1/upload"
+# Parsed pages are written in compressed batches of about this many characters,
+# so neither the parse worker nor a reader of the pages holds a whole document.
+UPLOAD_PAGES_BATCH_CHARS = int(os.environ.get("UPLOAD_PAGES_BATCH_CHARS", 1024 * 1024))
+# magic, page count, character count; followed by length-prefixed zlib-compressed orjson lists of pages.
+PAGES_HEADER = struct.Struct("<4sQQ")
+PAGES_MAGIC = b"PGS1"
+FRAME_HEADER = struct.Struct("<I")
+
+
+class UploadTooLarge(Exception):
+    def __init__(self, limit: int):
+        super().__init__(f"File exceeds the maximum upload size of {limit} bytes")
+        self.limit = limit
+
+
+class StoredBlob(NamedTuple):
+    sha256: str
+    size: int
+    path: Path
+    deduplicated: bool  # the same content was already stored
+
+
+class PageStats(NamedTuple):
+    pages: int
+    characters: int
+
+
+def _write_frame(f: BinaryIO, batch: list) -> None:
+    frame = zlib.compress(orjson.dumps(batch), 6)
+    f.write(FRAME_HEADER.pack(len(frame)))
+    f.write(frame)
+
+
+def write_pages(pages_path, pages: Iterable[str], batch_chars: int = UPLOAD_PAGES_BATCH_CHARS) -> PageStats:
+    """Write ``pages`` to ``pages_path`` batch by batch as they are produced.
+
+    The file is written under a temporary name and renamed once complete.
+    """
+    pages_path = Path(pages_path)
+    fd, temp_path = tempfile.mkstemp(dir=pages_path.parent, prefix=".pages-")
+    count = characters = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(PAGES_HEADER.pack(PAGES_MAGIC, 0, 0))
+            batch, batch_size = [], 0
+            for page in pages:
+                batch.append(page)
+                batch_size += len(page)
+                count += 1
+                characters += len(page)
+                if batch_size >= batch_chars:
+                    _write_frame(f, batch)
+                    batch, batch_size = [], 0
+            if batch:
+                _write_frame(f, batch)
+            f.seek(0)
+            f.write(PAGES_HEADER.pack(PAGES_MAGIC, count, characters))
+        os.replace(temp_path, pages_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return PageStats(count, characters)
+
+
+def read_page_stats(pages_path) -> Optional[PageStats]:
+    try:
+        with open(pages_path, "rb") as f:
+            header = f.read(PAGES_HEADER.size)
+    except FileNotFoundError:
+        return None
+    if len(header) < PAGES_HEADER.size:
+        return None
+    magic, count, characters = PAGES_HEADER.unpack(header)
+    # Pages cached in an older format are parsed again.
+    return PageStats(count, characters) if magic == PAGES_MAGIC else None
+
+
+def iter_pages(pages_path) -> Iterator[str]:
+    with open(pages_path, "rb") as f:
+        f.seek(PAGES_HEADER.size)
+        while header := f.read(FRAME_HEADER.size):
+            (length,) = FRAME_HEADER.unpack(header)
+            yield from orjson.loads(zlib.decompress(f.read(length)))
+
+
+class BlobStore:
+    """Content-addressed store for uploaded files and their parsed pages.
+
+    Uploads are streamed to a temporary file in fixed-size chunks while their
+    SHA-256 is computed, then renamed to their hash; a file whose content is
+    already stored is dropped. The extension is kept in the blob name because
+    the parser is chosen by it. Parsed pages are cached next to the blob, so
+    identical files uploaded by any number of users are parsed once, and are
+    read back in batches.
+    """
+
+    def __init__(self, root: Path = UPLOAD_BLOB_DIR, max_bytes: int = UPLOAD_MAX_BYTES,
+                 chunk_bytes: int = UPLOAD_CHUNK_BYTES, retention_seconds: float = UPLOAD_BLOB_RETENTION_SECONDS,
+                 max_total_bytes: int = UPLOAD_BLOB_MAX_TOTAL_BYTES, prune_seconds: float = UPLOAD_BLOB_PRUNE_SECONDS):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.chunk_bytes = chunk_bytes
+        self.retention_seconds = retention_seconds
+        self.max_total_bytes = max_total_bytes
+        self.prune_seconds = prune_seconds
+        self._parsing: Dict[Path, asyncio.Future] = {}
+        self._pruned_at: Optional[float] = None
+        self._prune_lock = threading.Lock()
+
+    def path_for(self, digest: str, extension: str = "") -> Path:
+        return self.root / digest[:2] / f"{digest}{extension.lower()}"
+
+    def put(self, stream: BinaryIO, filename: str = "", size: Optional[int] = None) -> StoredBlob:
+        """Store the rest of ``stream``; raises UploadTooLarge as soon as it passes ``max_bytes``."""
+        if size is not None and size > self.max_bytes:
+            raise UploadTooLarge(self.max_bytes)
+        self.root.mkdir(parents=True, exist_ok=True)
+        digest, written = hashlib.sha256(), 0
+        fd, temp_path = tempfile.mkstemp(dir=self.root, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while chunk := stream.read(self.chunk_bytes):
+                    written += len(chunk)
+                    if written > self.max_bytes:
+                        raise UploadTooLarge(self.max_bytes)
+                    digest.update(chunk)
+                    f.write(chunk)
+            path = self.path_for(digest.hexdigest(), Path(filename).suffix)
+            try:
+                # The modification time records the last upload, which pruning goes by.
+                os.utime(path)
+                deduplicated = True
+                os.remove(temp_path)
+            except FileNotFoundError:
+                deduplicated = False
+                path.parent.mkdir(exist_ok=True)
+                # Concurrent uploads of the same content rename identical bytes onto the same name.
+                os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        if not deduplicated:
+            logger.info(f"Stored {filename or 'upload'} as {path.name} ({written} bytes)")
+        self._maybe_prune()
+        return StoredBlob(digest.hexdigest(), written, path, deduplicated)
+
+    def _maybe_prune(self) -> None:
+        now = time.monotonic()
+        if self._pruned_at is not None and now - self._pruned_at < self.prune_seconds:
+            return
+        if not self._prune_lock.acquire(blocking=False):
+            return
+        try:
+            self._pruned_at = now
+            removed = self.prune()
+        finally:
+            self._prune_lock.release()
+        if removed:
+            logger.info(f"Pruned {removed} blobs from {self.root}")
+
+    def prune(self) -> int:
+        """Delete blobs past the retention time, then the least recently uploaded
+        ones until the store fits in ``max_total_bytes``; returns how many were deleted.
+        """
+        if not self.root.exists():
+            return 0
+        now = time.time()
+        blobs = []  # (last upload, bytes, files)
+        for shard in self.root.glob("*/"):
+            for entry in os.scandir(shard):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                if entry.name.startswith("."):
+                    if stat.st_mtime < now - STALE_TEMP_SECONDS:
+                        self._remove([entry.path])
+                    continue
+                if entry.name.endswith(".pages") or Path(entry.path) in self._parsing:
+                    continue
+                pages = self._pages_path(Path(entry.path))
+                size = stat.st_size + (pages.stat().st_size if pages.exists() else 0)
+                blobs.append((stat.st_mtime, size, [entry.path, pages]))
+        for entry in os.scandir(self.root):
+            if entry.is_file() and entry.name.startswith(".") and entry.stat().st_mtime < now - STALE_TEMP_SECONDS:
+                self._remove([entry.path])
+
+        blobs.sort(key=lambda blob: blob[0])
+        total = sum(size for _, size, _ in blobs)
+        removed = 0
+        for last_upload, size, files in blobs:
+            expired = self.retention_seconds and last_upload < now - self.retention_seconds
+            if not expired and not (self.max_total_bytes and total > self.max_total_bytes):
+                break
+            self._remove(files)
+            total -= size
+            removed += 1
+        return removed
+
+    @staticmethod
+    def _remove(files) -> None:
+        for file in files:
+            try:
+                os.remove(file)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _pages_path(path: Path) -> Path:
+        return path.with_name(f"{path.name}.pages")
+
+    def get_stats(self, path: Path) -> Optional[PageStats]:
+        return read_page_stats(self._pages_path(path))
+
+    def iter_pages(self, path) -> Iterator[str]:
+        """Parsed pages of a blob, read from the cache one batch at a time."""
+        return iter_pages(self._pages_path(Path(path)))
+
+    def read_text(self, path) -> str:
+        return ''.join(self.iter_pages(path))
+
+    async def parse(self, path) -> PageStats:
+        """Parse a stored blob in the process pool once per content.
+
+        Concurrent requests for a blob that is being parsed share that parse.
+        The pages are then read with ``iter_pages``.
+        """
+        path = Path(path)
+        stats = await run_in_threadpool(self.get_stats, path)
+        if stats is not None:
+            return stats
+        parsing = self._parsing.get(path)
+        if parsing is None:
+            parsing = asyncio.ensure_future(self._parse(path))
+            self._parsing[path] = parsing
+            parsing.add_done_callback(lambda _: self._parsing.pop(path, None))
+        # A cancelled request must not cancel the parse the others are waiting for.
+        return await asyncio.shield(parsing)
+
+    async def _parse(self, path: Path) -> PageStats:
+        from .data_ingestion.parallel import parse_file_async  # the readers import utils, which imports this module
+        # The worker writes the pages file itself, so the pages never travel back whole.
+        return await parse_file_async(str(path), str(self._pages_path(path)))
+
+
+blob_store = BlobStore()
+
+
+class UploadSizeLimitMiddleware:
+    """Rejects upload requests whose body is larger than ``max_bytes`` with 413.
+
+    Starlette spools a multipart body to disk before the endpoint runs, so
+    the limit has to apply here: a larger Content-Length is refused without
+    reading the body, and a body sent without one is cut off once it passes
+    the limit.
+    """
+
+    def __init__(self, app, max_bytes: int = UPLOAD_MAX_REQUEST_BYTES, path_prefix: str = UPLOAD_PATH_PREFIX):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.path_prefix = path_prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefix):
+            return await self.app(scope, receive, send)
+        detail = f"Request body exceeds {self.max_bytes} bytes"
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_bytes:
+            response = ORJSONResponse(content={"detail": detail}, status_code=413, headers={"Connection": "close"})
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -1,26 +1,34 @@
+import asyncio
 import logging
 import os
-from pathlib import Path
-import shutil
 from fastapi import UploadFile, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security.api_key import APIKeyHeader
 import json
 from typing import List, Dict
 import re
 import os
+import numpy as np
 from pytube import YouTube
-import moviepy.editor as mp
-from openai import OpenAI
+from pytube import request as pytube_request
+from .clients import openai_clients
+from .embedding_cache import embedding_cache, normalize_text
+from .embedding_batcher import EmbeddingBatcher
+from .transcription import transcode_to_mp3, TRANSCRIBE_MODEL, TRANSCRIBE_LANGUAGE
+from .transcript_cache import transcript_key
+from .upload_store import blob_store, UploadTooLarge
 
 
 
 
-UPLOAD_DIR = Path("uploads")
-UPLOAD_DIR.mkdir(exist_ok=True)
-
 # Allowed file extensions
 ALLOWED_EXTENSIONS = {'pdf', 'txt', 'docx', 'xlsx'}
 
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "text-embedding-ada-002")
+
+# Containers the transcription API accepts as uploaded; other audio is transcoded to MP3.
+TRANSCRIBE_FORMATS = {"flac", "m4a", "mp3", "mp4", "mpeg", "mpga", "oga", "ogg", "wav", "webm"}
+
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -37,13 +45,38 @@ def user_to_dict(user):
         "keep_logged_in": user.keep_logged_in
     }
 
+def embedding_to_dict(embedding):
+    return {
+        "id": embedding.id,
+        "user_id": embedding.user_id,
+        "file_path": embedding.file_path,
+        "version": embedding.version,
+        "chunk_index": embedding.chunk_index,
+        "paragraph": embedding.paragraph,
+        "embedding": np.asarray(embedding.embedding, dtype=np.float32).tolist(),
+    }
+
+def index_to_dict(index):
+    return {
+        "id": index.id,
+        "user_id": index.user_id,
+        "file_path": index.file_path,
+        "version": index.version,
+        "chunk_index": index.chunk_index,
+        "paragraph": index.paragraph,
+        "text_chunk": index.text_chunk,
+    }
+
 def save_file(file: UploadFile):
-    file_path = UPLOAD_DIR / file.filename
+    # Streamed into the content-addressed blob store; identical files are kept once.
     try:
-        with file_path.open("wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        blob = blob_store.put(file.file, file.filename, file.size)
         logger.info(f"File {file.filename} uploaded successfully with MIME type {file.content_type}.")
-        return {"filename": file.filename, "content_type": file.content_type, "message": "File uploaded successfully"}
+        return {"filename": file.filename, "content_type": file.content_type, "message": "File uploaded successfully",
+                "sha256": blob.sha256, "size": blob.size, "deduplicated": blob.deduplicated}
+    except UploadTooLarge as e:
+        logger.warning(f"Rejected upload {file.filename}: {e}")
+        return {"filename": file.filename, "message": str(e)}
     except Exception as e:
         logger.error(f"Error uploading file {file.filename}: {e}")
         return {"filename": file.filename, "message": f"An error occurred while uploading the file: {str(e)}"}
@@ -61,49 +94,50 @@ def get_youtube_id(url):
     else:
         return None
 
-def download_yt(url):
+def youtube_transcript_key(url):
+    video_id = get_youtube_id(url)
+    return transcript_key(video_id, TRANSCRIBE_MODEL, TRANSCRIBE_LANGUAGE) if video_id else None
+
+def download_yt(url, out_dir):
     yt = YouTube(url)
-    len = int(os.environ.get("MAX_YOUTUBE_LENGTH", 600))
-     # Check if the video duration is less than 10 minutes
-    if yt.length > len:  # 600 seconds = 10 minutes
-        logging.info(f"Video is longer than 10 minutes. Skipping download.")
+    # Long videos are transcribed as parallel segments, so the cap only bounds cost.
+    len = int(os.environ.get("MAX_YOUTUBE_LENGTH", 4 * 3600))
+    if yt.length > len:
+        logging.info(f"Video is longer than {len} seconds. Skipping download.")
         return None
     
     unique_file_name = get_youtube_id(url)
     logging.info(f"Downloading {unique_file_name}")
-    file_name = '/tmp/' + unique_file_name + '.mp4'
-    # Select the best audio stream
-    audio_stream = yt.streams.filter(only_audio=True).first()
-
-    # Download the audio stream to a temporary file
-    audio_stream.download(filename=file_name)
-    logging.info("file downloaded")
-    # Convert the downloaded file to MP3
-    clip = mp.AudioFileClip(file_name)
-    mp3_file = "/tmp/" + unique_file_name + ".mp3"
-    clip.write_audiofile(mp3_file)
-
-    logging.info("MP3 downloaded")
-
-    # Remove the temporary MP4 file
-    clip.close()
+    audio_streams = yt.streams.filter(only_audio=True)
+    # YouTube audio (AAC in mp4, Opus in webm) is uploaded as downloaded, without re-encoding.
+    audio_stream = next((stream for stream in audio_streams if stream.subtype in TRANSCRIBE_FORMATS), None)
+    if audio_stream is not None:
+        file_name = audio_stream.download(output_path=out_dir, filename=f"{unique_file_name}.{audio_stream.subtype}")
+        logging.info(f"file downloaded ({audio_stream.mime_type})")
+        return file_name
+
+    audio_stream = audio_streams.first()
+    mp3_file = os.path.join(out_dir, unique_file_name + ".mp3")
+    # Only containers the API rejects are transcoded, straight from the download stream.
+    transcode_to_mp3(pytube_request.stream(audio_stream.url), mp3_file)
+    logging.info(f"{audio_stream.mime_type} transcoded to MP3")
     return mp3_file
             
 
 def transcript_yt(filepath):
-    # Create OpenAI Connection
-    client = OpenAI()
-    client.api_key  = os.environ['OPENAI_API_KEY']
-    audio_file= open(filepath, "rb")
     logging.info("transcripting")
-    transcript = client.audio.transcriptions.create(
-                model="whisper-1",
-
+    with open(filepath, "rb") as audio_file:
+        def transcribe(client):
+            # Rewind so a retried request uploads the whole file again.
+            audio_file.seek(0)
+            return client.audio.transcriptions.create(
+                model=TRANSCRIBE_MODEL,
                 file=audio_file,
-                language="en",
+                language=TRANSCRIBE_LANGUAGE,
                 # prompt="Can you interpret,explain, add a metaphor and summarize",
                 response_format="text"
-                )
+            )
+        transcript = openai_clients.call(transcribe)
     return transcript
 
 def get_task_details(task):
@@ -123,6 +157,14 @@ def get_task_details(task):
                 "status": task.info.get("status", ""),
                 "result": task.info.get("result") if "result" in task.info else None
             }
+        elif task.state == "SUCCESS":
+            response = {
+                "state": task.state,
+                "current": 1,
+                "total": 1,
+                "status": "Transcription complete",
+                "result": task.info,
+            }
         else:
             response = {
                 "state": task.state,
@@ -139,30 +181,42 @@ def get_task_details(task):
         }
     return response
 
-def embed_text(text: str) -> List[float]:
-    client = OpenAI()
-    client.api_key  = os.environ['OPENAI_API_KEY']
-    response = client.embeddings.create(input=text, model="text-embedding-ada-002")
-    logging.info(response)
+def embed_batch(texts: List[str]) -> List[List[float]]:
+    response = openai_clients.call(lambda client: client.embeddings.create(input=texts, model=EMBEDDING_MODEL))
     # Ensure response has the expected structure
-    if hasattr(response, 'data') and isinstance(response.data, list) and len(response.data) > 0:
-        embedding_obj = response.data[0]
-        if hasattr(embedding_obj, 'embedding'):
-            return embedding_obj.embedding
-        else:
-            raise ValueError("No 'embedding' attribute found in the first element of 'data'.")
+    if hasattr(response, 'data') and isinstance(response.data, list) and len(response.data) == len(texts):
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
     else:
         raise ValueError("Invalid response structure: " + str(response))
 
-def query_embeddings(embedding: List[float], query: str) -> str:
-    client = OpenAI()
-    client.api_key  = os.environ['OPENAI_API_KEY']
-    response = client.Completion.create(
-        model="text-davinci-003",
-        prompt=f"Answer the question based on the following embedding: {embedding}. Question: {query}",
-        max_tokens=150
-    )
-    return response.choices[0].text.strip()
+embedding_batcher = EmbeddingBatcher(embed_batch)
+
+def embed_texts(texts: List[str]) -> List[List[float]]:
+    embeddings = [embedding_cache.get(EMBEDDING_MODEL, text) for text in texts]
+    pending = {i: embedding_batcher.submit(normalize_text(texts[i])) for i, embedding in enumerate(embeddings) if embedding is None}
+    for i, future in pending.items():
+        embeddings[i] = future.result()
+        embedding_cache.set(EMBEDDING_MODEL, texts[i], embeddings[i])
+    if pending:
+        logging.info(f"Embedded {len(pending)}/{len(texts)} texts, cache: {embedding_cache.stats()}")
+    return embeddings
+
+def embed_text(text: str) -> List[float]:
+    return embed_texts([text])[0]
+
+async def aembed_texts(texts: List[str]) -> List[List[float]]:
+    # Same as embed_texts, but waits on the batcher and the cache's disk tier without blocking the event loop.
+    embeddings = await run_in_threadpool(embedding_cache.get_many, EMBEDDING_MODEL, texts)
+    pending = {i: embedding_batcher.submit(normalize_text(texts[i])) for i, embedding in enumerate(embeddings) if embedding is None}
+    if pending:
+        results = await asyncio.gather(*(asyncio.wrap_future(future) for future in pending.values()))
+        for i, embedding in zip(pending, results):
+            embeddings[i] = embedding
+        await run_in_threadpool(embedding_cache.set_many, EMBEDDING_MODEL, [texts[i] for i in pending], results)
+    return embeddings
+
+async def aembed_text(text: str) -> List[float]:
+    return (await aembed_texts([text]))[0]
 
 # Example usage
 # url = 'https://www.youtube.com/watch?v=5hMgUbmrENM'
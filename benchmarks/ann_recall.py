@@ -0,0 +1,77 @@
+"""Recall and latency of the IVF index against exact brute-force search.
+
+Usage:
+    python -m benchmarks.ann_recall --rows 200000 --dim 1536 --nlist 0 512 --nprobe 4 8 16 32
+    python -m benchmarks.ann_recall --vectors corpus.npy
+
+``--vectors`` loads a real (N, d) float32 matrix, e.g. exported from the
+``embeddings`` table; otherwise a clustered synthetic corpus is generated.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.database.ann_index import IVFIndex
+from app.database.vector_index import FlatIndex
+
+
+def synthetic_corpus(rows: int, dim: int, clusters: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=rows)
+    return centers[labels] + 0.5 * rng.normal(size=(rows, dim)).astype(np.float32)
+
+
+def timed_search(index, queries: np.ndarray, k: int, **kwargs):
+    results = []
+    started = time.perf_counter()
+    for query in queries:
+        results.append([match_id for match_id, _ in index.search(query, k, **kwargs)])
+    elapsed_ms = (time.perf_counter() - started) * 1000 / len(queries)
+    return results, elapsed_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", help="Path to a .npy (N, d) float32 matrix")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, nargs="+", default=[0])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    if args.vectors:
+        corpus = np.load(args.vectors).astype(np.float32)
+    else:
+        corpus = synthetic_corpus(args.rows, args.dim, args.clusters)
+    rng = np.random.default_rng(1)
+    queries = corpus[rng.choice(corpus.shape[0], args.queries, replace=False)]
+    queries = queries + 0.1 * rng.normal(size=queries.shape).astype(np.float32)
+    ids = np.arange(1, corpus.shape[0] + 1)
+
+    exact = FlatIndex()
+    exact.add(ids, corpus)
+    truth, exact_ms = timed_search(exact, queries, args.k)
+    print(f"corpus: {corpus.shape[0]} x {corpus.shape[1]}, k={args.k}")
+    print(f"{'exact':>18}  recall@{args.k}=1.000  {exact_ms:8.2f} ms/query")
+
+    for nlist in args.nlist:
+        started = time.perf_counter()
+        index = IVFIndex(nlist=nlist, min_train_size=0)
+        index.add(ids, corpus)
+        # Training runs in the background; search the trained lists, not the exact fallback.
+        index.wait_for_training()
+        build_s = time.perf_counter() - started
+        print(f"nlist={len(index._lists)} built in {build_s:.1f} s")
+        for nprobe in args.nprobe:
+            found, ann_ms = timed_search(index, queries, args.k, nprobe=nprobe)
+            recall = np.mean([len(set(a) & set(b)) / len(b) for a, b in zip(found, truth)])
+            print(f"{'nprobe=' + str(nprobe):>18}  recall@{args.k}={recall:.3f}  {ann_ms:8.2f} ms/query")
+
+
+if __name__ == "__main__":
+    main()
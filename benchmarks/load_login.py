@@ -0,0 +1,73 @@
+"""Login throughput and latency under a login storm, next to unrelated traffic.
+
+Usage:
+    uvicorn app.main:app --port 8000
+    python -m benchmarks.load_login --url http://localhost:8000 --concurrency 64 --duration 20
+
+Registers a throwaway user, then keeps ``--concurrency`` logins in flight
+while ``--background`` clients call /api/v1/initialize. Reports completed
+logins per second, rejected (429) logins and p50/p99 latency of both kinds
+of request. Rejected logins back off for the Retry-After the server sends.
+"""
+import argparse
+import asyncio
+import secrets
+import time
+
+import httpx
+import numpy as np
+
+
+async def worker(client: httpx.AsyncClient, method: str, path: str, body, deadline: float, latencies: list, statuses: dict):
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, path, json=body)
+        except httpx.TransportError as e:
+            statuses[type(e).__name__] = statuses.get(type(e).__name__, 0) + 1
+            continue
+        latencies.append(time.perf_counter() - started)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        if response.status_code == 429:
+            await asyncio.sleep(float(response.headers.get("Retry-After", 1)))
+
+
+def report(name: str, latencies: list, statuses: dict, duration: float):
+    ok = statuses.get(200, 0)
+    p50, p99 = (np.percentile(latencies, [50, 99]) * 1000) if latencies else (0.0, 0.0)
+    print(f"{name:<12}{ok / duration:>10.1f}/s{p50:>10.1f} ms{p99:>10.1f} ms   {statuses}")
+
+
+async def run(args):
+    limits = httpx.Limits(max_connections=args.concurrency + args.background)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60) as client:
+        credentials = {"email": f"load-{secrets.token_hex(4)}@example.com", "password": secrets.token_hex(8)}
+        response = await client.post("/api/v1/register", json=credentials)
+        response.raise_for_status()
+
+        deadline = time.monotonic() + args.duration
+        login_latencies, login_statuses = [], {}
+        other_latencies, other_statuses = [], {}
+        await asyncio.gather(
+            *(worker(client, "POST", "/api/v1/login/", credentials, deadline, login_latencies, login_statuses)
+              for _ in range(args.concurrency)),
+            *(worker(client, "POST", "/api/v1/initialize", None, deadline, other_latencies, other_statuses)
+              for _ in range(args.background)),
+        )
+
+    print(f"{'request':<12}{'rate':>12}{'p50':>13}{'p99':>13}   statuses")
+    report("login", login_latencies, login_statuses, args.duration)
+    report("initialize", other_latencies, other_statuses, args.duration)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--background", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=20)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
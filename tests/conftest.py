@@ -0,0 +1,142 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import time
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects.postgresql import BYTEA, TSVECTOR
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+
+from app.database import vector_index
+from app.database.models import Base, User
+
+
+@compiles(BYTEA, "sqlite")
+def compile_bytea_sqlite(element, compiler, **kw):
+    # Lets the models' tables be created in an in-memory SQLite database.
+    return "BLOB"
+
+
+@compiles(TSVECTOR, "sqlite")
+def compile_tsvector_sqlite(element, compiler, **kw):
+    return "TEXT"
+
+
+@pytest.fixture
+def db():
+    """In-memory SQLite session with the models' tables and user 1."""
+    engine = create_engine("sqlite://")
+    # Stand-in for the Postgres function behind indices.text_search.
+    event.listen(engine, "connect", lambda connection, _: connection.create_function(
+        "to_tsvector", 2, lambda config, text: text, deterministic=True))
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add(User(id=1, email="a@example.com", password="x"))
+    session.commit()
+    vector_index.drop_user_index(1)
+    yield session
+    vector_index.drop_user_index(1)
+    session.close()
+
+
+class LocalRedis:
+    """Dict-backed stand-in for the few redis-py calls the stores and caches make."""
+
+    def __init__(self):
+        self.data = {}
+        self.expiry = {}
+
+    def _alive(self, key):
+        if key in self.expiry and self.expiry[key] <= time.monotonic():
+            self.data.pop(key, None)
+            self.expiry.pop(key, None)
+        return key in self.data
+
+    @staticmethod
+    def _encode(value):
+        return value if isinstance(value, bytes) else str(value).encode()
+
+    def get(self, key):
+        return self.data[key] if self._alive(key) else None
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and self._alive(key):
+            return None
+        self.data[key] = self._encode(value)
+        self.expiry.pop(key, None)
+        if ex:
+            self.expire(key, ex)
+        return True
+
+    def delete(self, key):
+        self.data.pop(key, None)
+        self.expiry.pop(key, None)
+
+    def hset(self, key, mapping):
+        self._alive(key)
+        self.data.setdefault(key, {}).update({field: self._encode(value) for field, value in mapping.items()})
+
+    def hget(self, key, field):
+        return self.data[key].get(field) if self._alive(key) else None
+
+    def exists(self, key):
+        return int(self._alive(key))
+
+    def expire(self, key, seconds):
+        self.expiry[key] = time.monotonic() + seconds
+
+    def register_script(self, script):
+        # Only the lock release script is registered; it compares and deletes atomically.
+        def compare_and_delete(keys, args):
+            if self.get(keys[0]) == self._encode(args[0]):
+                self.delete(keys[0])
+                return 1
+            return 0
+        return compare_and_delete
+
+    def pipeline(self, transaction=True):
+        return LocalPipeline(self)
+
+    def transaction(self, func, *keys):
+        with self.pipeline() as pipe:
+            pipe.watch(*keys)
+            func(pipe)
+            return pipe.execute()
+
+
+class LocalPipeline:
+    """Buffers commands until execute, except between watch and multi, like redis-py."""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+        self.buffering = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.commands = []
+
+    def watch(self, *keys):
+        self.buffering = False
+
+    def multi(self):
+        self.buffering = True
+
+    def execute(self):
+        return [command(*args, **kwargs) for command, args, kwargs in self.commands]
+
+    def __getattr__(self, name):
+        command = getattr(self.redis, name)
+        if not self.buffering:
+            return command
+        return lambda *args, **kwargs: self.commands.append((command, args, kwargs))
+
+
+@pytest.fixture
+def local_redis():
+    return LocalRedis()
@@ -0,0 +1,99 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import threading
+import time
+
+import numpy as np
+from app.database import ann_index
+from app.database.ann_index import IVFIndex
+from app.database.vector_index import FlatIndex
+
+
+def clustered(rows=3000, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(30, dim))
+    return (centers[rng.integers(0, 30, rows)] + 0.3 * rng.normal(size=(rows, dim))).astype(np.float32)
+
+
+def test_untrained_index_is_exact():
+    vectors = clustered(rows=100)
+    index = IVFIndex(min_train_size=1000)
+    index.add(range(100), vectors)
+    assert not index.trained
+    assert index.search(vectors[7], k=1)[0][0] == 7
+
+
+def test_recall_against_brute_force():
+    vectors = clustered()
+    ids = np.arange(len(vectors))
+    exact = FlatIndex()
+    exact.add(ids, vectors)
+    index = IVFIndex(nlist=32, nprobe=8, min_train_size=1000)
+    index.add(ids, vectors)
+    index.wait_for_training()
+    assert index.trained and len(index) == len(vectors)
+
+    hits = 0
+    for query in vectors[:50]:
+        truth = {match_id for match_id, _ in exact.search(query, 10)}
+        hits += len(truth & {match_id for match_id, _ in index.search(query, 10)})
+    assert hits / 500 >= 0.9
+
+
+def test_save_and_load_round_trip(tmp_path):
+    vectors = clustered(rows=1500)
+    index = IVFIndex(nlist=16, min_train_size=1000)
+    index.add(range(1500), vectors)
+    index.wait_for_training()
+    index.max_id = 1499
+    path = tmp_path / "user_1.npz"
+    index.save(path)
+
+    loaded = IVFIndex.load(path)
+    assert len(loaded) == 1500
+    assert loaded.max_id == 1499
+    assert loaded.persisted_size == 1500
+    assert loaded.search(vectors[3], k=5, nprobe=16) == index.search(vectors[3], k=5, nprobe=16)
+
+
+def test_remove_from_trained_index():
+    vectors = clustered(rows=2000)
+    index = IVFIndex(nlist=16, nprobe=16, min_train_size=1000)
+    index.add(range(2000), vectors)
+    index.wait_for_training()
+    assert index.trained and index.search(vectors[42], k=1)[0][0] == 42
+
+    assert index.remove([42, 43, 5000]) == 2
+    assert len(index) == 1998
+    assert 42 not in [i for i, _ in index.search(vectors[42], k=10)]
+
+
+def test_training_does_not_block_searches(monkeypatch):
+    started, release = threading.Event(), threading.Event()
+    train_centroids = ann_index.train_centroids
+
+    def slow_train(matrix, nlist, *args, **kwargs):
+        started.set()
+        release.wait(5)
+        return train_centroids(matrix, nlist, *args, **kwargs)
+
+    monkeypatch.setattr(ann_index, "train_centroids", slow_train)
+    vectors = clustered(rows=1200)
+    index = IVFIndex(nlist=16, nprobe=16, min_train_size=1000)
+    index.add(range(1000), vectors[:1000])
+    assert started.wait(5) and not index.trained
+
+    # Searches, adds and removes go on while the centroids are being trained.
+    began = time.perf_counter()
+    assert index.search(vectors[7], k=1)[0][0] == 7
+    index.add(range(1000, 1200), vectors[1000:])
+    assert index.remove([7]) == 1
+    assert time.perf_counter() - began < 1
+
+    release.set()
+    index.wait_for_training()
+    assert index.trained and len(index) == 1199
+    assert index.search(vectors[1100], k=1)[0][0] == 1100
+    assert 7 not in [i for i, _ in index.search(vectors[7], k=10)]
@@ -0,0 +1,109 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import subprocess
+
+import pytest
+
+from app import tasks, utils
+from app.transcript_cache import MemoryTranscriptCache
+from app.transcription import ffmpeg_exe, probe_duration, transcode_to_mp3
+
+
+class FakeStream:
+    def __init__(self, subtype, data=b"audio"):
+        self.subtype = subtype
+        self.mime_type = f"audio/{subtype}"
+        self.url = f"https://example.com/{subtype}"
+        self.data = data
+
+    def download(self, output_path, filename):
+        path = os.path.join(output_path, filename)
+        with open(path, "wb") as f:
+            f.write(self.data)
+        return path
+
+
+class FakeStreams(list):
+    def filter(self, only_audio):
+        return self
+
+    def first(self):
+        return self[0]
+
+
+class FakeYouTube:
+    streams = FakeStreams()
+    length = 120
+
+    def __init__(self, url):
+        pass
+
+
+def read_chunks(path, size=4096):
+    with open(path, "rb") as f:
+        while chunk := f.read(size):
+            yield chunk
+
+
+def test_accepted_container_is_downloaded_as_is(tmp_path, monkeypatch):
+    monkeypatch.setattr(FakeYouTube, "streams", FakeStreams([FakeStream("mp4")]))
+    monkeypatch.setattr(utils, "YouTube", FakeYouTube)
+    monkeypatch.setattr(utils, "transcode_to_mp3", lambda *args: pytest.fail("should not transcode"))
+
+    path = utils.download_yt("https://www.youtube.com/watch?v=abcdefghijk", str(tmp_path))
+
+    assert path == str(tmp_path / "abcdefghijk.mp4")
+    assert os.listdir(tmp_path) == ["abcdefghijk.mp4"]
+
+
+def test_other_containers_are_transcoded_from_the_stream(tmp_path, monkeypatch):
+    transcoded = []
+    monkeypatch.setattr(FakeYouTube, "streams", FakeStreams([FakeStream("3gpp")]))
+    monkeypatch.setattr(utils, "YouTube", FakeYouTube)
+    monkeypatch.setattr(utils.pytube_request, "stream", lambda url: iter([url.encode()]))
+    monkeypatch.setattr(utils, "transcode_to_mp3", lambda chunks, out: transcoded.append((list(chunks), out)))
+
+    path = utils.download_yt("https://www.youtube.com/watch?v=abcdefghijk", str(tmp_path))
+
+    assert path == str(tmp_path / "abcdefghijk.mp3")
+    assert transcoded == [([b"https://example.com/3gpp"], path)]
+    assert os.listdir(tmp_path) == []
+
+
+def test_transcode_to_mp3_from_chunks(tmp_path):
+    source = tmp_path / "tone.wav"
+    subprocess.run([ffmpeg_exe(), "-v", "error", "-f", "lavfi", "-i", "sine=duration=3", str(source)], check=True)
+
+    out = transcode_to_mp3(read_chunks(source), str(tmp_path / "tone.mp3"))
+
+    assert probe_duration(out) == pytest.approx(3, abs=0.2)
+
+
+def test_transcode_to_mp3_reports_ffmpeg_errors(tmp_path):
+    with pytest.raises(RuntimeError, match="ffmpeg"):
+        transcode_to_mp3(iter([b"not audio"] * 10), str(tmp_path / "bad.mp3"))
+
+
+def test_work_dir_is_removed_after_the_job(monkeypatch):
+    work_dirs = []
+
+    def download_yt(url, out_dir):
+        work_dirs.append(out_dir)
+        path = os.path.join(out_dir, "abcdefghijk.mp4")
+        open(path, "wb").close()
+        return path
+
+    monkeypatch.setattr(tasks, "transcript_cache", MemoryTranscriptCache())
+    monkeypatch.setattr(tasks, "download_yt", download_yt)
+    monkeypatch.setattr(tasks, "split_audio", lambda path, *args: [path])
+    monkeypatch.setattr(tasks, "transcript_yt", lambda path: "hello world")
+
+    assert tasks.process_transcript.apply(args=("https://www.youtube.com/watch?v=abcdefghijk",)).get() == "hello world"
+    assert not os.path.exists(work_dirs[0])
+
+    monkeypatch.setattr(tasks, "transcript_yt", lambda path: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        tasks.process_transcript.apply(args=("https://www.youtube.com/watch?v=abcdefghijk",)).get()
+    assert not os.path.exists(work_dirs[1])
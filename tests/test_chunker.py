@@ -0,0 +1,50 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.data_ingestion.chunker import chunk_text, iter_paragraphs
+from app.embedding_batcher import estimate_tokens
+
+
+def paragraphs(count, words=30):
+    return [" ".join(f"p{i}w{j}" for j in range(words)) for i in range(count)]
+
+
+def test_paragraphs_span_piece_boundaries():
+    pieces = ["first para\n\nsecond ", "para continues\n\n", "third"]
+    assert list(iter_paragraphs(pieces)) == ["first para", "second para continues", "third"]
+
+
+def test_chunks_respect_budget_and_keep_paragraphs_whole():
+    text = "\n\n".join(paragraphs(20))
+    chunks = list(chunk_text([text], max_tokens=200, overlap_tokens=40))
+    assert [chunk.chunk_index for chunk in chunks] == list(range(len(chunks)))
+    assert all(estimate_tokens(chunk.text) <= 200 for chunk in chunks)
+    assert chunks[0].text.startswith("p0w0") and chunks[0].paragraph.startswith("0-")
+    assert chunks[-1].text.endswith("p19w29")
+
+
+def test_consecutive_chunks_overlap():
+    chunks = list(chunk_text(["\n\n".join(paragraphs(10))], max_tokens=150, overlap_tokens=40))
+    for previous, current in zip(chunks, chunks[1:]):
+        first_words = current.text.split()[:3]
+        assert " ".join(first_words) in previous.text
+
+
+def test_oversized_paragraph_is_split():
+    chunks = list(chunk_text([" ".join(f"w{i}" for i in range(1500))], max_tokens=300, overlap_tokens=30))
+    assert len(chunks) > 1
+    assert all(chunk.paragraph == "0" for chunk in chunks)
+    assert all(estimate_tokens(chunk.text) <= 300 for chunk in chunks)
+
+
+def test_insertion_only_changes_nearby_chunks():
+    original = paragraphs(300, words=60)
+    edited = original[:100] + ["an inserted paragraph " + " ".join(f"x{i}" for i in range(40))] + original[100:]
+    before = {chunk.text for chunk in chunk_text(["\n\n".join(original)])}
+    after = list(chunk_text(["\n\n".join(edited)]))
+    assert sum(chunk.text not in before for chunk in after) <= 4
+    # Without content-defined boundaries every later chunk shifts.
+    before = {chunk.text for chunk in chunk_text(["\n\n".join(original)], boundary_divisor=0)}
+    after = list(chunk_text(["\n\n".join(edited)], boundary_divisor=0))
+    assert sum(chunk.text not in before for chunk in after) > 20
@@ -0,0 +1,157 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import gzip
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from app.data_ingestion.crawler import MemoryCrawlCache, SitemapCrawler, extract_main_text
+
+PAGE = """<html><head><title>Page {n}</title><script>var tracking = 1;</script></head>
+<body><nav>Home | Products | About</nav>
+<main><h1>Product {n}</h1><p>Part number <b>SKU-{n}</b> ships in {version} days.</p><ul><li>red</li><li>blue</li></ul></main>
+<footer>Copyright</footer></body></html>"""
+
+
+class SiteHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    pages = 6
+    version = 1
+    delay = 0.0
+    active = 0
+    max_active = 0
+    conditional = []
+    lock = threading.Lock()
+
+    def do_GET(self):
+        cls = SiteHandler
+        with cls.lock:
+            cls.active += 1
+            cls.max_active = max(cls.max_active, cls.active)
+        try:
+            time.sleep(cls.delay)
+            self.route()
+        finally:
+            with cls.lock:
+                cls.active -= 1
+
+    def route(self):
+        base = f"http://{self.headers['Host']}"
+        if self.path == "/sitemap.xml":
+            body = ('<?xml version="1.0"?><sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+                    f'<sitemap><loc>{base}/sitemap-a.xml</loc></sitemap><sitemap><loc>/sitemap-b.xml.gz</loc></sitemap>'
+                    '</sitemapindex>').encode()
+            return self.reply(200, body, "application/xml")
+        if self.path in ("/sitemap-a.xml", "/sitemap-b.xml.gz"):
+            numbers = range(0, 3) if self.path == "/sitemap-a.xml" else range(3, SiteHandler.pages)
+            urls = "".join(f"<url><loc>{base}/page/{n}</loc></url>" for n in numbers)
+            body = f'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{urls}</urlset>'.encode()
+            if self.path.endswith(".gz"):
+                body = gzip.compress(body)
+            return self.reply(200, body, "application/xml")
+        if self.path.startswith("/page/"):
+            n = int(self.path.rsplit("/", 1)[1])
+            if n == 4:
+                return self.reply(404, b"missing", "text/plain")
+            etag = f'"{n}-{SiteHandler.version}"'
+            if self.headers.get("If-None-Match"):
+                SiteHandler.conditional.append(self.path)
+                if self.headers["If-None-Match"] == etag:
+                    return self.reply(304, b"", None, {"ETag": etag})
+            body = PAGE.format(n=n, version=SiteHandler.version).encode()
+            return self.reply(200, body, "text/html; charset=utf-8", {"ETag": etag})
+        self.reply(500, b"error", "text/plain")
+
+    def reply(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        if content_type:
+            self.send_header("Content-Type", content_type)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def site():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SiteHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    SiteHandler.version, SiteHandler.delay, SiteHandler.max_active, SiteHandler.conditional = 1, 0.0, 0, []
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def crawl(url, cache=None, **kwargs):
+    async def run():
+        async with httpx.AsyncClient() as client:
+            crawler = SitemapCrawler(client=client, cache=cache or MemoryCrawlCache(), **kwargs)
+            return [page async for page in crawler.crawl(url)]
+    return asyncio.run(run())
+
+
+def test_extract_main_text_drops_boilerplate():
+    title, text = extract_main_text(PAGE.format(n=7, version=2))
+    assert title == "Page 7"
+    assert text.split("\n\n") == ["Product 7", "Part number SKU-7 ships in 2 days.", "red", "blue"]
+
+
+def test_crawls_sitemap_index(site):
+    pages = {page.url: page for page in crawl(f"{site}/sitemap.xml")}
+
+    assert sorted(pages) == sorted(f"{site}/page/{n}" for n in range(6))
+    assert pages[f"{site}/page/4"].status == "error" and "404" in pages[f"{site}/page/4"].error
+    page = pages[f"{site}/page/5"]
+    assert (page.status, page.title) == ("fetched", "Page 5")
+    assert "SKU-5" in page.text and "Home" not in page.text and "tracking" not in page.text
+
+
+def test_per_host_concurrency_and_page_limit(site):
+    SiteHandler.delay = 0.05
+    pages = crawl(f"{site}/sitemap.xml", per_host=2)
+    assert len(pages) == 6
+    assert SiteHandler.max_active == 2
+
+    assert len(crawl(f"{site}/sitemap.xml", max_pages=2)) == 2
+
+
+def test_conditional_refetch(site):
+    cache = MemoryCrawlCache()
+    first = {page.url: page for page in crawl(f"{site}/sitemap.xml", cache=cache)}
+    assert SiteHandler.conditional == []
+
+    second = {page.url: page for page in crawl(f"{site}/sitemap.xml", cache=cache)}
+    assert len(SiteHandler.conditional) == 5
+    assert {page.status for url, page in second.items() if not url.endswith("/4")} == {"not_modified"}
+    assert second[f"{site}/page/0"].text == first[f"{site}/page/0"].text
+
+    SiteHandler.version = 2
+    third = {page.url: page for page in crawl(f"{site}/sitemap.xml", cache=cache)}
+    assert third[f"{site}/page/0"].status == "fetched"
+    assert "ships in 2 days" in third[f"{site}/page/0"].text
+
+
+def test_unreadable_sitemap_raises(site):
+    with pytest.raises(httpx.HTTPStatusError):
+        crawl(f"{site}/nope.xml")
+
+
+def test_stopping_early_cancels_pending_fetches(site):
+    SiteHandler.delay = 0.05
+
+    async def run():
+        async with httpx.AsyncClient() as client:
+            crawler = SitemapCrawler(client=client, cache=MemoryCrawlCache(), per_host=1)
+            async for page in crawler.crawl(f"{site}/sitemap.xml"):
+                return page
+
+    assert asyncio.run(run()).status in ("fetched", "error")
@@ -0,0 +1,43 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from app.embedding_batcher import EmbeddingBatcher
+
+
+def test_concurrent_calls_are_coalesced():
+    calls = []
+
+    def fake_embed_batch(texts):
+        calls.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+    batcher = EmbeddingBatcher(fake_embed_batch, max_wait_ms=50, max_inputs=100)
+    texts = [f"text {i}" for i in range(40)] + ["text 1"]
+    with ThreadPoolExecutor(max_workers=41) as pool:
+        results = list(pool.map(batcher.embed, texts))
+
+    assert results == [[float(len(text))] for text in texts]
+    assert len(calls) < 10
+    assert sum(len(call) for call in calls) == 40
+
+
+def test_batches_respect_input_limit():
+    calls = []
+    batcher = EmbeddingBatcher(lambda texts: calls.append(texts) or [[0.0]] * len(texts), max_wait_ms=20, max_inputs=8)
+    batcher.embed_many([str(i) for i in range(30)])
+    assert max(len(call) for call in calls) <= 8
+
+
+def test_errors_reach_every_caller():
+    def failing(texts):
+        raise RuntimeError("upstream down")
+
+    batcher = EmbeddingBatcher(failing, max_wait_ms=20)
+    futures = [batcher.submit("a"), batcher.submit("b")]
+    for future in futures:
+        with pytest.raises(RuntimeError):
+            future.result(timeout=5)
@@ -0,0 +1,67 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import threading
+from concurrent.futures import Future
+
+import pytest
+from app import utils
+from app.cache import LRUCache
+from app.embedding_cache import EmbeddingCache, cache_key
+
+
+def test_key_ignores_whitespace_but_not_model():
+    assert cache_key("m", "hello   world\n") == cache_key("m", " hello world")
+    assert cache_key("m", "hello world") != cache_key("other", "hello world")
+
+
+def test_lru_evicts_by_size():
+    cache = LRUCache(max_bytes=10, sizeof=len)
+    cache.set("a", "xxxx")
+    cache.set("b", "xxxx")
+    cache.get("a")
+    cache.set("c", "xxxx")
+    assert "a" in cache and "c" in cache and "b" not in cache
+    assert cache.stats()["evictions"] == 1
+
+
+def test_memory_and_disk_tiers(tmp_path):
+    cache = EmbeddingCache(max_bytes=1024, directory=str(tmp_path))
+    assert cache.get("model", "some text") is None
+    cache.set("model", "some text", [0.5, 0.25])
+    assert cache.get("model", "some  text") == [0.5, 0.25]
+
+    restarted = EmbeddingCache(max_bytes=1024, directory=str(tmp_path))
+    assert restarted.get("model", "some text") == pytest.approx([0.5, 0.25])
+    stats = restarted.stats()
+    assert stats["disk_hits"] == 1 and stats["misses"] == 0
+
+
+def test_async_embedding_reads_and_writes_the_cache_off_the_loop(tmp_path, monkeypatch):
+    cache = EmbeddingCache(max_bytes=1024, directory=str(tmp_path))
+    cache.set(utils.EMBEDDING_MODEL, "cached", [1.0])
+    threads = []
+
+    class RecordingCache:
+        def get_many(self, model, texts):
+            threads.append(threading.current_thread())
+            return cache.get_many(model, texts)
+
+        def set_many(self, model, texts, embeddings):
+            threads.append(threading.current_thread())
+            cache.set_many(model, texts, embeddings)
+
+    class Batcher:
+        def submit(self, text):
+            future = Future()
+            future.set_result([float(len(text))])
+            return future
+
+    monkeypatch.setattr(utils, "embedding_cache", RecordingCache())
+    monkeypatch.setattr(utils, "embedding_batcher", Batcher())
+
+    assert asyncio.run(utils.aembed_texts(["cached", "new text"])) == [[1.0], [8.0]]
+    assert len(threads) == 2 and threading.main_thread() not in threads
+    assert cache.get(utils.EMBEDDING_MODEL, "new text") == [8.0]
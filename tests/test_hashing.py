@@ -0,0 +1,41 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from fastapi import HTTPException
+
+from app.hashing import HashingPool, hasher
+
+
+def test_hash_and_verify_round_trip():
+    pool = HashingPool(workers=2, max_pending=2)
+    try:
+        hashed = pool.hash("mysecretpassword")
+        assert hashed.startswith("$argon2")
+        assert not hasher.needs_update(hashed)
+        assert pool.verify("mysecretpassword", hashed)
+        assert not pool.verify("wrong", hashed)
+    finally:
+        pool.shutdown()
+
+
+def test_rejects_with_429_when_saturated():
+    pool = HashingPool(workers=1, max_pending=1, retry_after=3)
+    try:
+        with pool.admit(), pool.admit():
+            with pytest.raises(HTTPException) as excinfo:
+                with pool.admit():
+                    pass
+        assert excinfo.value.status_code == 429
+        assert excinfo.value.headers["Retry-After"] == "3"
+        assert pool.rejected == 1
+
+        # Slots are returned when admitted requests finish, including on errors.
+        with pytest.raises(ValueError):
+            with pool.admit():
+                raise ValueError
+        with pool.admit(), pool.admit():
+            pass
+    finally:
+        pool.shutdown()
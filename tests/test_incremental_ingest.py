@@ -0,0 +1,126 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import hashlib
+
+import numpy as np
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app.data_ingestion import ingest
+from app.data_ingestion.chunker import chunk_text
+from app.database import vector_index
+from app.database.models import User, Embedding, Index
+from app.database.services import search_embeddings, get_text_chunks, get_document_embeddings
+
+
+def fake_embedding(text):
+    seed = int(hashlib.md5(text.encode()).hexdigest()[:8], 16)
+    return np.random.default_rng(seed).normal(size=8).tolist()
+
+
+@pytest.fixture
+def embedded(monkeypatch):
+    texts = []
+
+    def embed_texts(batch):
+        texts.extend(batch)
+        return [fake_embedding(text) for text in batch]
+    monkeypatch.setattr(ingest, "embed_texts", embed_texts)
+    return texts
+
+
+def document(paragraphs):
+    return ["\n\n".join(paragraphs)]
+
+
+def paragraphs(count, words=60):
+    return [" ".join(f"p{i}w{j}" for j in range(words)) for i in range(count)]
+
+
+def test_unchanged_document_is_not_re_embedded(db, embedded):
+    first = ingest.ingest_document(document(paragraphs(100)), "manual.txt", db=db, user_id=1)
+    calls = len(embedded)
+    second = ingest.ingest_document(document(paragraphs(100)), "manual.txt", db=db, user_id=1)
+
+    assert len(embedded) == calls == first["embedded"]
+    assert (second["version"], second["embedded"], second["reused"], second["removed"]) == (2, 0, first["embedded"], 0)
+    np.testing.assert_allclose(second["embeddings"], first["embeddings"], rtol=1e-6)
+    live = db.query(Embedding).filter(Embedding.deleted.is_(False)).all()
+    assert len(live) == first["embedded"] and {row.version for row in live} == {2}
+
+
+def test_edit_re_embeds_only_changed_chunks_and_tombstones_removed(db, embedded):
+    original = paragraphs(100)
+    first = ingest.ingest_document(document(original), "manual.txt", db=db, user_id=1)
+
+    edited = original[:30] + ["a brand new paragraph about SKU-123"] + original[30:70] + original[75:]
+    embedded.clear()
+    second = ingest.ingest_document(document(edited), "manual.txt", db=db, user_id=1)
+
+    expected = list(chunk_text(document(edited)))
+    assert len(second["embeddings"]) == len(expected)
+    assert second["embedded"] == len(embedded) <= 6
+    assert second["reused"] + second["embedded"] == len(expected)
+    assert second["removed"] == first["embedded"] - second["reused"] > 0
+
+    # The live rows are exactly the new version's chunks, in order, for both tables.
+    for model in (Embedding, Index):
+        live = db.query(model).filter(model.deleted.is_(False)).order_by(model.chunk_index).all()
+        assert [(row.version, row.chunk_index, row.paragraph) for row in live] == [(2, c.chunk_index, c.paragraph) for c in expected]
+    texts = [row.text_chunk for row in db.query(Index).filter(Index.deleted.is_(False)).order_by(Index.chunk_index)]
+    assert texts == [c.text for c in expected]
+
+
+def test_search_skips_tombstoned_chunks(db, embedded):
+    original = paragraphs(20)
+    ingest.ingest_document(document(original), "manual.txt", db=db, user_id=1)
+    removed_text = next(c.text for c in chunk_text(document(original)) if "p5w0" in c.text)
+    # Load the vector index before the re-upload, as a running server would have.
+    assert search_embeddings(db, 1, fake_embedding(removed_text), 1)[0]["chunk_index"] is not None
+
+    ingest.ingest_document(document(original[:5] + original[8:]), "manual.txt", db=db, user_id=1)
+    matches = search_embeddings(db, 1, fake_embedding(removed_text), 50)
+    texts = [c["text"] for c in get_text_chunks(db, 1, matches)]
+    assert removed_text not in texts
+    assert all("p5w0" not in text for text in texts)
+
+
+def test_search_fills_k_when_another_process_tombstoned_rows(db, embedded, monkeypatch):
+    original = paragraphs(40)
+    ingest.ingest_document(document(original), "manual.txt", db=db, user_id=1)
+    edited_text = next(c.text for c in chunk_text(document(original)) if "p5w0" in c.text)
+    search_embeddings(db, 1, fake_embedding(edited_text), 1)
+    # The re-upload runs in another worker: this process's index is not told about the tombstones.
+    monkeypatch.setattr(ingest, "remove_from_user_index", lambda user_id, ids: None)
+    result = ingest.ingest_document(document([p.upper() for p in original]), "manual.txt", db=db, user_id=1)
+    assert result["removed"] > 5
+    # The new version reaches this index on its next periodic refresh.
+    vector_index._indexes[1].refreshed_at = 0.0
+
+    matches = search_embeddings(db, 1, fake_embedding(edited_text), 5)
+    assert len(matches) == 5
+    assert {match["version"] for match in matches} == {2}
+    # The stale rows that were hit are gone from the index.
+    assert len(vector_index._indexes[1]) < result["embedded"] + result["removed"]
+
+
+def test_document_embeddings_are_per_user(db, embedded):
+    db.add(User(id=2, email="b@example.com", password="x"))
+    db.commit()
+    first = ingest.ingest_document(document(paragraphs(20)), "page", db=db, user_id=1)
+    ingest.ingest_document(document(paragraphs(20)), "page", db=db, user_id=1)
+
+    version, embeddings = get_document_embeddings(db, 1, "page")
+    assert version == 2
+    np.testing.assert_allclose(embeddings, first["embeddings"], rtol=1e-6)
+    assert get_document_embeddings(db, 2, "page") == (None, [])
+
+
+def test_a_version_cannot_be_written_twice(db, embedded, monkeypatch):
+    ingest.ingest_document(document(paragraphs(5)), "manual.txt", db=db, user_id=1)
+    # As if a concurrent upload had read the same latest version.
+    monkeypatch.setattr(ingest, "next_version", lambda db, user_id, file_path: 1)
+    with pytest.raises(IntegrityError):
+        ingest.ingest_document(document([p.upper() for p in paragraphs(5)]), "manual.txt", db=db, user_id=1)
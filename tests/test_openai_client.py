@@ -0,0 +1,84 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import openai
+import pytest
+from app.clients import OpenAIClientManager
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    # Status codes to return before answering successfully.
+    failures = []
+    requests = 0
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        FakeOpenAIHandler.requests += 1
+        if FakeOpenAIHandler.failures:
+            self.send_response(FakeOpenAIHandler.failures.pop(0))
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(b'{"error": {"message": "try again"}}')
+            return
+        payload = {
+            "object": "list",
+            "model": body["model"],
+            "data": [{"object": "embedding", "index": i, "embedding": [float(len(text))]} for i, text in enumerate(body["input"])],
+            "usage": {"prompt_tokens": 1, "total_tokens": 1},
+        }
+        data = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_server(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOpenAIHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    FakeOpenAIHandler.requests = 0
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1"
+    server.shutdown()
+
+
+def embed(client):
+    return client.embeddings.create(input=["ab", "abc"], model="test-model")
+
+
+def test_retries_rate_limits_and_server_errors(fake_server):
+    FakeOpenAIHandler.failures = [429, 503]
+    manager = OpenAIClientManager(base_url=fake_server, backoff_base=0.01)
+    response = manager.call(embed)
+    assert [item.embedding for item in response.data] == [[2.0], [3.0]]
+    assert FakeOpenAIHandler.requests == 3
+    manager.close()
+
+
+def test_client_errors_are_not_retried(fake_server):
+    FakeOpenAIHandler.failures = [400]
+    manager = OpenAIClientManager(base_url=fake_server, backoff_base=0.01)
+    with pytest.raises(openai.BadRequestError):
+        manager.call(embed)
+    assert FakeOpenAIHandler.requests == 1
+    manager.close()
+
+
+def test_gives_up_after_max_retries(fake_server):
+    FakeOpenAIHandler.failures = [500, 500, 500]
+    manager = OpenAIClientManager(base_url=fake_server, max_retries=2, backoff_base=0.01)
+    with pytest.raises(openai.InternalServerError):
+        manager.call(embed)
+    assert FakeOpenAIHandler.requests == 3
+    FakeOpenAIHandler.failures = []
+    manager.close()
@@ -0,0 +1,27 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+
+from app.data_ingestion.parallel import get_parse_executor, parse_files, shutdown_parse_executor
+from app.upload_store import iter_pages
+
+
+def test_parse_files_keeps_order_and_reports_errors(tmp_path):
+    paths = []
+    for i in range(3):
+        path = tmp_path / f"doc{i}.txt"
+        path.write_text(f"document {i}", encoding="utf-8")
+        paths.append(str(path))
+    paths.append(str(tmp_path / "missing.txt"))
+
+    try:
+        results = asyncio.run(parse_files(paths))
+        assert get_parse_executor()._mp_context.get_start_method() == "forkserver"
+    finally:
+        shutdown_parse_executor()
+
+    assert [(result.get("pages"), result.get("characters")) for result in results[:3]] == [(1, 10)] * 3
+    assert [list(iter_pages(f"{path}.pages")) for path in paths[:3]] == [["document 0"], ["document 1"], ["document 2"]]
+    assert "error" in results[3]
@@ -0,0 +1,71 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import openpyxl
+import pytest
+from app.data_ingestion import reader
+from app.data_ingestion.chunker import chunk_text
+from app.data_ingestion.reader import iter_read, read
+
+
+def test_txt_is_streamed_in_blocks(tmp_path, monkeypatch):
+    monkeypatch.setattr(reader, "TXT_BLOCK_SIZE", 10)
+    path = tmp_path / "notes.txt"
+    path.write_text("a" * 25, encoding="utf-8")
+    blocks = list(iter_read(str(path)))
+    assert [len(block) for block in blocks] == [10, 10, 5]
+    assert read(str(path)) == "a" * 25
+
+
+def test_txt_blocks_do_not_split_words(tmp_path, monkeypatch):
+    monkeypatch.setattr(reader, "TXT_BLOCK_SIZE", 64)
+    path = tmp_path / "notes.txt"
+    path.write_text("word " * 100 + "\nline two\n" + "word " * 100, encoding="utf-8")
+
+    blocks = list(iter_read(str(path)))
+    assert len(blocks) > 1
+    assert all(block[-1].isspace() for block in blocks[:-1])
+    assert "".join(blocks) == read(str(path))
+    words = {word for chunk in chunk_text(blocks, max_tokens=20) for word in chunk.text.split()}
+    assert words == {"word", "line", "two"}
+
+    path.write_text("one two", encoding="utf-8")
+    assert list(iter_read(str(path))) == ["one two"]
+
+
+def test_xlsx_yields_row_batches_with_header(tmp_path, monkeypatch):
+    monkeypatch.setattr(reader, "XLSX_ROW_BATCH", 2)
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(["sku", "qty"])
+    for i in range(5):
+        sheet.append([f"A{i}", i])
+    path = tmp_path / "stock.xlsx"
+    workbook.save(path)
+
+    batches = list(iter_read(str(path)))
+    assert len(batches) == 3
+    assert all(batch.startswith("sku\tqty\n") for batch in batches)
+    assert "A4\t4" in batches[-1]
+
+
+def test_xlsx_emits_no_header_only_batch(tmp_path, monkeypatch):
+    monkeypatch.setattr(reader, "XLSX_ROW_BATCH", 2)
+    workbook = openpyxl.Workbook()
+    workbook.active.append(["sku", "qty"])
+    full = workbook.create_sheet()
+    full.append(["sku", "qty"])
+    for i in range(4):
+        full.append([f"A{i}", i])
+    path = tmp_path / "stock.xlsx"
+    workbook.save(path)
+
+    batches = list(iter_read(str(path)))
+    assert len(batches) == 2
+    assert all(batch.count("\t") > 1 for batch in batches)
+
+
+def test_unsupported_extension():
+    with pytest.raises(ValueError):
+        iter_read("image.png")
@@ -0,0 +1,153 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import orjson
+import pytest
+
+from app import retrieval
+from app.clients import OpenAIClientManager
+from app.database.models import Embedding, Index
+from app.embedding_batcher import estimate_tokens
+
+
+class FakeChatHandler(BaseHTTPRequestHandler):
+    """Streams a fixed answer as chat completion chunks, one word per chunk."""
+    answer = "Paris is the capital [1]."
+    bodies = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        FakeChatHandler.bodies.append(body)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for word in FakeChatHandler.answer.split(" "):
+            chunk = {
+                "id": "chatcmpl-1", "object": "chat.completion.chunk", "created": 0, "model": body["model"],
+                "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}],
+            }
+            self.wfile.write(b"data: " + json.dumps(chunk).encode() + b"\n\n")
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_chat(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeChatHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    FakeChatHandler.bodies = []
+    manager = OpenAIClientManager(base_url=f"http://127.0.0.1:{server.server_address[1]}/v1")
+    monkeypatch.setattr(retrieval, "openai_clients", manager)
+    yield FakeChatHandler
+    manager.close()
+    server.shutdown()
+
+
+@pytest.fixture
+def db(db):
+    texts = ["Paris is the capital of France.", "Berlin is the capital of Germany.", "Bread is baked."]
+    vectors = [[1.0, 0.0, 0.0], [0.7, 0.7, 0.0], [0.0, 0.0, 1.0]]
+    for i, (text, vector) in enumerate(zip(texts, vectors)):
+        db.add(Embedding(user_id=1, file_path="doc.txt", version=1, chunk_index=i, paragraph=str(i), embedding=vector))
+        db.add(Index(user_id=1, file_path="doc.txt", version=1, chunk_index=i, paragraph=str(i), text_chunk=text))
+    db.commit()
+    return db
+
+
+def events(messages):
+    parsed = []
+    for message in messages:
+        event, data = message.decode().strip().split("\n")
+        parsed.append((event[len("event: "):], orjson.loads(data[len("data: "):])))
+    return parsed
+
+
+def chunk(text, score=1.0, index=0):
+    return {"file_path": "doc.txt", "version": 1, "chunk_index": index, "paragraph": "0", "score": score, "text": text}
+
+
+def test_pack_context_keeps_best_chunks_within_budget():
+    chunks = [chunk("a" * 400, 0.9, 0), chunk("b" * 800, 0.8, 1), chunk("a" * 400, 0.7, 2), chunk("c" * 200, 0.6, 3)]
+    packed = retrieval.pack_context(chunks, max_tokens=160)
+    # 101 + 51 tokens fit; the 201 token chunk and the duplicate are skipped.
+    assert [c["chunk_index"] for c in packed] == [0, 3]
+    assert sum(estimate_tokens(c["text"]) for c in packed) <= 160
+    assert retrieval.pack_context([chunk("x" * 1000)], max_tokens=10) == []
+
+
+def test_retrieve_chunks_returns_text_in_rank_order(db):
+    chunks = retrieval.retrieve_chunks(db, 1, [1.0, 0.1, 0.0], k=2)
+    assert [c["text"] for c in chunks] == ["Paris is the capital of France.", "Berlin is the capital of Germany."]
+    assert chunks[0]["score"] >= chunks[1]["score"]
+
+
+def test_answer_streams_tokens_with_sources(fake_chat):
+    chunks = [chunk("Paris is the capital of France.", 0.9)]
+    messages = list(retrieval.answer_events("What is the capital?", chunks))
+
+    parsed = events(messages)
+    assert parsed[0] == ("sources", [{"file_path": "doc.txt", "version": 1, "chunk_index": 0, "paragraph": "0", "score": 0.9}])
+    assert "".join(data["text"] for event, data in parsed if event == "token") == "Paris is the capital [1]. "
+    assert len([event for event, _ in parsed if event == "token"]) == 5
+    assert parsed[-1][0] == "done"
+
+    body = fake_chat.bodies[0]
+    assert body["stream"] is True
+    prompt = body["messages"][-1]["content"]
+    assert "[1] Paris is the capital of France." in prompt
+    assert prompt.endswith("Question: What is the capital?")
+
+
+def test_answer_reports_errors_in_stream(monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("upstream down")
+        yield
+    monkeypatch.setattr(retrieval, "stream_completion", fail)
+    parsed = events(list(retrieval.answer_events("q", [])))
+    assert parsed == [("sources", []), ("error", {"detail": "upstream down"})]
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    vector = [chunk("a", 0.9, 0), chunk("b", 0.8, 1), chunk("c", 0.7, 2)]
+    lexical = [chunk("c", 4.0, 2), chunk("d", 2.0, 3)]
+    fused = retrieval.reciprocal_rank_fusion({"vector": vector, "lexical": lexical}, k=60)
+
+    assert [c["chunk_index"] for c in fused] == [2, 0, 1, 3]
+    assert fused[0]["ranks"] == {"vector": 3, "lexical": 1}
+    assert fused[0]["score"] == pytest.approx(1 / 63 + 1 / 61)
+    assert fused[-1]["ranks"] == {"lexical": 2}
+
+    # Duplicate rows of one chunk in a list do not add up.
+    fused = retrieval.reciprocal_rank_fusion({"vector": [chunk("a", 0.9, 0), chunk("a", 0.9, 0)]}, k=60)
+    assert len(fused) == 1 and fused[0]["score"] == pytest.approx(1 / 61)
+
+
+def test_hybrid_search_times_each_stage(monkeypatch):
+    calls = {}
+
+    def vector_search(db, user_id, embedding, k):
+        calls["vector"] = k
+        return [chunk("a", 0.9, 0), chunk("b", 0.8, 1)]
+
+    def text_search(db, user_id, text, k):
+        calls["lexical"] = (text, k)
+        return [chunk("b", 3.0, 1)]
+
+    monkeypatch.setattr(retrieval, "search_embeddings", vector_search)
+    monkeypatch.setattr(retrieval, "search_text_chunks", text_search)
+    timer = retrieval.StageTimer()
+    fused = retrieval.hybrid_search(None, 1, "SKU-123", [1.0], k=1, vector_k=7, lexical_k=3, timer=timer)
+
+    assert [c["chunk_index"] for c in fused] == [1]
+    assert calls == {"vector": 7, "lexical": ("SKU-123", 3)}
+    assert set(timer.timings) == {"vector", "lexical", "fusion"}
+    assert timer.server_timing().startswith("vector;dur=")
@@ -0,0 +1,130 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import re
+import shutil
+import subprocess
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from openai import OpenAI
+
+from app import tasks
+from app.clients import openai_clients
+from app.transcript_cache import MemoryTranscriptCache
+from app.transcription import ffmpeg_exe, probe_duration, split_audio, stitch_transcripts
+from celery_app import celery_app
+
+# The fake "speaker" says two words per second.
+WORDS = [f"word{i}" for i in range(50)]
+WORDS_PER_SECOND = 2
+
+
+class FakeTranscriptionHandler(BaseHTTPRequestHandler):
+    """Answers /audio/transcriptions with the words spoken during the uploaded segment."""
+    segment_seconds = 10
+    overlap_seconds = 2
+    uploads = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        filename = re.search(rb'filename="([^"]+)"', body).group(1).decode()
+        FakeTranscriptionHandler.uploads.append(filename)
+        index = int(re.search(r"segment_(\d+)", filename).group(1)) if "segment_" in filename else 0
+        start = index * self.segment_seconds * WORDS_PER_SECOND
+        end = start + (self.segment_seconds + self.overlap_seconds) * WORDS_PER_SECOND
+        words = WORDS[start:end]
+        if index:
+            # A word cut in half at the segment boundary.
+            words = ["rd"] + words
+        data = (" ".join(words) + "\n").encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_whisper():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeTranscriptionHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    FakeTranscriptionHandler.uploads = []
+    openai_clients.set_client(OpenAI(base_url=f"http://127.0.0.1:{server.server_address[1]}/v1", api_key="test"))
+    yield
+    openai_clients.set_client(None)
+    server.shutdown()
+
+
+@pytest.fixture
+def memory_backend():
+    # Chords need a result backend; keep results in memory instead of Redis.
+    original = celery_app.conf.result_backend
+    celery_app.conf.result_backend = "cache+memory://"
+    celery_app._backend = celery_app._get_backend()
+    yield
+    celery_app.conf.result_backend = original
+    celery_app._backend = celery_app._get_backend()
+
+
+@pytest.fixture
+def audio_file(tmp_path):
+    path = tmp_path / "audio.mp3"
+    subprocess.run(
+        [ffmpeg_exe(), "-v", "error", "-f", "lavfi", "-i", "sine=frequency=440:duration=25", "-c:a", "libmp3lame", str(path)],
+        check=True,
+    )
+    return str(path)
+
+
+def test_stitch_removes_overlap_and_boundary_fragments():
+    assert stitch_transcripts([
+        "the quick brown fox jumps over the la",
+        "ox jumps over the lazy dog and then it",
+        "lazy dog and then it sleeps.",
+    ]) == "the quick brown fox jumps over the lazy dog and then it sleeps."
+
+
+def test_stitch_ignores_punctuation_and_case():
+    assert stitch_transcripts(["We went home. It was late", "home, it was late at night."]) == \
+        "We went home. It was late at night."
+
+
+def test_stitch_keeps_everything_without_overlap():
+    assert stitch_transcripts(["one two", "", "three four"]) == "one two three four"
+
+
+def test_split_audio(audio_file, tmp_path):
+    assert probe_duration(audio_file) == pytest.approx(25, abs=0.2)
+    assert split_audio(audio_file, str(tmp_path), segment_seconds=30, overlap_seconds=2) == [audio_file]
+
+    segments = split_audio(audio_file, str(tmp_path), segment_seconds=10, overlap_seconds=2)
+    assert [os.path.basename(segment) for segment in segments] == ["segment_0000.mp3", "segment_0001.mp3", "segment_0002.mp3"]
+    durations = [probe_duration(segment) for segment in segments]
+    assert durations[0] == pytest.approx(12, abs=0.2)
+    assert durations[2] == pytest.approx(5, abs=0.2)
+
+
+def test_process_transcript_runs_segments_as_chord(fake_whisper, memory_backend, audio_file, monkeypatch):
+    work_dirs = []
+
+    def download_yt(url, out_dir):
+        work_dirs.append(out_dir)
+        return shutil.copy(audio_file, out_dir)
+
+    monkeypatch.setattr(tasks, "transcript_cache", MemoryTranscriptCache())
+    monkeypatch.setattr(tasks, "download_yt", download_yt)
+    monkeypatch.setattr(tasks, "TRANSCRIBE_SEGMENT_SECONDS", 10)
+    monkeypatch.setattr(tasks, "TRANSCRIBE_SEGMENT_OVERLAP_SECONDS", 2)
+    monkeypatch.setattr(celery_app.conf, "task_always_eager", True)
+
+    result = tasks.process_transcript.apply(args=("https://www.youtube.com/watch?v=abcdefghijk",)).get()
+
+    assert result == " ".join(WORDS)
+    assert sorted(FakeTranscriptionHandler.uploads) == ["segment_0000.mp3", "segment_0001.mp3", "segment_0002.mp3"]
+    assert not os.path.exists(work_dirs[0])
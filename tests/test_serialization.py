@@ -0,0 +1,39 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+
+import numpy as np
+from app.serialization import decode_embedding, embedding_response
+
+
+def test_float_format_is_plain_json():
+    response = embedding_response("float", {"query_id": "q", "embedding": [0.5, -1.0]})
+    assert json.loads(response.body) == {"query_id": "q", "embedding": [0.5, -1.0]}
+
+
+def test_base64_round_trip_is_smaller():
+    embedding = np.random.default_rng(0).normal(size=1536).astype(np.float32).tolist()
+    as_float = embedding_response("float", {"embedding": embedding})
+    as_base64 = embedding_response("base64", {"embedding": embedding})
+    body = json.loads(as_base64.body)
+    assert body["embedding_format"] == "base64"
+    assert decode_embedding(body["embedding"]) == embedding
+    assert len(as_base64.body) * 2 < len(as_float.body)
+
+
+def test_binary_frame_for_many_embeddings():
+    response = embedding_response("binary", {"embeddings": [[1.0, 2.0], [3.0, 4.0], [5.0, 6.0]]},
+                                  field="embeddings", many=True)
+    assert response.media_type == "application/octet-stream"
+    assert response.headers["X-Embedding-Count"] == "3" and response.headers["X-Embedding-Dim"] == "2"
+    assert np.frombuffer(response.body, dtype="<f4").reshape(3, 2).tolist() == [[1.0, 2.0], [3.0, 4.0], [5.0, 6.0]]
+
+
+def test_empty_list_of_embeddings_stays_a_list():
+    for embedding_format in ("float", "base64"):
+        response = embedding_response(embedding_format, {"embeddings": []}, field="embeddings", many=True)
+        assert json.loads(response.body)["embeddings"] == []
+    response = embedding_response("binary", {"embeddings": []}, field="embeddings", many=True)
+    assert response.body == b"" and response.headers["X-Embedding-Count"] == "0"
@@ -0,0 +1,72 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import threading
+import time
+
+import pytest
+from app.session_store import MemorySessionStore, RedisSessionStore, SessionNotFound, SessionTooLarge
+
+
+@pytest.fixture(params=["memory", "redis"])
+def store(request, local_redis):
+    if request.param == "memory":
+        return MemorySessionStore(ttl=0.2)
+    return RedisSessionStore(client=local_redis, ttl=0.2)
+
+
+def test_documents_round_trip(store):
+    store.create("s1")
+    assert store.exists("s1") and not store.exists("s2")
+    store.put_document("s1", "a.txt", "hello " * 1000, [[0.5, 1.0], [2.0, 3.0]])
+    assert store.get_text("s1", "a.txt") == "hello " * 1000
+    assert store.get_embeddings("s1", "a.txt") == [[0.5, 1.0], [2.0, 3.0]]
+    assert store.get_text("s1", "b.txt") is None
+
+
+def test_sessions_expire(store):
+    store.create("s1")
+    time.sleep(0.3)
+    assert not store.exists("s1")
+    assert store.get_text("s1", "a.txt") is None
+
+
+def test_expired_session_is_not_recreated(store):
+    with pytest.raises(SessionNotFound):
+        store.put_document("missing", "a.txt", "text", [])
+    store.create("s1")
+    time.sleep(0.3)
+    with pytest.raises(SessionNotFound):
+        store.put_document("s1", "a.txt", "text", [])
+    assert not store.exists("s1")
+
+
+def test_concurrent_documents_are_all_kept():
+    store = MemorySessionStore()
+    store.create("s1")
+    threads = [threading.Thread(target=store.put_document, args=("s1", f"{i}.txt", str(i), [[float(i)]]))
+               for i in range(50)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [store.get_text("s1", f"{i}.txt") for i in range(50)] == [str(i) for i in range(50)]
+
+
+def test_memory_store_evicts_least_recently_used():
+    store = MemorySessionStore(max_bytes=2000)
+    for session_id in ("old", "new"):
+        store.create(session_id)
+        store.put_document(session_id, "doc", os.urandom(1000).hex(), [])
+    assert store.exists("new") and not store.exists("old")
+
+
+def test_memory_store_refuses_a_session_larger_than_the_store():
+    store = MemorySessionStore(max_bytes=2000)
+    store.create("s1")
+    store.put_document("s1", "small", "small text", [])
+    with pytest.raises(SessionTooLarge):
+        store.put_document("s1", "large", os.urandom(2000).hex(), [])
+    assert store.get_text("s1", "large") is None
+    assert store.get_text("s1", "small") == "small text"
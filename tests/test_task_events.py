@@ -0,0 +1,155 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import threading
+
+import orjson
+import pytest
+
+from app import tasks
+from app.task_events import MemoryTaskEvents, event_stream
+from app.transcript_cache import MemoryTranscriptCache
+from celery_app import celery_app
+
+URL = "https://www.youtube.com/watch?v=abcdefghijk"
+
+
+class RecordingTaskEvents(MemoryTaskEvents):
+    def __init__(self):
+        super().__init__()
+        self.published = []
+
+    def publish(self, task_id, event):
+        self.published.append((task_id, event))
+        super().publish(task_id, event)
+
+
+def parse(messages):
+    return [orjson.loads(message.split(b"data: ", 1)[1]) for message in messages if message.startswith(b"event:")]
+
+
+async def collect(stream):
+    return [message async for message in stream]
+
+
+def test_stream_pushes_updates_until_the_task_finishes():
+    events = MemoryTaskEvents()
+
+    async def current_state():
+        # Published from a worker thread while the stream is subscribed.
+        def publish():
+            events.publish("t1", {"state": "PROGRESS", "current": 1, "total": 3, "status": "Splitting audio"})
+            events.publish("other", {"state": "SUCCESS", "current": 1, "total": 1, "status": ""})
+            events.publish("t1", {"state": "SUCCESS", "current": 1, "total": 1, "status": "done", "result": "text"})
+        threading.Thread(target=publish).start()
+        return {"state": "PENDING", "current": 0, "total": 1, "status": "Pending..."}
+
+    messages = asyncio.run(collect(event_stream("t1", current_state, events=events, keepalive=5)))
+
+    assert [event["state"] for event in parse(messages)] == ["PENDING", "PROGRESS", "SUCCESS"]
+    assert parse(messages)[-1]["result"] == "text"
+    assert messages[0].startswith(b"event: progress\ndata: ")
+
+
+def test_stream_of_finished_task_ends_at_once():
+    async def current_state():
+        return {"state": "FAILURE", "current": 1, "total": 1, "status": "boom"}
+
+    messages = asyncio.run(collect(event_stream("t1", current_state, events=MemoryTaskEvents())))
+    assert [event["state"] for event in parse(messages)] == ["FAILURE"]
+
+
+def test_stream_sends_keepalives_while_idle():
+    events = MemoryTaskEvents()
+
+    async def current_state():
+        threading.Timer(0.15, events.publish, ("t1", {"state": "REVOKED", "current": 1, "total": 1, "status": ""})).start()
+        return {"state": "STARTED", "current": 0, "total": 1, "status": ""}
+
+    messages = asyncio.run(collect(event_stream("t1", current_state, events=events, keepalive=0.05)))
+    assert b": keepalive\n\n" in messages
+    assert parse(messages)[-1]["state"] == "REVOKED"
+
+
+def test_stream_of_unknown_task_times_out():
+    async def current_state():
+        return {"state": "PENDING", "current": 0, "total": 1, "status": "Pending..."}
+
+    messages = asyncio.run(collect(event_stream("missing", current_state, events=MemoryTaskEvents(),
+                                                keepalive=0.05, pending_seconds=0.12)))
+    assert messages[-1].startswith(b"event: timeout\n")
+    assert [event["state"] for event in parse(messages)] == ["PENDING", "PENDING"]
+
+
+def test_stream_of_running_task_ends_at_maximum_lifetime():
+    async def current_state():
+        return {"state": "PROGRESS", "current": 1, "total": 3, "status": "Splitting audio"}
+
+    messages = asyncio.run(collect(event_stream("t1", current_state, events=MemoryTaskEvents(),
+                                                keepalive=0.05, pending_seconds=0.01, max_seconds=0.12)))
+    assert b": keepalive\n\n" in messages
+    assert messages[-1].startswith(b"event: timeout\n")
+
+
+@pytest.fixture
+def recorded(monkeypatch):
+    events = RecordingTaskEvents()
+    monkeypatch.setattr(tasks, "task_events", events)
+    monkeypatch.setattr(tasks, "transcript_cache", MemoryTranscriptCache())
+    monkeypatch.setattr(tasks, "download_yt", lambda url, out_dir: os.path.join(out_dir, "a.mp4"))
+    monkeypatch.setattr(tasks, "transcript_yt", lambda path: f"text of {os.path.basename(path)}")
+    monkeypatch.setattr(celery_app.conf, "task_always_eager", True)
+    return events
+
+
+@pytest.fixture
+def memory_backend():
+    original = celery_app.conf.result_backend
+    celery_app.conf.result_backend = "cache+memory://"
+    celery_app._backend = celery_app._get_backend()
+    yield
+    celery_app.conf.result_backend = original
+    celery_app._backend = celery_app._get_backend()
+
+
+def test_single_file_progress(recorded, monkeypatch):
+    monkeypatch.setattr(tasks, "split_audio", lambda path, *args: [path])
+
+    tasks.process_transcript.apply(args=(URL,), task_id="job").get()
+
+    assert {task_id for task_id, _ in recorded.published} == {"job"}
+    assert [(event["current"], event["total"], event["status"]) for _, event in recorded.published] == [
+        (0, 3, "Downloading audio"),
+        (1, 3, "Splitting audio"),
+        (2, 3, "Transcribing audio"),
+        (1, 1, "Transcription complete"),
+    ]
+    assert recorded.published[-1][1]["state"] == "SUCCESS"
+    assert recorded.published[-1][1]["result"] == "text of a.mp4"
+
+
+def test_segment_progress_and_failure(recorded, memory_backend, monkeypatch):
+    monkeypatch.setattr(tasks, "split_audio", lambda path, out_dir, *args: [f"{out_dir}/segment_{i}.mp4" for i in range(3)])
+    monkeypatch.setattr(tasks, "stitch_transcripts", lambda transcripts: " ".join(transcripts))
+
+    tasks.process_transcript.apply(args=(URL,), task_id="job").get()
+
+    statuses = [event["status"] for task_id, event in recorded.published if task_id == "job"]
+    assert statuses[2:] == [
+        "Transcribing 3 segments",
+        "Transcribed 1/3 segments",
+        "Transcribed 2/3 segments",
+        "Transcribed 3/3 segments",
+        "Transcription complete",
+    ]
+    progress = [(event["current"], event["total"]) for task_id, event in recorded.published if event["state"] == "PROGRESS"]
+    assert progress[-1] == (5, 6)
+
+    recorded.published.clear()
+    monkeypatch.setattr(tasks, "download_yt", lambda url, out_dir: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        tasks.process_transcript.apply(args=(URL,), task_id="failing").get()
+    assert recorded.published[-1][1]["state"] == "FAILURE"
+    assert recorded.published[-1][1]["status"] == "division by zero"
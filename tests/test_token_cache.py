@@ -0,0 +1,81 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+from jose import jwt
+
+from app import auth
+from app.database.models import Session as UserSession
+from app.database.services import get_session_user_id, logout_user, delete_user
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    auth.claims_cache.clear()
+    auth.session_cache.clear()
+    yield
+    auth.claims_cache.clear()
+    auth.session_cache.clear()
+
+
+@pytest.fixture
+def db(db):
+    db.add_all([UserSession(token="t1", user_id=1), UserSession(token="t2", user_id=1)])
+    db.commit()
+    return db
+
+
+def test_decode_token_is_cached(monkeypatch):
+    token = auth.create_access_token({"sub": "a@example.com"})
+    calls = []
+    decode = jwt.decode
+    monkeypatch.setattr(auth.jwt, "decode", lambda *a, **kw: calls.append(1) or decode(*a, **kw))
+
+    assert auth.decode_token(token)["sub"] == "a@example.com"
+    assert auth.decode_token(token)["sub"] == "a@example.com"
+    assert len(calls) == 1
+
+    auth.invalidate_token(token)
+    auth.decode_token(token)
+    assert len(calls) == 2
+
+
+def test_cached_claims_do_not_outlive_expiry():
+    token = auth.create_access_token({"sub": "a@example.com"}, expires_delta=timedelta(seconds=-1))
+    auth.claims_cache.set(token, {"sub": "a@example.com", "exp": 0})
+    with pytest.raises(jwt.ExpiredSignatureError):
+        auth.decode_token(token)
+
+
+def test_session_lookup_is_cached_until_logout(db):
+    assert get_session_user_id(db, "t1") == 1
+    db.query(UserSession).filter(UserSession.token == "t1").delete()
+    db.commit()
+    # Deleted behind the cache's back: still served until invalidated.
+    assert get_session_user_id(db, "t1") == 1
+
+    auth.invalidate_token("t1")
+    with pytest.raises(HTTPException) as excinfo:
+        get_session_user_id(db, "t1")
+    assert excinfo.value.status_code == 401
+
+
+def test_logout_invalidates_session(db):
+    assert get_session_user_id(db, "t1") == 1
+    assert logout_user(db, "t1") == {"message": "Logged out successfully"}
+    with pytest.raises(HTTPException):
+        get_session_user_id(db, "t1")
+    with pytest.raises(HTTPException):
+        logout_user(db, "t1")
+
+
+def test_delete_user_invalidates_all_sessions(db):
+    assert get_session_user_id(db, "t2") == 1
+    delete_user(db, "a@example.com", "t1")
+    assert "t1" not in auth.session_cache
+    assert "t2" not in auth.session_cache
+    assert db.query(UserSession).count() == 0
@@ -0,0 +1,70 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import time
+
+import pytest
+
+from app import tasks
+from app.transcript_cache import MemoryTranscriptCache, RedisTranscriptCache, transcript_key
+from app.utils import youtube_transcript_key
+
+URL = "https://www.youtube.com/watch?v=abcdefghijk"
+
+
+@pytest.fixture(params=["memory", "redis"])
+def cache(request, local_redis):
+    if request.param == "memory":
+        return MemoryTranscriptCache(lock_ttl=0.2)
+    return RedisTranscriptCache(client=local_redis, lock_ttl=0.2)
+
+
+def test_key_includes_model_and_language():
+    assert youtube_transcript_key(URL) == transcript_key("abcdefghijk", "whisper-1", "en")
+    assert youtube_transcript_key("https://example.com/") is None
+
+
+def test_single_flight_claim(cache):
+    assert cache.claim("k", "task-1") is None
+    assert cache.claim("k", "task-2") == "task-1"
+    assert cache.claim("other", "task-3") is None
+
+    # Only the holder can release the lock.
+    cache.release("k", "task-2")
+    assert cache.claim("k", "task-4") == "task-1"
+    cache.release("k", "task-1")
+    assert cache.claim("k", "task-5") is None
+
+
+def test_put_stores_transcript_and_frees_key(cache):
+    cache.claim("k", "task-1")
+    cache.put("k", "hello world " * 500)
+    assert cache.get("k") == "hello world " * 500
+    assert cache.get("missing") is None
+    assert cache.claim("k", "task-2") is None
+
+
+def test_stale_lock_expires(cache):
+    cache.claim("k", "crashed")
+    time.sleep(0.25)
+    assert cache.claim("k", "task-2") is None
+
+
+def test_task_stores_result_or_releases_lock(monkeypatch):
+    cache = MemoryTranscriptCache()
+    key = youtube_transcript_key(URL)
+    monkeypatch.setattr(tasks, "transcript_cache", cache)
+    monkeypatch.setattr(tasks, "download_yt", lambda url, out_dir: os.path.join(out_dir, "a.mp4"))
+    monkeypatch.setattr(tasks, "split_audio", lambda path, *args: [path])
+
+    monkeypatch.setattr(tasks, "transcript_yt", lambda path: 1 / 0)
+    cache.claim(key, "failed-task")
+    with pytest.raises(ZeroDivisionError):
+        tasks.process_transcript.apply(args=(URL,), task_id="failed-task").get()
+    assert cache.get(key) is None
+    assert cache.claim(key, "task-2") is None
+
+    monkeypatch.setattr(tasks, "transcript_yt", lambda path: "hello world")
+    assert tasks.process_transcript.apply(args=(URL,), task_id="task-2").get() == "hello world"
+    assert cache.get(key) == "hello world"
@@ -0,0 +1,156 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import hashlib
+import io
+import time
+
+import pytest
+from fastapi import FastAPI, Request, UploadFile
+from fastapi.testclient import TestClient
+
+import app.data_ingestion.parallel as parallel
+import app.utils as utils
+from app.upload_store import (FRAME_HEADER, PAGES_HEADER, BlobStore, PageStats, UploadSizeLimitMiddleware,
+                              UploadTooLarge, iter_pages, read_page_stats, write_pages)
+
+
+def stored_files(root):
+    return sorted(str(path.relative_to(root)) for path in root.rglob("*") if path.is_file())
+
+
+def test_put_streams_and_addresses_by_hash(tmp_path):
+    store = BlobStore(tmp_path, max_bytes=1000, chunk_bytes=7)
+    content = b"Hello world\n\nSecond paragraph.\n" * 10
+
+    blob = store.put(io.BytesIO(content), "Notes.TXT")
+
+    digest = hashlib.sha256(content).hexdigest()
+    assert (blob.sha256, blob.size, blob.deduplicated) == (digest, len(content), False)
+    assert blob.path == tmp_path / digest[:2] / f"{digest}.txt"
+    assert blob.path.read_bytes() == content
+
+
+def test_identical_uploads_are_stored_once(tmp_path):
+    store = BlobStore(tmp_path, chunk_bytes=4)
+    first = store.put(io.BytesIO(b"same content"), "a.txt")
+    second = store.put(io.BytesIO(b"same content"), "b.txt")
+    other = store.put(io.BytesIO(b"other content"), "c.txt")
+
+    assert second.deduplicated and second.path == first.path
+    assert not other.deduplicated
+    assert stored_files(tmp_path) == sorted([str(first.path.relative_to(tmp_path)), str(other.path.relative_to(tmp_path))])
+
+
+def test_size_limit(tmp_path):
+    store = BlobStore(tmp_path, max_bytes=10, chunk_bytes=4)
+
+    with pytest.raises(UploadTooLarge):
+        store.put(io.BytesIO(b"x" * 5), "a.txt", size=11)
+    with pytest.raises(UploadTooLarge):
+        store.put(io.BytesIO(b"x" * 11), "a.txt")
+    assert stored_files(tmp_path) == []
+
+    assert store.put(io.BytesIO(b"x" * 10), "a.txt").size == 10
+
+
+def test_prune_drops_expired_then_least_recently_uploaded(tmp_path):
+    store = BlobStore(tmp_path, retention_seconds=3600, max_total_bytes=25, prune_seconds=3600)
+    blobs = {name: store.put(io.BytesIO(name.encode() * 10), f"{name}.txt") for name in ("a", "b", "c", "d")}
+    write_pages(store._pages_path(blobs["b"].path), ["b" * 5])
+    now = time.time()
+    for age, name in ((7200, "a"), (300, "b"), (200, "c"), (100, "d")):
+        os.utime(blobs[name].path, (now - age, now - age))
+    # Uploading "c" again marks it as used now.
+    assert store.put(io.BytesIO(b"c" * 10), "c.txt").deduplicated
+
+    # "a" is past the retention time; "b", the least recently uploaded of the rest, is over the size cap with its pages.
+    assert store.prune() == 2
+    assert stored_files(tmp_path) == sorted(str(blobs[name].path.relative_to(tmp_path)) for name in ("c", "d"))
+
+
+def test_put_prunes_at_most_once_per_interval(tmp_path):
+    store = BlobStore(tmp_path, retention_seconds=0, max_total_bytes=15, prune_seconds=3600)
+    store.put(io.BytesIO(b"a" * 10), "a.txt")
+    store.put(io.BytesIO(b"b" * 10), "b.txt")
+    assert len(stored_files(tmp_path)) == 2
+    assert store.prune() == 1
+
+
+def test_parse_once_per_content(tmp_path, monkeypatch):
+    calls = []
+
+    async def fake_parse(file_path, pages_path):
+        calls.append(file_path)
+        await asyncio.sleep(0.05)
+        return write_pages(pages_path, ["page one", "page two"])
+
+    monkeypatch.setattr(parallel, "parse_file_async", fake_parse)
+    store = BlobStore(tmp_path)
+    blob = store.put(io.BytesIO(b"page one\n\npage two"), "doc.txt")
+
+    async def run(store):
+        return await asyncio.gather(*(store.parse(blob.path) for _ in range(3)))
+
+    assert asyncio.run(run(store)) == [PageStats(2, 16)] * 3
+    assert calls == [str(blob.path)]
+    assert list(store.iter_pages(blob.path)) == ["page one", "page two"]
+
+    # Another process (a new store over the same directory) reads the cached pages.
+    assert asyncio.run(run(BlobStore(tmp_path))) == [PageStats(2, 16)] * 3
+    assert len(calls) == 1
+
+
+def test_pages_are_written_and_read_in_batches(tmp_path):
+    path = tmp_path / "doc.txt.pages"
+    pages = [f"page {i} " * 10 for i in range(10)]
+
+    assert write_pages(path, iter(pages), batch_chars=150) == PageStats(10, 700)
+    assert read_page_stats(path) == PageStats(10, 700)
+    assert list(iter_pages(path)) == pages
+    assert [p.name for p in tmp_path.iterdir()] == ["doc.txt.pages"]
+
+    frames, data = 0, path.read_bytes()
+    offset = PAGES_HEADER.size
+    while offset < len(data):
+        offset += FRAME_HEADER.size + FRAME_HEADER.unpack_from(data, offset)[0]
+        frames += 1
+    assert frames == 4  # 3 + 3 + 3 + 1 pages of 70 characters
+
+    # A cache in another format is treated as missing.
+    path.write_bytes(b"x")
+    assert read_page_stats(path) is None
+
+
+def test_save_file_reports_hash_and_dedupe(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "blob_store", BlobStore(tmp_path, max_bytes=20))
+
+    first = utils.save_file(UploadFile(io.BytesIO(b"hello"), filename="a.txt"))
+    second = utils.save_file(UploadFile(io.BytesIO(b"hello"), filename="b.txt"))
+    too_large = utils.save_file(UploadFile(io.BytesIO(b"x" * 21), filename="c.txt"))
+
+    assert first["message"] == "File uploaded successfully"
+    assert first["sha256"] == second["sha256"] == hashlib.sha256(b"hello").hexdigest()
+    assert (first["deduplicated"], second["deduplicated"]) == (False, True)
+    assert too_large["message"] == "File exceeds the maximum upload size of 20 bytes"
+
+
+def test_middleware_rejects_large_upload_requests():
+    app = FastAPI()
+    app.add_middleware(UploadSizeLimitMiddleware, max_bytes=100, path_prefix="/upload")
+
+    @app.post("/upload")
+    @app.post("/other")
+    async def echo(request: Request):
+        return {"size": len(await request.body())}
+
+    client = TestClient(app)
+    assert client.post("/upload", content=b"x" * 100).json() == {"size": 100}
+    assert client.post("/upload", content=b"x" * 101).status_code == 413
+    # Without a Content-Length the body is cut off once it passes the limit.
+    response = client.post("/upload", content=iter([b"x" * 60, b"x" * 60]))
+    assert response.status_code == 413
+    assert response.json() == {"detail": "Request body exceeds 100 bytes"}
+    assert client.post("/other", content=b"x" * 101).json() == {"size": 101}
@@ -0,0 +1,60 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import pytest
+from app.database.vector_index import FlatIndex
+
+
+def test_search_returns_nearest_first():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(500, 32)).astype(np.float32)
+    index = FlatIndex(capacity=16)
+    index.add(range(1, 501), vectors)
+
+    matches = index.search(vectors[41], k=3)
+    assert len(index) == 500
+    assert matches[0][0] == 42
+    assert matches[0][1] == pytest.approx(1.0, abs=1e-5)
+    assert [score for _, score in matches] == sorted((score for _, score in matches), reverse=True)
+
+
+def test_incremental_add_skips_known_ids():
+    index = FlatIndex()
+    index.add([1, 2], [[1.0, 0.0], [0.0, 1.0]])
+    index.add([2, 3], [[0.0, 1.0], [1.0, 1.0]])
+    assert len(index) == 3
+    assert index.search([1.0, 1.0], k=1)[0][0] == 3
+
+
+def test_empty_index_and_dimension_mismatch():
+    index = FlatIndex()
+    assert index.search([1.0, 0.0]) == []
+    index.add([1], [[1.0, 0.0]])
+    with pytest.raises(ValueError):
+        index.add([2], [[1.0, 0.0, 0.0]])
+
+
+def test_vector_type_returns_read_only_views():
+    from app.database.models import Vector
+    raw = np.arange(4, dtype=np.float32).tobytes()
+    vector = Vector(as_numpy=True).process_result_value(memoryview(raw), None)
+    assert isinstance(vector, np.ndarray) and not vector.flags.writeable
+    assert vector.tolist() == [0.0, 1.0, 2.0, 3.0]
+    assert Vector().process_result_value(raw, None) == [0.0, 1.0, 2.0, 3.0]
+    assert Vector().process_bind_param(vector, None) == raw
+
+
+def test_remove_drops_rows_without_disturbing_snapshots():
+    index = FlatIndex()
+    index.add([1, 2, 3], [[1.0, 0.0], [0.0, 1.0], [1.0, 1.0]])
+    ids, matrix = index.rows()
+
+    assert index.remove([2, 9]) == 1
+    assert len(index) == 2
+    assert [i for i, _ in index.search([0.0, 1.0], k=3)] == [3, 1]
+    # Earlier snapshots keep their rows; removed ids are not re-added by a refresh.
+    assert ids.tolist() == [1, 2, 3]
+    index.add([2, 4], [[0.0, 1.0], [0.0, 1.0]])
+    assert index.rows()[0].tolist() == [1, 3, 4]